@@ -1,76 +1,169 @@
+import time
 import streamlit as st
 import pandas as pd
-from data_processing import process_and_cache_data
-from stock_analisys import analyze_stock, create_chart
-import yfinance as yf
-from sector_analisys import sector_relative_performance
+from stock_analisys import analyze_stock
+from chart_cache import get_chart_cache
+from interactive_chart import create_interactive_chart, pattern_heatmap, update_pattern
+from patterns import DEFAULT_PARAMS, PatternGrid, detect_pattern_from
+from scoring import score_setups, setup_reasons as setup_reasons_for
+from fundamentals import get_info
+from screen_service import DEFAULT_MIN_GAP, ScreenService
+from universes import DEFAULT_UNIVERSE, list_universes
+from data_providers import period_start
+from gap_events import MIN_GAP_PERCENT
+import instrumentation as metrics
+from sector_analisys import RS_HORIZONS, sector_prices, sector_relative_performance, sector_relative_strength
 
-@st.cache_data
-def load_data():
-    return list(process_and_cache_data())
+@st.cache_resource
+def screen_service():
+    # Un solo screener por universo para todo el proceso; las sesiones solo leen su estado
+    service = ScreenService()
+    service.start_scheduler()
+    return service
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def pattern_grid(symbol, start_idx, last_date, n_rows, _df):
+    # Todas las combinaciones de los sliders de patrón para un símbolo; se recalcula solo si cambian sus datos
+    with metrics.timer('pattern_grid'):
+        return PatternGrid.from_frame(_df, start_idx)
+
+def screen_patterns(state, cached_data, params):
+    # Patrón con los parámetros de los sliders; con los por defecto y el mismo gap sirve el que el screener mantiene al día
+    patterns = {}
+    for symbol, entry in cached_data.items():
+        start_idx, result = state.patterns.get(symbol, (None, None))
+        if params != DEFAULT_PARAMS or start_idx != entry['start_idx']:
+            result, _, _ = detect_pattern_from(entry['df'], entry['start_idx'], **params)
+        patterns[symbol] = result
+    return patterns
 
 def main():
     st.title("PEG Screener")
     st.sidebar.header("Sector Analisys")
     sector_analysis = st.sidebar.button(f"Analizar", type="primary")
     if sector_analysis:
-        relative_prices, performance_fig = sector_relative_performance()
+        # Gráfico y ranking salen del mismo panel, cacheado por día hábil
+        prices = sector_prices()
+        relative_prices, performance_fig = sector_relative_performance(prices=prices)
         st.plotly_chart(performance_fig)
         final_performance = relative_prices.iloc[-1].sort_values(ascending=False)
         st.dataframe(final_performance)
+        st.subheader("Sector Relative Strength vs SPY")
+        st.dataframe(sector_relative_strength(prices=prices).style.format("{:+.2f}%", subset=list(RS_HORIZONS)))
+
 
+    universes = list_universes()
+    universe = st.sidebar.selectbox("Universe", universes, index=universes.index(DEFAULT_UNIVERSE))
+    if st.session_state.get('universe') != universe:
+        # Otro universo: descartar lo cargado del anterior
+        for key in ('cached_data', 'screen_panel', 'charts_prerendered', 'ranked_setups', 'ranked_setups_size'):
+            st.session_state.pop(key, None)
+        st.session_state.universe = universe
 
-    # Usar session state para mantener los datos cargados
-    if 'cached_data' not in st.session_state:
-        # Inicializar el estado de carga solo la primera vez
+    job = screen_service().job(universe)
+    state = job.state()
+
+    # Primera corrida del universo en el proceso: mostrar el progreso del job compartido
+    if state.panel is None:
         data_load_state = st.empty()
         progress_bar = st.progress(0)
         status_text = st.empty()
-        
-        # Cargar datos con progreso detallado
-        cached_data = None
-        
-        try:
-            for progress, status, data in process_and_cache_data():
-                progress_bar.progress(progress)
-                status_text.text(status)
-                if data is not None:
-                    cached_data = data
-            
-            # Guardar en session state
-            st.session_state.cached_data = cached_data
-            
-            # Limpiar los elementos de progreso
-            progress_bar.empty()
-            status_text.empty()
-            
-        except Exception as e:
+        pills_slot = st.sidebar.empty()
+        shown = 0
+        while state.running:
+            progress_bar.progress(state.progress)
+            status_text.text(state.status)
+            if len(state.symbols) != shown:
+                # Mostrar los stocks a medida que llegan (deshabilitados hasta terminar)
+                shown = len(state.symbols)
+                pills_slot.pills("Stocks", state.symbols, disabled=True, key=f"loading_pills_{shown}")
+            time.sleep(0.5)
+            state = job.state()
+
+        # Limpiar los elementos de progreso
+        progress_bar.empty()
+        status_text.empty()
+        pills_slot.empty()
+        if state.panel is None:
             data_load_state.error('❌ Error loading data')
-            st.error(f"Error details: {str(e)}")
+            st.error(f"Error details: {str(state.error)}")
             return
-    
+
+    # Panel nuevo (primera carga o refresco terminado): vistas y estado derivado de esta sesión
+    if st.session_state.get('screen_panel') is not state.panel:
+        for key in ('charts_prerendered', 'ranked_setups', 'ranked_setups_size'):
+            st.session_state.pop(key, None)
+        st.session_state.screen_panel = state.panel
+        st.session_state.cached_data = state.panel.screen()
+
+    minutes = (pd.Timestamp.now(tz=state.completed_at.tz) - state.completed_at).total_seconds() / 60
+    age = f"{minutes:.0f} min" if minutes < 90 else f"{minutes / 60:.1f} h"
+    last_bar = f", data through {state.panel.index[-1]:%Y-%m-%d}" if len(state.panel.index) else ""
+    st.sidebar.caption(f"Screened {age} ago ({state.completed_at:%Y-%m-%d %H:%M} ET){last_bar}")
+    if state.running:
+        st.sidebar.caption(f"Refreshing in background: {state.progress:.0%}")
+    elif state.error is not None:
+        st.sidebar.warning(f"Last refresh failed, showing previous results: {state.error}")
+
     # Usar los datos guardados en session state
     cached_data = st.session_state.cached_data
+
+    # Umbral de gap y gaps sostenidos: consulta al índice de gaps, sin volver a escanear (el
+    # screener filtra con el mínimo del índice; cada gap es el último que cumple el umbral)
+    min_gap = st.sidebar.slider("Minimum gap (%)", float(MIN_GAP_PERCENT), 20.0, float(DEFAULT_MIN_GAP), 0.5)
+    held_only = st.sidebar.checkbox("Only gaps that held", help="No close back below the pre-gap close since")
+    last_gaps = state.gaps.last_gaps(min_gap, since=period_start('1mo'), held=True if held_only else None,
+                                     symbols=list(cached_data))
+    cached_data = {symbol: {'df': entry['df'], 'start_idx': last_gaps[symbol]}
+                   for symbol, entry in cached_data.items() if symbol in last_gaps}
+    
+    # Pre-renderizar en segundo plano los gráficos con los parámetros por defecto
+    if cached_data and not st.session_state.get('charts_prerendered'):
+        get_chart_cache().prerender(cached_data)
+        st.session_state.charts_prerendered = True
     
     if cached_data and len(cached_data) > 0:
         st.sidebar.subheader("Select a stock")
         total_stocks = len(cached_data.keys())
         st.sidebar.write(f"Found {total_stocks} stocks with recent gaps")
+        if 'screen_panel' in st.session_state:
+            memory = st.session_state.screen_panel.memory_report()
+            st.sidebar.caption(f"Screen data: {memory['panel_bytes'] / 1e6:.1f} MB "
+                               f"({memory['frames_bytes'] / 1e6:.1f} MB as float64 frames), "
+                               f"{memory['bytes_per_symbol'] / 1e3:.0f} KB per stock")
         selected_symbol = st.sidebar.pills("Stocks", list(cached_data.keys()))
+
+        # Add parameter inputs in sidebar (también definen el patrón del ranking)
+        st.sidebar.subheader("Pattern Detection Parameters")
+        window = st.sidebar.slider("Window Size", 3, 10, DEFAULT_PARAMS['window'])
+        trend_sensitivity = st.sidebar.slider("Trend Sensitivity", 0.0, 1.0, DEFAULT_PARAMS['high_slope_threshold'])
+        high_slope_threshold = trend_sensitivity
+        low_slope_threshold = trend_sensitivity
+        params = {'window': window, 'high_slope_threshold': high_slope_threshold,
+                  'low_slope_threshold': low_slope_threshold}
+        
+        # Ranking de todos los candidatos por calidad del setup
+        ranked_key = (len(cached_data), min_gap, held_only, window, trend_sensitivity)
+        if st.session_state.get('ranked_setups_size') != ranked_key:
+            ranked = score_setups(cached_data, panel=st.session_state.get('screen_panel'))
+            patterns = screen_patterns(state, cached_data, params)
+            ranked.insert(1, 'pattern', [patterns[symbol].pattern.value for symbol in ranked.index])
+            ranked.insert(2, 'confidence', [round(patterns[symbol].confidence, 1) for symbol in ranked.index])
+            st.session_state.ranked_setups = ranked
+            st.session_state.ranked_setups_size = ranked_key
+        with st.expander("Ranked setups", expanded=not selected_symbol):
+            st.dataframe(st.session_state.ranked_setups, column_config={
+                'score': st.column_config.ProgressColumn("Score", min_value=0, max_value=100, format="%d"),
+            })
         
         if selected_symbol:
-            # Add parameter inputs in sidebar
-            st.sidebar.subheader("Pattern Detection Parameters")
-            window = st.sidebar.slider("Window Size", 3, 10, 3)
-            trend_sensitivity = st.sidebar.slider("Trend Sensitivity", 0.0, 1.0, 0.1)
-            high_slope_threshold = trend_sensitivity
-            low_slope_threshold = trend_sensitivity
+            interactive = st.sidebar.toggle("Interactive chart", value=False)
 
             df = cached_data[selected_symbol]['df']
             start_idx = cached_data[selected_symbol]['start_idx']
-            stock = yf.Ticker(selected_symbol)
+            info = get_info(selected_symbol)
 
-            logo_url = f"https://logo.clearbit.com/{stock.info.get('website', '').replace('http://', '').replace('https://', '').split('/')[0]}"
+            logo_url = f"https://logo.clearbit.com/{info.get('website', '').replace('http://', '').replace('https://', '').split('/')[0]}"
             try:
                 col1, col2 = st.columns([1, 9], gap="small", vertical_alignment="center")
                 with col1:
@@ -83,33 +176,47 @@ def main():
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Company", stock.info.get('longName', selected_symbol))
-                st.metric("Sector", stock.info.get('sector', 'N/A'))
-                st.metric("Market Cap", f"${stock.info['marketCap']/1e9:.1f}B")
+                st.metric("Company", info.get('longName', selected_symbol))
+                st.metric("Sector", info.get('sector', 'N/A'))
+                st.metric("Market Cap", f"${info['marketCap']/1e9:.1f}B")
             with col2:             
                 st.metric("Price", f"${df['Close'].iloc[-1]:.2f}")
-                st.metric("Target Price", f"${stock.info.get('targetMeanPrice', 'N/A'):.2f}")
+                st.metric("Target Price", f"${info.get('targetMeanPrice', 'N/A'):.2f}")
                 st.metric("Volume Ratio", f"{df['volume_ratio'].iloc[-1]:.1f}x")
             with col3:
                 st.metric("Gap Size", f"{df.loc[start_idx, 'pct_change']*100:.1f}%")
                 st.metric("Days Since Gap", f"{(df.index[-1] - start_idx).days}")
-                short_float = stock.info.get('shortPercentOfFloat')
+                short_float = info.get('shortPercentOfFloat')
                 short_float_display = f"{short_float*100:.1f}%" if short_float is not None else "N/A"
                 st.metric("Short Float", short_float_display)
 
+            # Patrón para toda la grilla de parámetros: mover los sliders es una consulta
+            grid = pattern_grid(selected_symbol, start_idx, df.index[-1], len(df), df)
+            with st.expander("Parameter sweep"):
+                st.plotly_chart(pattern_heatmap(grid, window, trend_sensitivity), use_container_width=True)
+
             if st.button(f"Analizar {selected_symbol}", type="primary"):
-                df, pattern = analyze_stock(df, start_idx, window, high_slope_threshold, low_slope_threshold)
-                
-                # Calcular variables necesarias
-                current_price = df['Close'].iloc[-1]
-                ma20 = df['ma_20'].iloc[-1]
-                ma50 = df['ma_50'].iloc[-1]
-                rsi = df['rsi'].iloc[-1]
-                gap_support = df.loc[start_idx, 'Low']
+                df, pattern = analyze_stock(df, start_idx, window, high_slope_threshold, low_slope_threshold, grid)
                 
                 # Grafico
-                fig, _ = create_chart(df, selected_symbol, start_idx)
-                st.pyplot(fig)
+                if interactive:
+                    # Reusar la figura del símbolo y solo actualizar las líneas del patrón
+                    chart_id = (selected_symbol, df.index[-1], start_idx)
+                    if st.session_state.get('interactive_chart_id') != chart_id:
+                        with metrics.timer('interactive_chart'):
+                            st.session_state.interactive_chart = create_interactive_chart(
+                                df, selected_symbol, start_idx, window, high_slope_threshold, low_slope_threshold,
+                                grid=grid)
+                        st.session_state.interactive_chart_id = chart_id
+                    else:
+                        with metrics.timer('update_pattern'):
+                            update_pattern(st.session_state.interactive_chart, df, selected_symbol, start_idx,
+                                           window, high_slope_threshold, low_slope_threshold, grid)
+                    st.plotly_chart(st.session_state.interactive_chart, use_container_width=True)
+                else:
+                    # Desde la caché de gráficos renderizados
+                    st.image(get_chart_cache().chart(df, selected_symbol, start_idx, window,
+                                                     high_slope_threshold, low_slope_threshold))
                 
                 # Información principal en dos columnas
                 col1, col2, col3 = st.columns([0.3, 0.35, 0.25], gap="small")
@@ -124,56 +231,9 @@ def main():
                     st.subheader("Setup Quality")
                     
                     # Evaluación del setup con más criterios
-                    setup_score = 0
-                    setup_reasons = []
-                    
-                    # Precio y Medias Móviles (30 puntos)
-                    if current_price > ma20:
-                        setup_score += 15
-                        setup_reasons.append("✅ Price above MA20")
-                        if current_price > ma50:
-                            setup_score += 15
-                            setup_reasons.append("✅ Price above MA50")
-                    else:
-                        setup_reasons.append("❌ Price below MA20")
-                    
-                    # Gap Support (20 puntos)
-                    if current_price > gap_support:
-                        setup_score += 20
-                        setup_reasons.append("✅ Holding gap level")
-                    else:
-                        setup_reasons.append("❌ Lost gap support")
-                    
-                    # RSI (20 puntos) - Nuevo análisis de tendencia
-                    rsi_trend = df['rsi'].iloc[-5:].diff().mean()  # Media de cambio en últimos 5 días
-                    if 40 < rsi < 70 and rsi_trend > 0:
-                        setup_score += 20
-                        setup_reasons.append("✅ RSI rising in healthy range")
-                    elif 40 < rsi < 70:
-                        setup_score += 10
-                        setup_reasons.append("⚠️ RSI stable in healthy range")
-                    else:
-                        setup_reasons.append("❌ RSI out of healthy range")
-                    
-                    # Volumen (20 puntos)
-                    recent_volume = df['Volume'].iloc[-5:].mean()
-                    avg_volume = df['Volume'].iloc[-20:].mean()
-                    if recent_volume > avg_volume:
-                        setup_score += 20
-                        setup_reasons.append("✅ Above average volume")
-                    else:
-                        setup_reasons.append("❌ Below average volume")
-                    
-                    # MACD (10 puntos)
-                    try:
-                        if df['histogram'].iloc[-1] > 0:
-                            setup_score += 10
-                            setup_reasons.append("✅ Positive MACD")
-                        else:
-                            setup_reasons.append("❌ Negative MACD")
-                    except (KeyError, AttributeError, IndexError):
-                        # Skip MACD analysis if data is not available
-                        setup_reasons.append("⚠️ MACD data not available")
+                    setup = score_setups({selected_symbol: {'df': df, 'start_idx': start_idx}}).iloc[0]
+                    setup_score = int(setup['score'])
+                    setup_reasons = setup_reasons_for(setup)
                     
                     # Mostrar Score y Calificación
                     st.progress(setup_score/100)
@@ -201,7 +261,7 @@ def main():
         # Mostrar los criterios actuales
         st.write("\nCurrent filtering criteria:")
         st.write("- Minimum Market Cap: $5B")
-        st.write("- Minimum Gap Size: 5%")
+        st.write(f"- Minimum Gap Size: {min_gap:g}%" + (" (held)" if held_only else ""))
         st.write("- Minimum Average Volume: 500,000")
         
         # Sugerir ajustes
@@ -211,6 +271,25 @@ def main():
         gap_percent=5              # Try lowering this
         avg_volume=500000          # Try lowering this
         """)
+
+    show_metrics()
+
+def show_metrics():
+    # Tiempos y contadores por etapa del pipeline (PEG_METRICS=0 los desactiva)
+    if not metrics.enabled():
+        return
+    with st.expander("Performance metrics"):
+        stages = metrics.snapshot()
+        if not stages:
+            st.write("No metrics recorded yet")
+            return
+        st.dataframe(pd.DataFrame.from_dict(stages, orient='index'))
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Export JSON", metrics.to_json(), file_name="metrics.json", mime="application/json")
+        with col2:
+            st.download_button("Export Prometheus", metrics.to_prometheus(), file_name="metrics.prom",
+                               mime="text/plain")
         
 
 if __name__ == "__main__":
@@ -0,0 +1,336 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from data_providers import FakeProvider, get_provider
+from indicators import IndicatorPanel, PANEL_COLUMNS
+from patterns import DEFAULT_PARAMS, PATTERN_COLUMNS, Pattern, PATTERN_CODES, classify, series_features
+from scoring import TAIL, TAIL_COLUMNS, score_tails
+from universes import DEFAULT_UNIVERSE, get_universe
+
+# Barras hábiles de la ventana de escaneo de filter_stocks ('1mo') y su filtro de volumen promedio
+SCAN_BARS = 21
+MIN_AVG_VOLUME = 500000
+# Barras hacia adelante en las que se miden retorno y drawdown
+HORIZONS = (5, 10, 20)
+# Patrones de continuación alcista que cuentan como señal por defecto
+BULLISH_PATTERNS = [Pattern.RECTANGLE, Pattern.ASCENDING_TRIANGLE, Pattern.FALLING_WEDGE, Pattern.ASCENDING_CHANNEL]
+# Grilla por defecto del walk-forward: (window, umbral de pendiente)
+DEFAULT_GRID = [(window, threshold) for window in range(3, 11)
+                for threshold in (0.001, 0.002, 0.003, 0.005, 0.01, 0.02, 0.05)]
+
+
+def load_history(symbols, provider=None, years=10):
+    """Historial diario del universo en una sola descarga (el PriceStore la cachea en disco)"""
+    provider = provider or get_provider()
+    return provider.download(list(symbols), period=f'{years}y')
+
+
+def decision_dates(frames, step=5):
+    """Fechas en las que se "corre" el screener: una cada `step` barras contando desde la última"""
+    index = None
+    for df in frames.values():
+        index = df.index if index is None else index.union(df.index)
+    return index[::-1][::step][::-1] if index is not None else pd.DatetimeIndex([])
+
+
+def _rolling_mean(values, window):
+    # Media de los últimos `window` valores no NaN por fila (como Series.mean() en la ventana de escaneo)
+    present = ~np.isnan(values)
+    sums = np.cumsum(np.where(present, values, 0.0), axis=1)
+    counts = np.cumsum(present, axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window].copy()
+    counts[:, window:] = counts[:, window:] - counts[:, :-window].copy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def find_decisions(panel, dates, gap_percent=5, scan_bars=SCAN_BARS, min_avg_volume=MIN_AVG_VOLUME):
+    """
+    Qué habría entregado filter_stocks en cada fecha de decisión, vectorizado sobre el panel
+
+    El gap activo es el último gap up (pct_change >= gap_percent) de las últimas `scan_bars`
+    barras, con el volumen promedio de esa ventana sobre el mínimo. El filtro de market cap
+    no se aplica (no hay fundamentales históricos).
+
+    Returns:
+    - (símbolos, filas de decisión, filas del gap) como arrays de posiciones del panel
+    """
+    column = {name: k for k, name in enumerate(PANEL_COLUMNS)}
+    close = panel.values[:, :, column['Close']]
+    gaps = panel.values[:, :, column['pct_change']] >= gap_percent / 100
+    positions = np.arange(len(panel.index))
+    last_gap = np.maximum.accumulate(np.where(gaps, positions, -1), axis=1)
+    active = ((last_gap >= 0) & (positions - last_gap < scan_bars)
+              & (_rolling_mean(panel.values[:, :, column['Volume']], scan_bars) >= min_avg_volume)
+              & ~np.isnan(close) & panel.index.isin(dates))
+    symbols, rows = np.nonzero(active)
+    return symbols, rows, last_gap[symbols, rows]
+
+
+def forward_outcomes(panel, symbols, rows, horizons=HORIZONS):
+    """
+    Retorno a cada horizonte (cierre de la fila de decisión contra el cierre `h` barras
+    después) y drawdown máximo en el camino (peor mínimo contra el precio de entrada)
+
+    Returns:
+    - dict 'return_{h}' / 'drawdown_{h}' -> array; NaN si el horizonte pasa el final de los datos
+    """
+    column = {name: k for k, name in enumerate(PANEL_COLUMNS)}
+    close = panel.values[:, :, column['Close']]
+    low = panel.values[:, :, column['Low']]
+    n_dates = close.shape[1]
+    entry = close[symbols, rows]
+    ahead = rows[:, None] + np.arange(1, max(horizons) + 1)
+    inside = ahead < n_dates
+    ahead = np.where(inside, ahead, n_dates - 1)
+    # fmin ignora los NaN (días sin cotización) al acumular el mínimo
+    lows = np.fmin.accumulate(np.where(inside, low[symbols[:, None], ahead], np.nan), axis=1)
+    closes = np.where(inside, close[symbols[:, None], ahead], np.nan)
+    outcomes = {}
+    for h in horizons:
+        outcomes[f'return_{h}'] = closes[:, h - 1] / entry - 1
+        outcomes[f'drawdown_{h}'] = np.where(inside[:, h - 1], np.minimum(lows[:, h - 1] / entry - 1, 0), np.nan)
+    return outcomes
+
+
+def decision_scores(panel, symbols, rows, gap_rows):
+    # Score del setup de la app con las TAIL barras que terminan en cada decisión
+    tail_rows = rows[:, None] - TAIL + 1 + np.arange(TAIL)
+    inside = tail_rows >= 0
+    tail_rows = np.where(inside, tail_rows, 0)
+    columns = [PANEL_COLUMNS.index(c) for c in TAIL_COLUMNS]
+    tails = panel.values[symbols[:, None], tail_rows][:, :, columns]
+    tails[~inside] = np.nan
+    gap_support = panel.values[symbols, gap_rows, PANEL_COLUMNS.index('Low')]
+    points, _ = score_tails(tails, gap_support, np.ones(len(symbols), dtype=bool))
+    return sum(points.values())
+
+
+def decision_series(panel, symbols, rows, gap_rows):
+    # Lo mismo que recibe identify_pattern: filas desde el gap hasta la decisión, sin NaN
+    columns = [PANEL_COLUMNS.index(c) for c in PATTERN_COLUMNS]
+    series = []
+    for symbol, row, gap_row in zip(symbols, rows, gap_rows):
+        window = panel.values[symbol, gap_row:row + 1]
+        window = window[~np.isnan(window).any(axis=1)]
+        series.append((row - gap_row + 1,) + tuple(window[:, c] for c in columns))
+    return series
+
+
+def _chunk_events(frames, dates, gap_percent, scan_bars, min_avg_volume, horizons):
+    # Eventos de un grupo de símbolos (corre en un worker)
+    panel = IndicatorPanel.from_frames(frames)
+    symbols, rows, gap_rows = find_decisions(panel, dates, gap_percent, scan_bars, min_avg_volume)
+    events = pd.DataFrame({
+        'symbol': np.array(panel.symbols, dtype=object)[symbols],
+        'date': panel.index[rows],
+        'gap_date': panel.index[gap_rows],
+        'gap_pct': panel.values[symbols, gap_rows, PANEL_COLUMNS.index('pct_change')] * 100,
+        'score': decision_scores(panel, symbols, rows, gap_rows),
+        **forward_outcomes(panel, symbols, rows, horizons),
+    })
+    return events, decision_series(panel, symbols, rows, gap_rows)
+
+
+def summarize(trades, horizon=10):
+    """
+    Métricas de un conjunto de trades a `horizon` barras
+
+    Returns:
+    - dict con trades, mean_return, median_return, hit_rate, avg_drawdown, worst_drawdown y
+      max_drawdown (de la curva que invierte por igual en las señales de cada fecha)
+    """
+    trades = trades[trades[f'return_{horizon}'].notna()]
+    returns = trades[f'return_{horizon}']
+    if len(trades) == 0:
+        return {'trades': 0, 'mean_return': 0.0, 'median_return': 0.0, 'hit_rate': 0.0,
+                'avg_drawdown': 0.0, 'worst_drawdown': 0.0, 'max_drawdown': 0.0}
+    equity = (1 + returns.groupby(trades['date']).mean()).cumprod()
+    return {
+        'trades': len(trades),
+        'mean_return': float(returns.mean()),
+        'median_return': float(returns.median()),
+        'hit_rate': float((returns > 0).mean()),
+        'avg_drawdown': float(trades[f'drawdown_{horizon}'].mean()),
+        'worst_drawdown': float(trades[f'drawdown_{horizon}'].min()),
+        'max_drawdown': float((equity / equity.cummax() - 1).min()),
+    }
+
+
+def walk_forward_splits(dates, train_years=3, test_years=1):
+    """
+    Ventanas consecutivas de entrenamiento y prueba que avanzan de a `test_years`
+
+    Returns:
+    - lista de (inicio de train, inicio de test, fin de test)
+    """
+    if len(dates) == 0:
+        return []
+    start, last = dates.min(), dates.max()
+    splits = []
+    while True:
+        test_start = start + pd.DateOffset(years=train_years)
+        test_end = test_start + pd.DateOffset(years=test_years)
+        if test_start > last:
+            break
+        splits.append((start, test_start, min(test_end, last + pd.Timedelta(days=1))))
+        start += pd.DateOffset(years=test_years)
+    return splits
+
+
+class Backtest:
+    """
+    Backtest de las señales gap + patrón sobre el historial del universo
+
+    Cada evento es una fecha de decisión en la que el screener habría entregado el símbolo:
+    gap activo, score del setup, retornos y drawdown hacia adelante, y la serie desde el gap
+    que recibe identify_pattern. Las pendientes se calculan una vez por `window` (como en
+    validation.ObjectiveEvaluator) y cada combinación de umbrales solo reclasifica.
+
+    Args:
+    - events (DataFrame): Un renglón por decisión (ver _chunk_events)
+    - series (list): Serie desde el gap de cada evento
+    - n_jobs (int): Procesos para calcular las pendientes de varios windows
+    """
+
+    def __init__(self, events, series, n_jobs=None):
+        self.events = events
+        self.series = series
+        self.n_jobs = n_jobs or os.cpu_count()
+        self.features = {}
+
+    @classmethod
+    def run(cls, frames, gap_percent=5, step=5, scan_bars=SCAN_BARS, min_avg_volume=MIN_AVG_VOLUME,
+            horizons=HORIZONS, workers=None, chunk_size=50):
+        """
+        Arma los eventos del universo repartiendo los símbolos en procesos
+
+        Args:
+        - frames (dict): {symbol: DataFrame OHLCV diario}
+        - step (int): Barras entre fechas de decisión (5 = una corrida por semana)
+        """
+        dates = decision_dates(frames, step)
+        symbols = list(frames)
+        chunks = [{symbol: frames[symbol] for symbol in symbols[i:i + chunk_size]}
+                  for i in range(0, len(symbols), chunk_size)]
+        args = (dates, gap_percent, scan_bars, min_avg_volume, horizons)
+        workers = workers or os.cpu_count()
+        if workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                results = list(executor.map(_chunk_events, chunks, *([arg] * len(chunks) for arg in args)))
+        else:
+            results = [_chunk_events(chunk, *args) for chunk in chunks]
+        events = pd.concat([result[0] for result in results], ignore_index=True) if results else pd.DataFrame()
+        series = [s for result in results for s in result[1]]
+        return cls(events, series, n_jobs=workers)
+
+    def __len__(self):
+        return len(self.events)
+
+    def precompute(self, windows):
+        missing = sorted(set(windows) - set(self.features))
+        if self.n_jobs > 1 and len(missing) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.n_jobs, len(missing))) as executor:
+                for window, features in zip(missing, executor.map(series_features, [self.series] * len(missing),
+                                                                  missing)):
+                    self.features[window] = features
+        else:
+            for window in missing:
+                self.features[window] = series_features(self.series, window)
+
+    def classify(self, params=None):
+        """
+        Patrón de cada evento con `params` (window, high_slope_threshold[, low_slope_threshold])
+
+        Returns:
+        - (códigos en PATTERN_CODES, -1 si no hay datos suficientes o variación; confianza)
+        """
+        window, threshold = params[:2] if params is not None else (DEFAULT_PARAMS['window'],
+                                                                   DEFAULT_PARAMS['high_slope_threshold'])
+        self.precompute([int(window)])
+        high_slopes, low_slopes, confidences, valid = self.features[int(window)]
+        codes, factors = classify(high_slopes, low_slopes, threshold)
+        return np.where(valid, codes, -1), np.where(valid, confidences * factors, 0.0)
+
+    def trades(self, params=None, patterns=BULLISH_PATTERNS, min_score=0, start=None, end=None):
+        """Eventos que son señal: patrón en `patterns`, score >= min_score y fecha en [start, end)"""
+        codes, confidence = self.classify(params)
+        wanted = [PATTERN_CODES.index(pattern) for pattern in patterns]
+        mask = np.isin(codes, wanted) & (self.events['score'].to_numpy() >= min_score)
+        if start is not None:
+            mask &= (self.events['date'] >= start).to_numpy()
+        if end is not None:
+            mask &= (self.events['date'] < end).to_numpy()
+        trades = self.events[mask].copy()
+        trades.insert(2, 'pattern', [PATTERN_CODES[code].value for code in codes[mask]])
+        trades.insert(3, 'confidence', confidence[mask])
+        return trades
+
+    def evaluate(self, params=None, horizon=10, **kwargs):
+        return summarize(self.trades(params, **kwargs), horizon)
+
+    def by_pattern(self, params=None, horizon=10, min_score=0):
+        """Métricas por patrón (todos los patrones clasificados, no solo los alcistas)"""
+        trades = self.trades(params, PATTERN_CODES, min_score)
+        return pd.DataFrame({pattern: summarize(group, horizon) for pattern, group in trades.groupby('pattern')}).T
+
+    def walk_forward(self, grid=DEFAULT_GRID, train_years=3, test_years=1, horizon=10, metric='mean_return',
+                     min_trades=30, **kwargs):
+        """
+        Elige los parámetros de la grilla en cada ventana de entrenamiento y los mide en la
+        ventana siguiente; en train solo cuentan los trades que cierran antes del test
+
+        Returns:
+        - DataFrame por ventana con los parámetros elegidos y las métricas de train y test
+        """
+        self.precompute([int(params[0]) for params in grid])
+        rows = []
+        for train_start, test_start, test_end in walk_forward_splits(self.events['date'], train_years, test_years):
+            train_end = test_start - pd.offsets.BDay(horizon)
+            best, best_train = None, None
+            for params in grid:
+                result = self.evaluate(params, horizon, start=train_start, end=train_end, **kwargs)
+                if result['trades'] >= min_trades and (best_train is None or result[metric] > best_train[metric]):
+                    best, best_train = params, result
+            if best is None:
+                continue
+            test = self.evaluate(best, horizon, start=test_start, end=test_end, **kwargs)
+            rows.append({'train_start': train_start.date(), 'test_start': test_start.date(),
+                         'test_end': test_end.date(), 'window': best[0], 'threshold': best[1],
+                         **{f'train_{k}': v for k, v in best_train.items()},
+                         **{f'test_{k}': v for k, v in test.items()}})
+        return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest walk-forward de las señales gap + patrón")
+    parser.add_argument('--universe', default=DEFAULT_UNIVERSE, help="Universo de símbolos (ver universes.json)")
+    parser.add_argument('--synthetic', type=int, metavar='N', help="Usar N símbolos sintéticos (FakeProvider)")
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--gap-percent', type=float, default=5)
+    parser.add_argument('--step', type=int, default=5, help="Barras entre fechas de decisión")
+    parser.add_argument('--horizon', type=int, default=10, choices=HORIZONS)
+    parser.add_argument('--window', type=int, default=DEFAULT_PARAMS['window'])
+    parser.add_argument('--high-slope-threshold', type=float, default=DEFAULT_PARAMS['high_slope_threshold'])
+    parser.add_argument('--min-score', type=int, default=0)
+    parser.add_argument('--train-years', type=int, default=3)
+    parser.add_argument('--test-years', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if args.synthetic:
+        provider = FakeProvider(years=args.years)
+        symbols = [f"SYM{i}" for i in range(args.synthetic)]
+    else:
+        provider = get_provider()
+        symbols = get_universe(args.universe)
+    frames = load_history(symbols, provider, args.years)
+    backtest = Backtest.run(frames, args.gap_percent, args.step, workers=args.workers)
+    params = (args.window, args.high_slope_threshold)
+    print(f"{len(backtest)} decisions over {len(frames)} symbols")
+    print(pd.Series(backtest.evaluate(params, args.horizon, min_score=args.min_score)).to_string())
+    print(backtest.by_pattern(params, args.horizon, args.min_score).to_string())
+    print(backtest.walk_forward(train_years=args.train_years, test_years=args.test_years, horizon=args.horizon,
+                                min_score=args.min_score).to_string())
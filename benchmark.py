@@ -0,0 +1,419 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+import tempfile
+import time
+import pandas as pd
+import synthetic
+from data_providers import FakeProvider
+from data_processing import (add_indicators, filter_stocks, get_bulk_stock_data, get_stock_data,
+                             process_and_cache_data, scan_gaps)
+from price_store import PriceStore
+from fundamentals import TokenBucket, clear_info_cache, fetch_fundamentals, set_rate_limiter
+from stock_analisys import analyze_stock, calculate_macd, identify_pattern
+from indicators import CompactPanel, IndicatorPanel, compute_indicators
+from patterns import (GRID_THRESHOLDS, GRID_WINDOWS, PATTERN_COLUMNS, PatternGrid, detect_pattern,
+                      identify_patterns_batch)
+from chart_cache import render_chart
+from validation import ObjectiveEvaluator
+from incremental import IndicatorState, PatternTracker
+from intraday import GapMonitor, ReplaySource
+
+# Corridas locales por commit (data/ no se versiona)
+BENCHMARK_DIR = os.path.join(os.environ.get('PEG_DATA_DIR', 'data'), 'benchmarks')
+# Referencia versionada para --compare sin argumento; los tiempos dependen de la máquina,
+# así que conviene regenerarla (--save-baseline) en la que se compara
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+SUITE_SIZES = [50, 500, 5000]
+# Un gráfico tarda ~1s: se mide una muestra y se informa el tiempo por gráfico
+CHART_SAMPLE = 20
+# Cuánto más lento tiene que ser un caso para marcarlo como regresión
+REGRESSION_THRESHOLD = 1.2
+
+
+def _universe(n_symbols):
+    return [f"SYM{i}" for i in range(n_symbols)]
+
+
+def bench_price_download(n_symbols=500, latency=0.05):
+    symbols = _universe(n_symbols)
+    results = {}
+
+    # Una llamada por símbolo (comportamiento anterior)
+    provider = FakeProvider(latency=latency)
+    t0 = time.perf_counter()
+    for symbol in symbols:
+        get_stock_data(symbol, period='1mo', provider=provider)
+    results['serial'] = (time.perf_counter() - t0, provider.calls)
+
+    # Descarga en chunks multi-símbolo
+    provider = FakeProvider(latency=latency)
+    t0 = time.perf_counter()
+    get_bulk_stock_data(symbols, period='1mo', provider=provider)
+    results['batched'] = (time.perf_counter() - t0, provider.calls)
+    return results
+
+
+def bench_price_store(n_symbols=500, latency=0.05):
+    symbols = _universe(n_symbols)
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        provider = FakeProvider(latency=latency, end=pd.Timestamp.now(tz='America/New_York').normalize())
+        for mode in ['cold', 'warm', 'next day']:
+            if mode == 'next day':
+                provider.end += pd.offsets.BDay(1)
+            # Un almacén nuevo en cada pasada simula un reinicio del proceso
+            store = PriceStore(provider, root=root, refresh_interval=0 if mode == 'next day' else 900)
+            calls = provider.calls
+            t0 = time.perf_counter()
+            get_bulk_stock_data(symbols, period='1y', provider=store)
+            results[mode] = (time.perf_counter() - t0, provider.calls - calls)
+    return results
+
+
+def bench_indicators(n_symbols=500):
+    provider = FakeProvider()
+    frames = provider.download(_universe(n_symbols), period='1y')
+    results = {}
+
+    t0 = time.perf_counter()
+    for df in frames.values():
+        calculate_macd(add_indicators(df.copy()))
+    results['per symbol (ta)'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    IndicatorPanel.from_frames(frames)
+    results['panel'] = time.perf_counter() - t0
+    return results
+
+
+def bench_patterns(n_symbols=500, gap_offset=60):
+    provider = FakeProvider()
+    panel = IndicatorPanel.from_frames(provider.download(_universe(n_symbols), period='1y'))
+    start = len(panel.index) - gap_offset
+    results = {}
+
+    t0 = time.perf_counter()
+    for symbol in panel.symbols:
+        identify_pattern(panel.frame(symbol), panel.index[start])
+    results['identify_pattern'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    identify_patterns_batch(panel, {symbol: start for symbol in panel.symbols})
+    results['batch'] = time.perf_counter() - t0
+    return results
+
+
+def bench_full_screen(n_symbols=500, latency=0.0):
+    symbols = _universe(n_symbols)
+    results = {}
+
+    # Dos fases sin streaming: 1mo para todo el universo y ytd para los filtrados, en una sola vuelta
+    clear_info_cache()
+    provider = FakeProvider(latency=latency)
+    t0 = time.perf_counter()
+    frames = provider.download(symbols, period='1mo')
+    closes = pd.DataFrame({s: df['Close'] for s, df in frames.items()})
+    volumes = pd.DataFrame({s: df['Volume'] for s, df in frames.items()})
+    candidates = scan_gaps(closes, volumes)
+    fundamentals = list(fetch_fundamentals(list(candidates.index), provider=provider))[-1][2]
+    survivors = [s for s in candidates.index if (fundamentals[s]['marketCap'] or 0) >= 5000000000]
+    get_bulk_stock_data(survivors, period='ytd', provider=provider)
+    results['two-phase'] = (time.perf_counter() - t0, provider.calls, provider.bytes_served)
+
+    # Screener en streaming: las mismas dos fases por chunk
+    clear_info_cache()
+    provider = FakeProvider(latency=latency)
+    t0 = time.perf_counter()
+    for _ in process_and_cache_data(symbols, provider=provider):
+        pass
+    results['streaming'] = (time.perf_counter() - t0, provider.calls, provider.bytes_served)
+
+    # Streaming detrás del almacén local, segunda pasada del día siguiente
+    with tempfile.TemporaryDirectory() as root:
+        provider = FakeProvider(latency=latency, end=pd.Timestamp.now(tz='America/New_York').normalize())
+        for _ in process_and_cache_data(symbols, provider=PriceStore(provider, root=root)):
+            pass
+        clear_info_cache()
+        provider.end += pd.offsets.BDay(1)
+        calls, served = provider.calls, provider.bytes_served
+        t0 = time.perf_counter()
+        for _ in process_and_cache_data(symbols, provider=PriceStore(provider, root=root, refresh_interval=0)):
+            pass
+        results['streaming + store (next day)'] = (time.perf_counter() - t0, provider.calls - calls,
+                                                  provider.bytes_served - served)
+    return results
+
+
+def bench_incremental(n_symbols=500, gap_offset=60):
+    # Una barra nueva: recálculo completo frente a actualizar el estado incremental
+    provider = FakeProvider()
+    frames = provider.download(_universe(n_symbols), period='1y')
+    closes = pd.DataFrame({s: df['Close'] for s, df in frames.items()})
+    volumes = pd.DataFrame({s: df['Volume'] for s, df in frames.items()}).astype(float)
+    start = len(closes) - gap_offset
+    state, _ = IndicatorState.from_history(closes.to_numpy()[:-1], volumes.to_numpy()[:-1])
+    trackers = {symbol: PatternTracker.from_frame(df.iloc[:-1], df.index[start]) for symbol, df in frames.items()}
+    bars = {symbol: df[list(PATTERN_COLUMNS)].to_numpy(dtype=float)[-1] for symbol, df in frames.items()}
+    results = {}
+
+    t0 = time.perf_counter()
+    compute_indicators(closes, volumes)
+    for df in frames.values():
+        detect_pattern(*(df[c].to_numpy(dtype=float)[start:] for c in PATTERN_COLUMNS))
+    results['full recompute'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    state.update(closes.to_numpy()[-1], volumes.to_numpy()[-1])
+    for symbol, tracker in trackers.items():
+        tracker.append(*bars[symbol])
+        tracker.result()
+    results['incremental'] = time.perf_counter() - t0
+    return results
+
+
+def bench_pattern_grid(n_symbols=20, gap_offset=60):
+    # Todas las combinaciones de los sliders de la app: una llamada por combinación frente a PatternGrid
+    frames = FakeProvider().download(_universe(n_symbols), period='1y')
+    starts = {symbol: df.index[-gap_offset] for symbol, df in frames.items()}
+    results = {}
+
+    t0 = time.perf_counter()
+    for symbol, df in frames.items():
+        for window in GRID_WINDOWS:
+            for threshold in GRID_THRESHOLDS:
+                identify_pattern(df, starts[symbol], window, threshold, threshold)
+    results['per call'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for symbol, df in frames.items():
+        PatternGrid.from_frame(df, starts[symbol])
+    results['grid'] = time.perf_counter() - t0
+    return results
+
+
+def bench_intraday(n_symbols=500, quotes_per_symbol=400):
+    # Reproducción de una sesión sintética: cotizaciones por segundo en un solo core
+    end = pd.Timestamp.now(tz='America/New_York').normalize()
+    end = end if end.dayofweek < 5 else end - pd.offsets.BDay(1)
+    frames = FakeProvider(end=end).download(_universe(n_symbols), period='1mo')
+    quotes = synthetic.intraday_quotes(frames, end.date(), quotes_per_symbol)
+    monitor = GapMonitor.from_history(frames, session=end.date())
+    t0 = time.perf_counter()
+    alerts = sum(len(batch) for batch in monitor.run(ReplaySource(quotes)))
+    elapsed = time.perf_counter() - t0
+    return {'quotes': len(quotes), 'elapsed': elapsed, 'quotes/s': len(quotes) / elapsed, 'alerts': alerts}
+
+
+def _timed(func, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def _drain(generator):
+    for _ in generator:
+        pass
+
+
+def _gap_starts(panel):
+    # Fecha del gap inyectado por synthetic; los símbolos sin gap se analizan desde 30 barras atrás.
+    # A principio de año el panel ytd puede tener menos barras: se empieza desde la primera
+    starts = {}
+    for symbol in panel.symbols:
+        setup = synthetic.plan(symbol)
+        offset = setup['offset'] if setup else 30
+        starts[symbol] = panel.index[-min(offset, len(panel.index))]
+    return starts
+
+
+def bench_suite(n_symbols, latency=0.05, chart_sample=CHART_SAMPLE):
+    """
+    Casos de referencia para un universo de `n_symbols` con el proveedor simulado
+
+    Returns:
+    - dict {caso: {'seconds', 'items', 'calls'}}; 'items' es cuántos símbolos (o gráficos)
+      procesó el caso, 'calls' las llamadas al proveedor y 'bytes' la memoria, cuando aplican
+    """
+    symbols = _universe(n_symbols)
+    end = pd.Timestamp.now(tz='America/New_York').normalize()
+    results = {}
+
+    clear_info_cache()
+    provider = FakeProvider(latency=latency, end=end, years=2)
+    elapsed, _ = _timed(_drain, filter_stocks(symbols, provider=provider))
+    results['filter_stocks'] = {'seconds': elapsed, 'items': n_symbols, 'calls': provider.calls}
+
+    clear_info_cache()
+    provider = FakeProvider(latency=latency, end=end, years=2)
+    screened = {}
+    t0 = time.perf_counter()
+    for _, _, delta in process_and_cache_data(symbols, provider=provider):
+        screened.update(delta or {})
+    results['process_and_cache_data'] = {'seconds': time.perf_counter() - t0, 'items': n_symbols,
+                                         'calls': provider.calls}
+
+    # Memoria del resultado del screener compactado (lo que la app comparte entre sesiones)
+    elapsed, compact = _timed(CompactPanel.from_screen, screened)
+    memory = compact.memory_report()
+    results['compact_panel'] = {'seconds': elapsed, 'items': len(screened), 'bytes': memory['panel_bytes'],
+                                'frames_bytes': memory['frames_bytes']}
+
+    panel = IndicatorPanel.from_frames(FakeProvider(end=end, years=2).download(symbols, period='ytd'))
+    starts = _gap_starts(panel)
+    frames = {symbol: panel.frame(symbol) for symbol in panel.symbols}
+
+    elapsed, _ = _timed(lambda: [identify_pattern(frames[s], starts[s]) for s in frames])
+    results['identify_pattern'] = {'seconds': elapsed, 'items': len(frames)}
+    elapsed, _ = _timed(lambda: [analyze_stock(frames[s], starts[s]) for s in frames])
+    results['analyze_stock'] = {'seconds': elapsed, 'items': len(frames)}
+
+    sample = list(frames)[:chart_sample]
+    elapsed, _ = _timed(lambda: [render_chart(frames[s], s, starts[s], 3, 0.05, 0.05) for s in sample])
+    results['create_chart'] = {'seconds': elapsed, 'items': len(sample)}
+
+    data = {symbol: {'df': frames[symbol], 'start_idx': starts[symbol]} for symbol in frames}
+    evaluator = ObjectiveEvaluator(data, n_jobs=1)
+    elapsed, _ = _timed(evaluator, (3, 0.05, 0.05))
+    results['validation_objective'] = {'seconds': elapsed, 'items': len(data)}
+    return results
+
+
+def git_revision():
+    """Commit actual (abreviado), con sufijo -dirty si hay cambios sin commitear"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}-dirty' if dirty else commit
+
+
+def save_results(results, latency, directory=BENCHMARK_DIR, path=None):
+    # Por defecto <directory>/<commit>.json; `path` para escribir otro archivo (p.ej. BASELINE_FILE)
+    revision = git_revision()
+    report = {'revision': revision, 'created_at': pd.Timestamp.now(tz='UTC').isoformat(),
+              'python': platform.python_version(), 'pandas': pd.__version__, 'latency': latency,
+              'results': results}
+    if path is None:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{revision}.json')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1)
+    return path
+
+
+def load_results(reference, directory=BENCHMARK_DIR):
+    # Acepta un archivo o una revisión de git (se resuelve al commit abreviado)
+    if not os.path.exists(reference):
+        try:
+            reference = subprocess.run(['git', 'rev-parse', '--short', reference], capture_output=True,
+                                       text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            pass
+        reference = os.path.join(directory, f'{reference}.json')
+    with open(reference) as f:
+        return json.load(f)
+
+
+def compare_results(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compara dos corridas caso por caso
+
+    Returns:
+    - (líneas de texto, lista de casos más lentos que `threshold` veces la referencia)
+    """
+    lines, regressions = [], []
+    for case, result in current.items():
+        before = baseline.get(case)
+        if before is None:
+            lines.append(f"{case:>32}: {result['seconds']:8.3f}s  (new)")
+            continue
+        ratio = result['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        marker = ''
+        if ratio > threshold:
+            regressions.append(case)
+            marker = '  REGRESSION'
+        lines.append(f"{case:>32}: {result['seconds']:8.3f}s  vs {before['seconds']:8.3f}s  x{ratio:.2f}{marker}")
+    return lines, regressions
+
+
+def print_comparisons(n_symbols, latency):
+    # Comparaciones A/B de las optimizaciones anteriores
+    print("Price download")
+    for mode, (elapsed, calls) in bench_price_download(n_symbols, latency).items():
+        print(f"{mode:>10}: {elapsed:7.2f}s  {calls} provider calls")
+    print("Full screen")
+    for mode, (elapsed, calls, served) in bench_full_screen(n_symbols, latency).items():
+        print(f"{mode:>28}: {elapsed:7.2f}s  {calls} provider calls  {served / 1e6:.1f} MB")
+    print("Indicators")
+    for mode, elapsed in bench_indicators(n_symbols).items():
+        print(f"{mode:>10}: {elapsed:7.2f}s")
+    print("Patterns")
+    for mode, elapsed in bench_patterns(n_symbols).items():
+        print(f"{mode:>10}: {elapsed:7.2f}s")
+    print("New bar")
+    for mode, elapsed in bench_incremental(n_symbols).items():
+        print(f"{mode:>14}: {elapsed:7.3f}s")
+    print("Parameter grid")
+    for mode, elapsed in bench_pattern_grid().items():
+        print(f"{mode:>10}: {elapsed:7.3f}s")
+    print("Intraday replay")
+    result = bench_intraday(n_symbols)
+    print(f"{result['quotes']} quotes in {result['elapsed']:.2f}s  {result['quotes/s']:,.0f} quotes/s  "
+          f"{result['alerts']} alerts")
+    print("Price store")
+    for mode, (elapsed, calls) in bench_price_store(n_symbols, latency).items():
+        print(f"{mode:>10}: {elapsed:7.2f}s  {calls} provider calls")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del screener con un proveedor local simulado")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SUITE_SIZES, help="Tamaños de universo de la suite")
+    parser.add_argument('--latency', type=float, default=0.05, help="Latencia simulada por llamada (segundos)")
+    parser.add_argument('--compare', metavar='REV', nargs='?', const=BASELINE_FILE,
+                        help="Revisión de git (o archivo) con la que comparar; sin valor, la referencia versionada")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--no-save', action='store_true', help="No guardar los resultados de esta corrida")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f"Guardar esta corrida como referencia versionada ({os.path.basename(BASELINE_FILE)})")
+    parser.add_argument('--comparisons', action='store_true',
+                        help="Correr las comparaciones A/B (antes/después) en lugar de la suite")
+    parser.add_argument('--symbols', type=int, default=500, help="Tamaño de universo de las comparaciones A/B")
+    args = parser.parse_args()
+
+    # Los datos son locales: el limitador de tasa de Yahoo solo agregaría esperas
+    set_rate_limiter(TokenBucket(rate=1e9, capacity=1e9))
+
+    if args.comparisons:
+        print_comparisons(args.symbols, args.latency)
+        sys.exit(0)
+
+    results = {}
+    for n_symbols in args.sizes:
+        print(f"Suite: {n_symbols} symbols")
+        for case, result in bench_suite(n_symbols, args.latency).items():
+            results[f'{case}@{n_symbols}'] = result
+            calls = f"  {result['calls']} provider calls" if 'calls' in result else ''
+            per_item = result['seconds'] / result['items'] * 1000 if result['items'] else 0
+            memory = f"  {result['bytes'] / 1e6:.1f} MB (float64 frames {result['frames_bytes'] / 1e6:.1f} MB)" \
+                if 'bytes' in result else ''
+            print(f"{case:>24}: {result['seconds']:8.3f}s  {per_item:7.2f} ms/item{calls}{memory}")
+
+    if not args.no_save:
+        print(f"Results saved to {save_results(results, args.latency)}")
+    if args.save_baseline:
+        print(f"Baseline saved to {save_results(results, args.latency, path=BASELINE_FILE)}")
+    if args.compare:
+        baseline = load_results(args.compare)
+        print(f"Compared with {baseline['revision']}")
+        lines, regressions = compare_results(results, baseline['results'], args.threshold)
+        print('\n'.join(lines))
+        if regressions:
+            print(f"{len(regressions)} regressions over x{args.threshold}")
+            sys.exit(1)
@@ -0,0 +1,143 @@
+import io
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import matplotlib
+import matplotlib.pyplot as plt
+from stock_analisys import create_chart
+from patterns import DEFAULT_PARAMS
+import instrumentation as metrics
+
+
+def chart_key(df, symbol, start_idx, window, high_slope_threshold, low_slope_threshold, fmt='png'):
+    return (symbol, df.index[-1].isoformat(), start_idx.isoformat(), int(window),
+            round(float(high_slope_threshold), 4), round(float(low_slope_threshold), 4), fmt)
+
+
+def render_chart(df, symbol, start_idx, window, high_slope_threshold, low_slope_threshold, fmt='png'):
+    """Renderiza create_chart a bytes (PNG o SVG) y libera la figura"""
+    matplotlib.use('Agg')
+    fig, _ = create_chart(df, symbol, start_idx, window, high_slope_threshold, low_slope_threshold)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+class ChartCache:
+    """
+    Caché LRU de gráficos renderizados, limitada por tamaño total en bytes
+
+    Args:
+    - max_bytes (int): Tamaño máximo de la caché
+    - max_workers (int): Procesos para el pre-renderizado en segundo plano
+    """
+
+    def __init__(self, max_bytes=200 * 1024 * 1024, max_workers=2):
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._charts = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __len__(self):
+        return len(self._charts)
+
+    def get(self, key):
+        with self._lock:
+            chart = self._charts.get(key)
+            if chart is not None:
+                self._charts.move_to_end(key)
+            return chart
+
+    def put(self, key, chart):
+        with self._lock:
+            if key in self._charts:
+                self.size -= len(self._charts.pop(key))
+            self._charts[key] = chart
+            self.size += len(chart)
+            # Desalojar los menos usados hasta volver al límite
+            while self.size > self.max_bytes and len(self._charts) > 1:
+                _, evicted = self._charts.popitem(last=False)
+                self.size -= len(evicted)
+
+    def chart(self, df, symbol, start_idx, window, high_slope_threshold, low_slope_threshold, fmt='png'):
+        """Devuelve el gráfico desde la caché o lo renderiza (esperando si se está pre-renderizando)"""
+        key = chart_key(df, symbol, start_idx, window, high_slope_threshold, low_slope_threshold, fmt)
+        chart = self.get(key)
+        if chart is not None:
+            self.hits += 1
+            metrics.count('chart_cache', 'hits')
+            return chart
+        self.misses += 1
+        metrics.count('chart_cache', 'misses')
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass
+        with metrics.timer('render_chart'):
+            chart = render_chart(df, symbol, start_idx, window, high_slope_threshold, low_slope_threshold, fmt)
+        self.put(key, chart)
+        return chart
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: matplotlib no es seguro entre threads y fork con threads activos tampoco
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def prerender(self, cached_data, params=None, fmt='png'):
+        """
+        Encola en segundo plano el renderizado de todos los símbolos del screener
+
+        Args:
+        - cached_data (dict): {symbol: {'df', 'start_idx'}}
+        - params (dict): window, high_slope_threshold, low_slope_threshold
+        """
+        params = params or DEFAULT_PARAMS
+        args = (params['window'], params['high_slope_threshold'], params['low_slope_threshold'], fmt)
+        for symbol, entry in cached_data.items():
+            key = chart_key(entry['df'], symbol, entry['start_idx'], *args)
+            if self.get(key) is not None:
+                continue
+            # _pending también lo modifican los callbacks de los threads del pool
+            with self._lock:
+                if key in self._pending:
+                    continue
+                future = self._get_executor().submit(render_chart, entry['df'], symbol, entry['start_idx'], *args)
+                self._pending[key] = future
+            # Fuera del lock: si el future ya terminó, el callback corre acá mismo y toma el lock
+            future.add_done_callback(lambda f, key=key: self._done(key, f))
+
+    def _done(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+        if future.exception() is None:
+            self.put(key, future.result())
+            metrics.count('chart_cache', 'prerendered')
+        else:
+            metrics.count('chart_cache', 'prerender_errors')
+            if isinstance(future.exception(), BrokenProcessPool):
+                # Un pool roto no acepta más trabajos: se recrea en el próximo prerender
+                self._executor = None
+            print(f"Error rendering chart {key[0]}: {future.exception()}")
+
+
+_chart_cache = None
+
+
+def get_chart_cache():
+    global _chart_cache
+    if _chart_cache is None:
+        _chart_cache = ChartCache()
+    return _chart_cache
@@ -1,18 +1,18 @@
-import yfinance as yf
+import time
 import pandas as pd
 from datetime import timedelta
 from stock_analisys import calculate_rsi
+from data_providers import fetch_period, get_provider, period_start
+from fundamentals import fetch_fundamentals
+from indicators import IndicatorPanel
+from universes import DEFAULT_UNIVERSE, get_universe
+import instrumentation as metrics
 
 
 def get_sp500_symbols():
-    url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-    table = pd.read_html(url, header=0)[0]
-    return list(table['Symbol'])
-
-def get_stock_data(symbol, period='ytd'):
-    stock = yf.Ticker(symbol)
-    df = stock.history(period=period)
+    return get_universe('sp500')
 
+def add_indicators(df):
     df['volume_ratio'] = df['Volume'] / df['Volume'].rolling(20).mean()
     df['pct_change'] = df['Close'].pct_change()
     df['ma_20'] = df['Close'].rolling(window=20).mean()
@@ -20,93 +20,162 @@ def get_stock_data(symbol, period='ytd'):
     df = calculate_rsi(df)
     return df
 
-def filter_stocks(symbols, market_cap_min=5000000000, gap_percent=5):
-    filtered_stocks = []
+def get_stock_data(symbol, period='ytd', provider=None):
+    provider = provider or get_provider()
+    with metrics.timer('history'):
+        df = provider.history(symbol, period=period)
+    with metrics.timer('indicators'):
+        return add_indicators(df)
+
+def get_bulk_stock_data(symbols, period='ytd', provider=None):
+    # Descarga OHLCV de todo el universo en llamadas multi-símbolo
+    provider = provider or get_provider()
+    panel = IndicatorPanel.from_frames(provider.download(list(symbols), period=period))
+    return {symbol: panel.frame(symbol) for symbol in panel.symbols}
+
+def scan_gaps(closes, volumes, gap_percent=5, min_avg_volume=500000, from_returns=False):
+    """
+    Pre-filtro vectorizado sobre paneles fechas × símbolos
+
+    Args:
+    - closes (DataFrame): Cierres, o directamente pct_change si from_returns=True
+    - volumes (DataFrame): Volúmenes
+
+    Returns:
+    - Series símbolo -> fecha del último gap up, solo para los símbolos que pasan
+    """
+    returns = closes if from_returns else closes.pct_change()
+    gaps = (returns >= gap_percent / 100) & (volumes.mean() >= min_avg_volume)
+    has_gap = gaps.any()
+    gaps = gaps.loc[:, has_gap]
+    if gaps.empty:
+        return pd.Series(dtype=object)
+    # Posición del último True de cada columna
+    last_pos = len(gaps) - 1 - gaps.values[::-1].argmax(axis=0)
+    return pd.Series(gaps.index[last_pos], index=gaps.columns)
+
+# Días de precios previos al tramo escaneado, para que su primer día tenga cierre anterior
+SCAN_LEAD_DAYS = 7
+
+def iter_filtered_stocks(symbols, market_cap_min=5000000000, gap_percent=5, provider=None, chunk_size=50,
+                         scan_period='1mo', history_period='ytd', max_workers=8, history=None):
+    """
+    Versión en streaming del filtro: procesa el universo por chunks y entrega los
+    símbolos que pasan apenas termina cada chunk
+
+    De todo el universo solo se descarga el tramo de `scan_period` (más unos días para el
+    cierre anterior al primer gap posible); el historial de `history_period`, con sus
+    indicadores, se pide únicamente para los que pasan los dos filtros (con el PriceStore,
+    del disco si ya está guardado). `max_workers` son los threads para los fundamentales.
+    Con `history` (un incremental.HistoryTracker que se conserva entre corridas) los
+    indicadores de los que ya venían pasando solo se calculan para las barras nuevas.
+
+    Yields:
+    - (progress, status, {symbol: {'df', 'start_idx'}} con los filtrados del chunk)
+    """
+    provider = provider or get_provider()
     total = len(symbols)
-    stocks_checked = 0
-    stocks_filtered = 0
-    
-    for i, symbol in enumerate(symbols):
-        try:
-            stocks_checked += 1
-            progress = (i + 1) / total
-            status = (f"Filtering stocks: {i + 1}/{total} ({symbol})\n"
-                     f"Passed filters: {len(filtered_stocks)}")
-            
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            
-            market_cap = info.get('marketCap', 0)
-            avg_volume = info.get('averageVolume', 0)
-            
-            if market_cap < market_cap_min:
-                stocks_filtered += 1
-                continue
-                
-            if avg_volume < 500000:
-                stocks_filtered += 1
-                continue
-            
-            df = get_stock_data(symbol, period='1mo')
-            
-            gap_up_idx = df[
-                (df['pct_change'] >= gap_percent / 100)
-            ].index
-            
-            if len(gap_up_idx) > 0:
-                last_gap_up = gap_up_idx[-1]
-                filtered_stocks.append((symbol, last_gap_up))
-                
-            yield progress, status, None
-                
-        except Exception as e:
-            print(f"Error processing {symbol}: {str(e)}")
-            continue
+    scan_start = period_start(scan_period)
+    # El historial tiene que incluir el gap aunque history_period empiece después (p.ej. 'ytd' en enero)
+    period = fetch_period(scan_period, history_period)
+    scanned = gaps = passed_total = 0
+    scan_time = fundamentals_time = 0.0
+
+    for chunk_start in range(0, total, chunk_size):
+        chunk = list(symbols[chunk_start:chunk_start + chunk_size])
+
+        # Etapa 1: gap y volumen sobre el tramo reciente de los precios, sin fundamentales
+        t0 = time.perf_counter()
+        with metrics.timer('download'):
+            frames = provider.download(chunk, start=scan_start - pd.Timedelta(days=SCAN_LEAD_DAYS))
+        with metrics.timer('gap_scan'):
+            closes = pd.DataFrame({symbol: df['Close'] for symbol, df in frames.items()})
+            volumes = pd.DataFrame({symbol: df['Volume'] for symbol, df in frames.items()})
+            recent = closes.index >= scan_start
+            candidates = scan_gaps(closes.pct_change().loc[recent], volumes.loc[recent], gap_percent,
+                                   from_returns=True) if frames else pd.Series(dtype=object)
+        scanned += len(chunk)
+        gaps += len(candidates)
+        scan_time += time.perf_counter() - t0
+
+        # Etapa 2: fundamentales solo para los supervivientes (filtro de market cap)
+        t0 = time.perf_counter()
+        fundamentals = {}
+        with metrics.timer('fundamentals'):
+            for _, _, result in fetch_fundamentals(list(candidates.index), max_workers=max_workers,
+                                                   provider=provider):
+                if result is not None:
+                    fundamentals = result
+        survivors = [symbol for symbol in candidates.index
+                     if symbol in fundamentals and (fundamentals[symbol].get('marketCap') or 0) >= market_cap_min]
+        fundamentals_time += time.perf_counter() - t0
+
+        # Historial con indicadores solo para los que pasaron
+        passed = {}
+        if survivors:
+            with metrics.timer('download'):
+                frames = provider.download(survivors, period=period)
+            with metrics.timer('indicators'):
+                if history is None:
+                    panel = IndicatorPanel.from_frames(frames)
+                    frames = {symbol: panel.frame(symbol) for symbol in panel.symbols}
+                else:
+                    frames = history.update(frames)
+            passed = {symbol: {'df': frames[symbol], 'start_idx': candidates[symbol]}
+                      for symbol in survivors if symbol in frames}
+        passed_total += len(passed)
+        metrics.count('screen', 'symbols', len(chunk))
+        metrics.count('screen', 'gaps', len(candidates))
+        metrics.count('screen', 'passed', len(passed))
+
+        stage1 = f"Stage 1 (gap/volume scan): {scanned} in, {gaps} out, {scan_time:.1f}s"
+        stage2 = f"Stage 2 (market cap): {gaps} in, {passed_total} out, {fundamentals_time:.1f}s"
+        status = (f"Filtering stocks: {scanned}/{total} ({chunk[-1]})\n"
+                  f"Passed filters: {passed_total}\n{stage1}\n{stage2}")
+        yield scanned / total, status, passed
     
     # Mostrar resumen final
     final_status = (f"\nFiltering complete:\n"
-                   f"Total stocks checked: {stocks_checked}\n"
-                   f"Stocks filtered out: {stocks_filtered}\n"
-                   f"Stocks with gaps: {len(filtered_stocks)}")
-    yield 1.0, final_status, filtered_stocks
+                   f"Total stocks checked: {total}\n"
+                   f"Stocks filtered out: {total - passed_total}\n"
+                   f"Stocks with gaps: {passed_total}\n"
+                   f"Stage 1 (gap/volume scan): {total} in, {gaps} out, {scan_time:.1f}s\n"
+                   f"Stage 2 (market cap): {gaps} in, {passed_total} out, {fundamentals_time:.1f}s")
+    yield 1.0, final_status, {}
+
+def filter_stocks(symbols, market_cap_min=5000000000, gap_percent=5, provider=None):
+    filtered_stocks = []
+    for progress, status, passed in iter_filtered_stocks(symbols, market_cap_min, gap_percent, provider):
+        filtered_stocks.extend((symbol, entry['start_idx']) for symbol, entry in passed.items())
+        yield progress, status, (filtered_stocks if status.startswith('\nFiltering complete') else None)
     
     return filtered_stocks
 
-def process_and_cache_data():
-    symbols = get_sp500_symbols()
-    cached_data = {}
+def process_and_cache_data(symbols=None, provider=None, universe=DEFAULT_UNIVERSE, gap_percent=5, history=None):
+    """
+    Screener completo en streaming: los símbolos de cada chunk que pasan el filtro se
+    entregan de inmediato con su historial
+
+    Args:
+    - symbols (list): Símbolos a analizar (por defecto los del universo)
+    - universe (str): Universo del registro de universes.json
+    - gap_percent (float): Gap mínimo del filtro
+    - history (HistoryTracker): Estado incremental de los indicadores entre corridas
+
+    Yields:
+    - (progress, status, delta) donde delta es {symbol: {'df', 'start_idx'}} solo con los
+      símbolos nuevos de ese paso, o None
+    """
+    symbols = symbols or get_universe(universe)
+    provider = provider or get_provider()
+    loaded = 0
     
-    # Fase 1: Filtrado de stocks
-    filtered_stocks = None
-    for progress, status, result in filter_stocks(symbols):
-        yield progress * 0.5, status, None
-        # Capturar la lista final de stocks filtrados
-        if status.startswith('\nFiltering complete'):
-            filtered_stocks = result  # Aquí guardamos la lista, no el generador
+    for progress, status, delta in iter_filtered_stocks(symbols, gap_percent=gap_percent, provider=provider,
+                                                        history=history):
+        loaded += len(delta)
+        yield progress, f"{status}\nLoaded: {loaded}", delta or None
     
-    # Verificar si tenemos stocks filtrados
-    if not filtered_stocks:
+    if loaded == 0:
         yield 1.0, "No stocks found", {}
-        return
-    
-    # Fase 2: Carga de datos históricos
-    total_filtered = len(filtered_stocks)
-    
-    for i, (symbol, start_idx) in enumerate(filtered_stocks):
-        try:
-            progress = (i + 1) / total_filtered
-            status = f"Loading historical data: {i + 1}/{total_filtered} ({symbol})"
-            
-            df = get_stock_data(symbol)
-            cached_data[symbol] = {'df': df, 'start_idx': start_idx}
-            
-            yield 0.5 + (progress * 0.5), status, cached_data
-            
-        except Exception as e:
-            print(f"Error loading data for {symbol}: {str(e)}")
-            continue
-    
-    if not cached_data:
-        yield 1.0, "No data loaded", {}
     else:
-        yield 1.0, f"Loaded {len(cached_data)} stocks", cached_data
+        yield 1.0, f"Loaded {loaded} stocks", None
@@ -0,0 +1,182 @@
+import time
+import pandas as pd
+import yfinance as yf
+
+MARKET_TZ = 'America/New_York'
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def period_start(period, end=None):
+    """
+    Traduce un período estilo yfinance ('1mo', 'ytd', '1y', ...) a la fecha de inicio
+
+    Args:
+    - period (str): Período de yfinance
+    - end (Timestamp): Fecha final (por defecto hoy)
+
+    Returns:
+    - Timestamp de inicio, o None para 'max'
+    """
+    end = pd.Timestamp.now(tz=MARKET_TZ).normalize() if end is None else end
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return end.replace(month=1, day=1)
+    units = {'d': 'days', 'wk': 'weeks', 'mo': 'months', 'y': 'years'}
+    for suffix, unit in units.items():
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            return end - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def fetch_period(*periods):
+    # El período de yfinance que cubre a todos los demás (el de inicio más temprano)
+    starts = {period: period_start(period) for period in periods}
+    if any(start is None for start in starts.values()):
+        return 'max'
+    return min(starts, key=starts.get)
+
+
+def trading_day(now=None):
+    """Último día hábil en la zona del mercado (los fines de semana cuentan como el viernes)"""
+    now = pd.Timestamp.now(tz=MARKET_TZ) if now is None else now
+    return pd.offsets.BDay().rollback(now.normalize()).date()
+
+
+class YFinanceProvider:
+    """Proveedor por defecto: Yahoo Finance a través de yfinance"""
+
+    def __init__(self, chunk_size=100):
+        self.chunk_size = chunk_size
+
+    def info(self, symbol):
+        return yf.Ticker(symbol).info
+
+    def history(self, symbol, period='ytd', start=None):
+        if start is not None:
+            return yf.Ticker(symbol).history(start=start)
+        return yf.Ticker(symbol).history(period=period)
+
+    def download(self, symbols, period='ytd', start=None):
+        # Una sola llamada multi-símbolo por chunk en vez de una por símbolo
+        frames = {}
+        span = {'start': start} if start is not None else {'period': period}
+        for i in range(0, len(symbols), self.chunk_size):
+            chunk = list(symbols[i:i + self.chunk_size])
+            data = yf.download(chunk, group_by='ticker', auto_adjust=True,
+                               ignore_tz=False, threads=True, progress=False, **span)
+            frames.update(split_download(data, chunk))
+        return frames
+
+
+class FakeProvider:
+    """
+    Proveedor local con datos sintéticos deterministas y latencia simulada por llamada,
+    pensado para benchmarks sin red
+
+    Las series salen de synthetic.generate_ohlcv: una fracción `gap_rate` de los símbolos
+    trae un gap reciente seguido de una formación. Cada símbolo se genera una sola vez sobre
+    un calendario fijo alrededor de `end` (o de hoy) y cada pedido es un recorte de esa
+    serie, así que avanzar `end` agrega barras a la misma serie en vez de generar otra.
+    """
+
+    # Años de calendario posteriores a la fecha de referencia, para avanzar `end` día a día
+    FUTURE_YEARS = 1
+
+    def __init__(self, latency=0.0, end=None, seed=0, chunk_size=100, gap_rate=0.2, years=10):
+        self.latency = latency
+        self.gap_rate = gap_rate
+        self.years = years
+        self.chunk_size = chunk_size
+        self.end = end
+        self.seed = seed
+        self.calls = 0
+        self.bytes_served = 0
+        # Fecha de referencia de los gaps recientes; queda fija aunque `end` cambie
+        self.anchor = pd.Timestamp.now(tz=MARKET_TZ).normalize() if end is None else end
+        self.calendar = pd.bdate_range(self.anchor - pd.DateOffset(years=years),
+                                       self.anchor + pd.DateOffset(years=self.FUTURE_YEARS), tz=MARKET_TZ, name='Date')
+        self._frames = {}
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _full_frame(self, symbol):
+        if symbol not in self._frames:
+            # Import diferido: synthetic depende de patterns, que importa este módulo
+            from synthetic import generate_ohlcv
+            anchor = self.calendar.searchsorted(self.anchor, side='right')
+            self._frames[symbol] = generate_ohlcv(symbol, self.calendar, self.seed, self.gap_rate, anchor)
+        return self._frames[symbol]
+
+    def _frame(self, symbol, period, start=None):
+        end = pd.Timestamp.now(tz=MARKET_TZ).normalize() if self.end is None else self.end
+        df = self._full_frame(symbol).loc[:end]
+        if start is None:
+            start = period_start(period, end)
+        else:
+            start = pd.Timestamp(start)
+            start = start.tz_localize(MARKET_TZ) if start.tzinfo is None else start
+        df = df.copy() if start is None else df.loc[start:].copy()
+        self.bytes_served += df.memory_usage(index=True).sum()
+        return df
+
+    def info(self, symbol):
+        self._wait()
+        from synthetic import symbol_rng
+        rng = symbol_rng(symbol, self.seed, 1)
+        return {
+            'symbol': symbol,
+            'longName': f"{symbol} Inc.",
+            'sector': 'Technology',
+            'marketCap': int(rng.integers(1_000_000_000, 500_000_000_000)),
+            'averageVolume': int(rng.integers(100_000, 10_000_000)),
+            'shortPercentOfFloat': float(rng.uniform(0, 0.2)),
+            'targetMeanPrice': float(rng.uniform(20, 200)),
+            'website': f"https://www.{symbol.lower()}.com",
+        }
+
+    def history(self, symbol, period='ytd', start=None):
+        self._wait()
+        return self._frame(symbol, period, start)
+
+    def download(self, symbols, period='ytd', start=None):
+        frames = {}
+        for i in range(0, len(symbols), self.chunk_size):
+            self._wait()
+            frames.update({symbol: self._frame(symbol, period, start)
+                           for symbol in symbols[i:i + self.chunk_size]})
+        return frames
+
+
+def split_download(data, symbols):
+    """Separa el resultado de yf.download(group_by='ticker') en un DataFrame por símbolo"""
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    if not isinstance(data.columns, pd.MultiIndex):
+        data = pd.concat({symbols[0]: data}, axis=1)
+    for symbol in data.columns.get_level_values(0).unique():
+        df = data[symbol].dropna(how='all')
+        if len(df) > 0:
+            frames[symbol] = df[[c for c in OHLCV_COLUMNS if c in df.columns]]
+    return frames
+
+
+_provider = None
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        # Por defecto yfinance detrás del almacén local de precios (PEG_PRICE_STORE=0 lo desactiva)
+        from price_store import PriceStore, store_enabled
+        _provider = PriceStore(YFinanceProvider()) if store_enabled() else YFinanceProvider()
+    return _provider
+
+
+def set_provider(provider):
+    global _provider
+    _provider = provider
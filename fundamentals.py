@@ -0,0 +1,114 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from data_providers import get_provider, trading_day
+import instrumentation as metrics
+
+FUNDAMENTAL_FIELDS = ['marketCap', 'averageVolume', 'sector', 'shortPercentOfFloat',
+                      'targetMeanPrice', 'website', 'longName']
+
+
+class TokenBucket:
+    """Limitador de tasa: `rate` peticiones por segundo con ráfagas de hasta `capacity`"""
+
+    def __init__(self, rate=10.0, capacity=20):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_info_cache = {}
+# Día de mercado al que corresponde _info_cache; al cambiar se descarta todo
+_cache_day = None
+_cache_lock = threading.Lock()
+_rate_limiter = TokenBucket()
+
+
+def get_info(symbol, provider=None, retries=3, backoff=0.5, rate_limiter=None):
+    """
+    Devuelve el dict `info` de un símbolo, memoizado durante el día de mercado (trading_day)
+
+    Reintenta con backoff exponencial y respeta el limitador de tasa compartido.
+    """
+    global _cache_day
+    with _cache_lock:
+        day = trading_day()
+        if day != _cache_day:
+            # Market cap y volumen promedio cambian de un día a otro
+            _info_cache.clear()
+            _cache_day = day
+        if symbol in _info_cache:
+            metrics.count('info', 'hits')
+            return _info_cache[symbol]
+    metrics.count('info', 'misses')
+
+    provider = provider or get_provider()
+    rate_limiter = rate_limiter or _rate_limiter
+    for attempt in range(retries):
+        rate_limiter.acquire()
+        try:
+            with metrics.timer('info'):
+                info = provider.info(symbol)
+            break
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            metrics.count('info', 'retries')
+            time.sleep(backoff * 2 ** attempt)
+
+    with _cache_lock:
+        _info_cache[symbol] = info
+    return info
+
+
+def set_rate_limiter(rate_limiter):
+    # Limitador compartido por defecto (p.ej. uno sin límite para benchmarks con datos locales)
+    global _rate_limiter
+    _rate_limiter = rate_limiter
+
+
+def clear_info_cache():
+    with _cache_lock:
+        _info_cache.clear()
+
+
+def fetch_fundamentals(symbols, max_workers=8, provider=None, rate_limiter=None):
+    """
+    Descarga en paralelo los fundamentales de varios símbolos
+
+    Sigue el protocolo de progreso (progress, status, data): los pasos intermedios
+    devuelven data=None y el último el dict {symbol: {campo: valor}}.
+    """
+    total = len(symbols)
+    fundamentals = {}
+    if total == 0:
+        yield 1.0, "No symbols to fetch", fundamentals
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(get_info, symbol, provider, rate_limiter=rate_limiter): symbol
+                   for symbol in symbols}
+        for i, future in enumerate(as_completed(futures)):
+            symbol = futures[future]
+            try:
+                info = future.result()
+                fundamentals[symbol] = {field: info.get(field) for field in FUNDAMENTAL_FIELDS}
+            except Exception as e:
+                print(f"Error fetching info for {symbol}: {str(e)}")
+            yield (i + 1) / total, f"Fetching fundamentals: {i + 1}/{total} ({symbol})", None
+
+    yield 1.0, f"Fetched fundamentals for {len(fundamentals)}/{total} stocks", fundamentals
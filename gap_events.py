@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+# Tamaño mínimo (en %, en valor absoluto) de los movimientos que se indexan: cualquier umbral
+# de la interfaz por encima de este es una consulta, sin volver a escanear precios
+MIN_GAP_PERCENT = 3
+EVENT_COLUMNS = ['symbol', 'date', 'direction', 'gap_pct', 'volume_ratio', 'prior_close', 'close',
+                 'filled_date', 'held']
+# Barras que se revisan por vuelta al buscar cuándo se cerró cada gap
+FILL_BLOCK = 64
+
+
+def _fill_rows(close, rows, columns, level, up):
+    """
+    Primera fila posterior al gap en la que el cierre vuelve al nivel previo (por debajo para
+    gaps up, por encima para gaps down), vectorizado sobre todos los eventos a la vez
+
+    Returns:
+    - array de filas, -1 si el gap sigue abierto
+    """
+    n_dates = close.shape[0]
+    fill = np.full(len(rows), -1, dtype=np.int64)
+    pending = np.arange(len(rows))
+    offset = 1
+    while len(pending) and offset < n_dates:
+        ahead = rows[pending, None] + offset + np.arange(FILL_BLOCK)
+        inside = ahead < n_dates
+        values = close[np.where(inside, ahead, n_dates - 1), columns[pending, None]]
+        with np.errstate(invalid='ignore'):
+            crossed = inside & np.where(up[pending, None], values < level[pending, None],
+                                        values > level[pending, None])
+        found = crossed.any(axis=1)
+        fill[pending[found]] = ahead[found, crossed[found].argmax(axis=1)]
+        # Siguen pendientes los que no cruzaron y todavía tienen barras por delante
+        pending = pending[~found & inside[:, -1]]
+        offset += FILL_BLOCK
+    return fill
+
+
+def find_gap_events(closes, volumes, returns=None, volume_ratio=None, min_gap_percent=MIN_GAP_PERCENT):
+    """
+    Todos los gaps (up y down) de un panel fechas × símbolos, vectorizado
+
+    Un gap es un cambio de cierre a cierre de al menos `min_gap_percent` (la regla de
+    filter_stocks); se mantiene ("held") si desde entonces ningún cierre volvió al cierre
+    previo al gap.
+
+    Args:
+    - closes, volumes (DataFrame): Paneles fechas × símbolos
+    - returns, volume_ratio (DataFrame): Indicadores ya calculados (por defecto los de
+      compute_indicators)
+
+    Returns:
+    - DataFrame con EVENT_COLUMNS ordenado por símbolo y fecha
+    """
+    close = closes.to_numpy(dtype=float)
+    returns = (closes.pct_change() if returns is None else returns).to_numpy(dtype=float)
+    if volume_ratio is None:
+        volume_ratio = volumes / volumes.rolling(20).mean()
+    with np.errstate(invalid='ignore'):
+        rows, columns = np.nonzero(np.abs(returns) >= min_gap_percent / 100)
+    level = close[rows - 1, columns]
+    up = returns[rows, columns] > 0
+    fill = _fill_rows(close, rows, columns, level, up)
+    filled_date = pd.DatetimeIndex(closes.index[np.maximum(fill, 0)]).where(fill >= 0)
+    events = pd.DataFrame({
+        'symbol': np.asarray(closes.columns, dtype=object)[columns],
+        'date': closes.index[rows],
+        'direction': np.where(up, 'up', 'down'),
+        'gap_pct': returns[rows, columns] * 100,
+        'volume_ratio': volume_ratio.to_numpy(dtype=float)[rows, columns],
+        'prior_close': level,
+        'close': close[rows, columns],
+        'filled_date': filled_date,
+        'held': fill < 0,
+    }, columns=EVENT_COLUMNS)
+    return events.sort_values(['symbol', 'date'], kind='stable', ignore_index=True)
+
+
+def _field(frames, column):
+    return pd.DataFrame({symbol: df[column] for symbol, df in frames.items()})
+
+
+class GapIndex:
+    """
+    Índice de gaps de un universo: cambiar el umbral de gap, la dirección o pedir solo los
+    que se mantuvieron es una consulta sobre este índice en vez de un nuevo escaneo
+
+    Args:
+    - events (DataFrame): Eventos con EVENT_COLUMNS (ver find_gap_events)
+    """
+
+    def __init__(self, events):
+        self.events = events
+
+    @classmethod
+    def from_frames(cls, frames, min_gap_percent=MIN_GAP_PERCENT):
+        """Índice de {symbol: DataFrame}; usa pct_change/volume_ratio de los frames si ya los tienen"""
+        frames = {symbol: df for symbol, df in frames.items() if len(df) > 0}
+        if not frames:
+            return cls(pd.DataFrame(columns=EVENT_COLUMNS))
+        computed = all('pct_change' in df and 'volume_ratio' in df for df in frames.values())
+        return cls(find_gap_events(_field(frames, 'Close'), _field(frames, 'Volume'),
+                                   _field(frames, 'pct_change') if computed else None,
+                                   _field(frames, 'volume_ratio') if computed else None, min_gap_percent))
+
+    @classmethod
+    def from_store(cls, store, symbols):
+        """Índice guardado por el PriceStore junto a los precios (sin descargar nada)"""
+        events = [store.read_events(symbol) for symbol in symbols]
+        events = [e for e in events if e is not None and len(e) > 0]
+        return cls(pd.concat(events, ignore_index=True) if events else pd.DataFrame(columns=EVENT_COLUMNS))
+
+    def __len__(self):
+        return len(self.events)
+
+    def query(self, min_gap=5, direction='up', since=None, until=None, held=None, min_volume_ratio=None,
+              symbols=None):
+        """
+        Gaps que cumplen los filtros
+
+        Args:
+        - min_gap (float): Tamaño mínimo en % (valor absoluto), no menor que el del índice
+        - direction (str): 'up', 'down' o None para ambos
+        - since, until (Timestamp): Rango de fechas [since, until]
+        - held (bool): Solo los que se mantuvieron (True) o los que se cerraron (False)
+        - min_volume_ratio (float): Volumen del día del gap contra su media de 20 días
+        - symbols (list): Restringir a estos símbolos
+
+        Returns:
+        - DataFrame con los eventos
+        """
+        events = self.events
+        mask = events['gap_pct'].abs() >= min_gap
+        if direction is not None:
+            mask &= events['direction'] == direction
+        if since is not None:
+            mask &= events['date'] >= since
+        if until is not None:
+            mask &= events['date'] <= until
+        if held is not None:
+            mask &= events['held'] == held
+        if min_volume_ratio is not None:
+            mask &= events['volume_ratio'] >= min_volume_ratio
+        if symbols is not None:
+            mask &= events['symbol'].isin(symbols)
+        return events[mask]
+
+    def last_gaps(self, min_gap=5, direction='up', since=None, **kwargs):
+        """
+        Fecha del último gap que cumple los filtros por símbolo (lo mismo que scan_gaps sin
+        el filtro de volumen promedio)
+
+        Returns:
+        - Series símbolo -> fecha
+        """
+        events = self.query(min_gap, direction, since, **kwargs)
+        return events.groupby('symbol', sort=False)['date'].last()
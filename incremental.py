@@ -0,0 +1,408 @@
+import operator
+import numpy as np
+import pandas as pd
+from data_providers import OHLCV_COLUMNS
+from indicators import INDICATOR_COLUMNS, PANEL_COLUMNS, IndicatorPanel
+from patterns import (DEFAULT_PARAMS, PATTERN_COLUMNS, Pattern, PatternResult, PATTERN_CODES, classify, fit_slope,
+                      pattern_inputs)
+
+
+class EWMState:
+    """
+    Media exponencial incremental para varios símbolos a la vez
+
+    Misma recurrencia que pandas ewm(adjust=False, ignore_na=False): los NaN no cuentan
+    como observación pero sí envejecen el peso del valor anterior; la salida es NaN hasta
+    tener `min_periods` observaciones.
+    """
+
+    def __init__(self, n, alpha, min_periods):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.weighted = np.full(n, np.nan)
+        self.old_weight = np.ones(n)
+        self.observations = np.zeros(n, dtype=np.int64)
+
+    def update(self, values):
+        observed = ~np.isnan(values)
+        started = ~np.isnan(self.weighted)
+        self.observations += observed
+        self.old_weight = np.where(started, self.old_weight * (1 - self.alpha), self.old_weight)
+        combine = started & observed & (self.weighted != values)
+        with np.errstate(invalid='ignore'):
+            combined = ((self.old_weight * self.weighted + self.alpha * values)
+                        / (self.old_weight + self.alpha))
+        self.weighted = np.where(combine, combined, np.where(~started & observed, values, self.weighted))
+        self.old_weight = np.where(started & observed, 1.0, self.old_weight)
+        return np.where(self.observations >= self.min_periods, self.weighted, np.nan)
+
+    def select(self, positions):
+        state = EWMState(len(positions), self.alpha, self.min_periods)
+        state.weighted = self.weighted[positions]
+        state.old_weight = self.old_weight[positions]
+        state.observations = self.observations[positions]
+        return state
+
+
+class RollingMeanState:
+    """Media móvil incremental (rolling(window).mean(), sin min_periods) con suma acumulada y buffer circular"""
+
+    def __init__(self, n, window):
+        self.window = window
+        self.buffer = np.full((n, window), np.nan)
+        self.total = np.zeros(n)
+        self.missing = np.full(n, window, dtype=np.int64)
+        self.head = 0
+
+    def update(self, values):
+        leaving = self.buffer[:, self.head]
+        self.total -= np.nan_to_num(leaving)
+        self.missing -= np.isnan(leaving)
+        self.total += np.nan_to_num(values)
+        self.missing += np.isnan(values)
+        self.buffer[:, self.head] = values
+        self.head = (self.head + 1) % self.window
+        # Ventanas vacías: se reinicia la suma para no arrastrar error de redondeo
+        self.total[self.missing == self.window] = 0.0
+        return np.where(self.missing == 0, self.total / self.window, np.nan)
+
+    def select(self, positions):
+        state = RollingMeanState(len(positions), self.window)
+        state.buffer = self.buffer[positions]
+        state.total = self.total[positions]
+        state.missing = self.missing[positions]
+        state.head = self.head
+        return state
+
+
+class IndicatorState:
+    """
+    Estado de los indicadores de compute_indicators para un universo de símbolos
+
+    `update` recibe el cierre y el volumen de una nueva barra (un valor por símbolo) y
+    devuelve los indicadores de esa barra en O(1) por símbolo: EMAs de MACD, medias de
+    Wilder del RSI y sumas móviles de las medias y del volume ratio.
+    """
+
+    def __init__(self, n_symbols):
+        self.n_symbols = n_symbols
+        self.previous_close = np.full(n_symbols, np.nan)
+        self.ma_20 = RollingMeanState(n_symbols, 20)
+        self.ma_50 = RollingMeanState(n_symbols, 50)
+        self.volume_mean = RollingMeanState(n_symbols, 20)
+        self.ema_fast = EWMState(n_symbols, 2 / (12 + 1), 12)
+        self.ema_slow = EWMState(n_symbols, 2 / (26 + 1), 26)
+        self.ema_signal = EWMState(n_symbols, 2 / (9 + 1), 9)
+        self.rsi_up = EWMState(n_symbols, 1 / 14, 14)
+        self.rsi_down = EWMState(n_symbols, 1 / 14, 14)
+
+    @classmethod
+    def from_history(cls, closes, volumes):
+        """
+        Estado tras recorrer el historial (arrays fechas × símbolos)
+
+        Returns:
+        - (IndicatorState, dict columna -> array fechas × símbolos con los indicadores)
+        """
+        closes = np.asarray(closes, dtype=float)
+        volumes = np.asarray(volumes, dtype=float)
+        state = cls(closes.shape[1])
+        history = {column: np.empty(closes.shape) for column in INDICATOR_COLUMNS}
+        for t in range(len(closes)):
+            for column, values in state.update(closes[t], volumes[t]).items():
+                history[column][t] = values
+        return state, history
+
+    def select(self, positions):
+        """Estado de un subconjunto de los símbolos (posiciones), independiente de este"""
+        state = IndicatorState(len(positions))
+        state.previous_close = self.previous_close[positions]
+        for name in ('ma_20', 'ma_50', 'volume_mean', 'ema_fast', 'ema_slow', 'ema_signal', 'rsi_up', 'rsi_down'):
+            setattr(state, name, getattr(self, name).select(positions))
+        return state
+
+    def update(self, close, volume):
+        close = np.asarray(close, dtype=float)
+        volume = np.asarray(volume, dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # pct_change y diff son NaN si falta el cierre anterior
+            change = close - self.previous_close
+            pct_change = close / self.previous_close - 1
+            # Igual que rsi_panel: diff NaN cuenta como 0 mientras haya cierre
+            up = np.where(np.isnan(close), np.nan, np.where(change > 0, change, 0.0))
+            down = np.where(np.isnan(close), np.nan, np.where(change < 0, -change, 0.0))
+            ema_up = self.rsi_up.update(up)
+            ema_down = self.rsi_down.update(down)
+            rsi = np.where(ema_down == 0, 100.0, 100 - (100 / (1 + ema_up / ema_down)))
+
+            macd = self.ema_fast.update(close) - self.ema_slow.update(close)
+            signal = self.ema_signal.update(macd)
+            volume_ratio = volume / self.volume_mean.update(volume)
+        self.previous_close = close
+        return {
+            'volume_ratio': volume_ratio,
+            'pct_change': pct_change,
+            'ma_20': self.ma_20.update(close),
+            'ma_50': self.ma_50.update(close),
+            'rsi': rsi,
+            'macd': macd,
+            'signal': signal,
+            'histogram': macd - signal,
+        }
+
+
+class _Buffer:
+    # Array que crece por el final con costo amortizado O(1)
+    def __init__(self, values=()):
+        values = np.asarray(values, dtype=float)
+        self.data = np.empty(max(16, 2 * len(values)))
+        self.size = len(values)
+        self.data[:self.size] = values
+
+    def append(self, value):
+        if self.size == len(self.data):
+            self.data = np.concatenate([self.data, np.empty(len(self.data))])
+        self.data[self.size] = value
+        self.size += 1
+
+    @property
+    def values(self):
+        return self.data[:self.size]
+
+
+def _is_extremum(values, i, order, greater):
+    # Misma condición que local_extrema (mode='clip') evaluada en una sola posición
+    n = len(values)
+    compare = operator.gt if greater else operator.lt
+    for shift in range(1, order + 1):
+        if not (compare(values[i], values[min(i + shift, n - 1)]) and compare(values[i], values[max(i - shift, 0)])):
+            return False
+    return True
+
+
+class _ExtremaTracker:
+    """Extremos locales de una serie que crece: al agregar un valor solo cambian las últimas `order` posiciones"""
+
+    def __init__(self, order, greater):
+        self.order = order
+        self.greater = greater
+        self.positions = []
+
+    def extend(self, values, previous_size):
+        # Posiciones cuyo vecindario (recortado al final) incluye los valores nuevos
+        first = max(0, previous_size - self.order)
+        while self.positions and self.positions[-1] >= first:
+            self.positions.pop()
+        self.positions.extend(i for i in range(first, len(values))
+                              if _is_extremum(values, i, self.order, self.greater))
+
+    @property
+    def array(self):
+        return np.array(self.positions, dtype=np.int64)
+
+
+class PatternTracker:
+    """
+    detect_pattern incremental para un símbolo: cada barra nueva actualiza el suavizado,
+    los extremos de la cola y los estadísticos de confianza sin recorrer toda la serie
+
+    Coincide con identify_pattern sobre el DataFrame completo desde el gap (mismo patrón,
+    extremos y pendientes; confianza con tolerancia de punto flotante).
+    """
+
+    def __init__(self, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05):
+        self.window = window
+        self.high_slope_threshold = high_slope_threshold
+        self.low_slope_threshold = low_slope_threshold
+        self.smooth_window = max(2, window - 1)
+        self.order = max(1, window - 2)
+        self.n_rows = 0
+        self.high, self.low, self.close, self.volume = _Buffer(), _Buffer(), _Buffer(), _Buffer()
+        self.high_smooth, self.low_smooth = _Buffer(), _Buffer()
+        self.extrema = {order: (_ExtremaTracker(order, True), _ExtremaTracker(order, False))
+                        for order in {self.order, 1}}
+        self.high_max = -np.inf
+        self.low_min = np.inf
+        self.volume_total = 0.0
+        # Welford para el desvío de los retornos
+        self.returns_count = 0
+        self.returns_mean = 0.0
+        self.returns_m2 = 0.0
+
+    @classmethod
+    def from_frame(cls, df, start_idx, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05):
+        tracker = cls(window, high_slope_threshold, low_slope_threshold)
+        n_rows, *columns = pattern_inputs(df, start_idx)
+        for bar in zip(*columns):
+            tracker.append(*bar)
+        # Las filas descartadas por NaN también cuentan para el mínimo de window * 2
+        tracker.n_rows = n_rows
+        return tracker
+
+    def _smoothed(self, values):
+        tail = values[-self.smooth_window:]
+        return tail.mean() if len(tail) >= 2 else np.nan
+
+    def append(self, high, low, close, volume, valid=True):
+        """
+        Agrega una barra; `valid=False` para filas con algún NaN (identify_pattern las descarta
+        pero cuentan para el mínimo de window * 2 filas)
+        """
+        self.n_rows += 1
+        if not valid:
+            return
+        if self.close.size:
+            value = close / self.close.values[-1] - 1
+            self.returns_count += 1
+            delta = value - self.returns_mean
+            self.returns_mean += delta / self.returns_count
+            self.returns_m2 += delta * (value - self.returns_mean)
+        previous_size = self.high.size
+        for buffer, value in ((self.high, high), (self.low, low), (self.close, close), (self.volume, volume)):
+            buffer.append(value)
+        self.high_smooth.append(self._smoothed(self.high.values))
+        self.low_smooth.append(self._smoothed(self.low.values))
+        self.high_max = max(self.high_max, high)
+        self.low_min = min(self.low_min, low)
+        self.volume_total += volume
+        for high_extrema, low_extrema in self.extrema.values():
+            high_extrema.extend(self.high_smooth.values, previous_size)
+            low_extrema.extend(self.low_smooth.values, previous_size)
+
+    def _find_extrema(self):
+        # Misma cascada que patterns.find_extrema
+        high_extrema, low_extrema = (tracker.array for tracker in self.extrema[self.order])
+        if (len(high_extrema) < 2 or len(low_extrema) < 2) and self.order > 1:
+            high_extrema, low_extrema = (tracker.array for tracker in self.extrema[1])
+        if len(high_extrema) < 2 or len(low_extrema) < 2:
+            high_extrema = np.argsort(self.high_smooth.values)[-2:]
+            low_extrema = np.argsort(self.low_smooth.values)[:2]
+        return high_extrema, low_extrema
+
+    def _confidence(self, n_high, n_low):
+        # Igual que patterns.confidence_score con estadísticos acumulados
+        score = 100.0
+        if n_high < 4 or n_low < 4:
+            score *= 0.8
+        if self.returns_count > 1 and np.sqrt(self.returns_m2 / (self.returns_count - 1)) > 0.02:
+            score *= 0.9
+        volume = self.volume.values
+        if volume[-5:].mean() < self.volume_total / len(volume) * 0.7:
+            score *= 0.85
+        return max(min(score, 100), 0)
+
+    def result(self):
+        """PatternResult actual (mismo contrato que detect_pattern)"""
+        if self.n_rows < self.window * 2 or self.high.size < 3:
+            return PatternResult(Pattern.INSUFFICIENT_DATA, 0.0, None, None, None, None)
+        high_extrema, low_extrema = self._find_extrema()
+        price_range = self.high_max - self.low_min
+        if price_range == 0:
+            return PatternResult(Pattern.NO_VARIATION, 0.0, None, None, None, None)
+        high_slope = fit_slope(self.high_smooth.values[high_extrema]) / price_range
+        low_slope = fit_slope(self.low_smooth.values[low_extrema]) / price_range
+        score = self._confidence(len(high_extrema), len(low_extrema))
+        code, factor = classify(high_slope, low_slope, self.high_slope_threshold)
+        return PatternResult(PATTERN_CODES[int(code)], score * float(factor), high_extrema, low_extrema,
+                             high_slope, low_slope)
+
+
+class HistoryTracker:
+    """
+    Historial con indicadores y patrón de los símbolos filtrados, que en cada refresco del
+    screener se extiende con las barras nuevas (las que agregó el PriceStore) en vez de
+    recalcularse
+
+    Un símbolo se reconstruye con IndicatorPanel la primera vez y cuando su historial no
+    empalma con el que ya tiene: otro inicio, o la última barra procesada cambió (estaba
+    incompleta o el proveedor reajustó precios).
+
+    Indicadores y patrón se actualizan en O(barras nuevas); el DataFrame de cada símbolo en
+    cambio se copia entero en cada refresco (pd.concat con las filas nuevas), que es O(filas
+    del historial) pero solo una copia de memoria, sin recalcular nada.
+
+    Args:
+    - params (dict): Parámetros de detect_pattern (por defecto DEFAULT_PARAMS)
+    """
+
+    def __init__(self, params=None):
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.frames = {}
+        self.states = {}
+        self.trackers = {}
+
+    def __contains__(self, symbol):
+        return symbol in self.frames
+
+    def update(self, frames):
+        """
+        Args:
+        - frames (dict): {symbol: DataFrame OHLCV} con el historial actual de cada símbolo
+
+        Returns:
+        - dict {symbol: DataFrame con PANEL_COLUMNS}, como IndicatorPanel.frame
+        """
+        rebuild = {}
+        for symbol, df in frames.items():
+            new_bars = self._new_bars(symbol, df)
+            if new_bars is None:
+                rebuild[symbol] = df
+            elif len(new_bars):
+                self._extend(symbol, new_bars)
+        if rebuild:
+            self._rebuild(rebuild)
+        return {symbol: self.frames[symbol] for symbol in frames if symbol in self.frames}
+
+    def _new_bars(self, symbol, df):
+        # Barras posteriores a la última procesada, o None si hay que reconstruir
+        known = self.frames.get(symbol)
+        if known is None or len(df) == 0 or df.index[0] != known.index[0]:
+            return None
+        last = known.index[-1]
+        if last not in df.index or not np.array_equal(known.loc[last, OHLCV_COLUMNS].to_numpy(dtype=float),
+                                                      df.loc[last, OHLCV_COLUMNS].to_numpy(dtype=float),
+                                                      equal_nan=True):
+            return None
+        return df.loc[df.index > last, OHLCV_COLUMNS]
+
+    def _rebuild(self, frames):
+        panel = IndicatorPanel.from_frames(frames)
+        state, _ = IndicatorState.from_history(panel.field('Close').to_numpy(), panel.field('Volume').to_numpy())
+        for k, symbol in enumerate(panel.symbols):
+            self.frames[symbol] = panel.frame(symbol)
+            self.states[symbol] = state.select([k])
+            self.trackers.pop(symbol, None)
+
+    def _extend(self, symbol, new_bars):
+        state = self.states[symbol]
+        bars = new_bars.to_numpy(dtype=float)
+        rows = np.empty((len(bars), len(PANEL_COLUMNS)))
+        rows[:, :len(OHLCV_COLUMNS)] = bars
+        close, volume = OHLCV_COLUMNS.index('Close'), OHLCV_COLUMNS.index('Volume')
+        for t, bar in enumerate(bars):
+            values = state.update(bar[[close]], bar[[volume]])
+            rows[t, len(OHLCV_COLUMNS):] = [values[column][0] for column in INDICATOR_COLUMNS]
+        extension = pd.DataFrame(rows, index=new_bars.index, columns=PANEL_COLUMNS)
+        # Copia del frame completo (ver la clase): lo que evita es recalcular indicadores y patrón
+        self.frames[symbol] = pd.concat([self.frames[symbol], extension])
+        if symbol in self.trackers:
+            # identify_pattern descarta las filas con algún NaN, indicadores incluidos
+            tracker = self.trackers[symbol][1]
+            valid = ~np.isnan(rows).any(axis=1)
+            columns = [PANEL_COLUMNS.index(c) for c in PATTERN_COLUMNS]
+            for t in range(len(rows)):
+                tracker.append(*rows[t, columns], valid=valid[t])
+
+    def pattern(self, symbol, start_idx):
+        """PatternResult desde `start_idx`; solo se recorre la serie la primera vez o si cambió el gap"""
+        tracked = self.trackers.get(symbol)
+        if tracked is None or tracked[0] != start_idx:
+            tracked = self.trackers[symbol] = (start_idx, PatternTracker.from_frame(self.frames[symbol], start_idx,
+                                                                                   **self.params))
+        return tracked[1].result()
+
+    def prune(self, symbols):
+        """Olvida los símbolos que ya no están en `symbols`"""
+        for symbol in set(self.frames) - set(symbols):
+            del self.frames[symbol], self.states[symbol]
+            self.trackers.pop(symbol, None)
@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+from data_providers import OHLCV_COLUMNS
+
+INDICATOR_COLUMNS = ['volume_ratio', 'pct_change', 'ma_20', 'ma_50', 'rsi', 'macd', 'signal', 'histogram']
+PANEL_COLUMNS = OHLCV_COLUMNS + INDICATOR_COLUMNS
+
+
+def rsi_panel(closes, window=14):
+    # Misma definición que ta.momentum.RSIIndicator (Wilder, ewm con adjust=False)
+    diff = closes.diff(1)
+    up = diff.where(diff > 0, 0.0).where(closes.notna())
+    down = -diff.where(diff < 0, 0.0).where(closes.notna())
+    ema_up = up.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    ema_down = down.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    rsi = 100 - (100 / (1 + ema_up / ema_down))
+    return rsi.mask(ema_down == 0, 100.0)
+
+
+def macd_panel(closes, window_slow=26, window_fast=12, window_sign=9):
+    # Misma definición que ta.trend.MACD
+    ema_fast = closes.ewm(span=window_fast, min_periods=window_fast, adjust=False).mean()
+    ema_slow = closes.ewm(span=window_slow, min_periods=window_slow, adjust=False).mean()
+    macd = ema_fast - ema_slow
+    signal = macd.ewm(span=window_sign, min_periods=window_sign, adjust=False).mean()
+    return macd, signal, macd - signal
+
+
+def compute_indicators(closes, volumes):
+    """
+    Calcula los indicadores de todo el universo de una vez sobre paneles fechas × símbolos
+
+    Coincide con add_indicators/calculate_macd (ta) con tolerancia relativa 1e-9 en las
+    filas donde el símbolo tiene cotización.
+
+    Returns:
+    - dict columna -> DataFrame fechas × símbolos
+    """
+    macd, signal, histogram = macd_panel(closes)
+    return {
+        'volume_ratio': volumes / volumes.rolling(20).mean(),
+        'pct_change': closes.pct_change(),
+        'ma_20': closes.rolling(window=20).mean(),
+        'ma_50': closes.rolling(window=50).mean(),
+        'rsi': rsi_panel(closes),
+        'macd': macd,
+        'signal': signal,
+        'histogram': histogram,
+    }
+
+
+class IndicatorPanel:
+    """
+    OHLCV e indicadores de todo el universo en un único array (símbolos × fechas × columnas)
+
+    Los DataFrames por símbolo que devuelve `frame` (y los de `field`) son vistas de solo
+    lectura sobre ese array, sin copias: asignar en ellos levanta ValueError; para modificarlos
+    usar `.copy()`. Agregar o reemplazar columnas enteras no toca el panel.
+    """
+
+    def __init__(self, symbols, index, values, first_rows):
+        self.symbols = list(symbols)
+        self.index = index
+        # El array se comparte con todos los frames: se congela para que ninguno lo modifique
+        values.setflags(write=False)
+        self.values = values
+        self.first_rows = first_rows
+        self._positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def from_frames(cls, frames):
+        frames = {symbol: df for symbol, df in frames.items() if len(df) > 0}
+        symbols = list(frames)
+        index = None
+        for df in frames.values():
+            index = df.index if index is None else index.union(df.index)
+        index = pd.DatetimeIndex([]) if index is None else index
+        values = np.empty((len(symbols), len(index), len(PANEL_COLUMNS)))
+
+        n_raw = len(OHLCV_COLUMNS)
+        for i, symbol in enumerate(symbols):
+            df = frames[symbol][OHLCV_COLUMNS]
+            if not df.index.equals(index):
+                df = df.reindex(index)
+            values[i, :, :n_raw] = df.to_numpy(dtype=float)
+
+        closes = pd.DataFrame(values[:, :, OHLCV_COLUMNS.index('Close')].T, index=index, columns=symbols)
+        volumes = pd.DataFrame(values[:, :, OHLCV_COLUMNS.index('Volume')].T, index=index, columns=symbols)
+        for column, result in compute_indicators(closes, volumes).items():
+            values[:, :, PANEL_COLUMNS.index(column)] = result.to_numpy(dtype=float).T
+
+        has_data = ~np.isnan(values[:, :, PANEL_COLUMNS.index('Close')])
+        first_rows = np.where(has_data.any(axis=1), has_data.argmax(axis=1), len(index))
+        return cls(symbols, index, values, first_rows)
+
+    def __contains__(self, symbol):
+        return symbol in self._positions
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def position(self, symbol):
+        return self._positions[symbol]
+
+    def frame(self, symbol):
+        i = self._positions[symbol]
+        first = self.first_rows[i]
+        return pd.DataFrame(self.values[i, first:], index=self.index[first:],
+                            columns=PANEL_COLUMNS, copy=False)
+
+    def field(self, column):
+        # Panel fechas × símbolos de una columna (vista transpuesta)
+        return pd.DataFrame(self.values[:, :, PANEL_COLUMNS.index(column)].T,
+                            index=self.index, columns=self.symbols, copy=False)
+
+
+# Columnas de precio e indicadores (float32); el volumen va aparte como entero
+PRICE_COLUMNS = [column for column in PANEL_COLUMNS if column != 'Volume']
+
+
+class CompactPanel:
+    """
+    Resultado del screener en formato compacto y columnar, pensado para compartirse entre sesiones
+
+    Precios e indicadores en float32 (columnas × símbolos × fechas), volumen en int64 y un
+    único índice de fechas: cada símbolo guarda solo posiciones enteras (primera y última
+    fila, fila del gap). Los DataFrames de `frame` son vistas de solo lectura, sin copias
+    (igual que en IndicatorPanel: `.copy()` para modificarlos).
+    """
+
+    def __init__(self, symbols, index, prices, volume, bounds, gap_rows):
+        self.symbols = list(symbols)
+        self.index = index
+        prices.setflags(write=False)
+        volume.setflags(write=False)
+        self.prices = prices
+        self.volume = volume
+        self.bounds = bounds
+        self.gap_rows = gap_rows
+        self._positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def from_screen(cls, cached_data):
+        """Compacta un dict {symbol: {'df', 'start_idx'}} (p.ej. el acumulado de process_and_cache_data)"""
+        symbols = list(cached_data)
+        index = None
+        for entry in cached_data.values():
+            df_index = entry['df'].index
+            index = df_index if index is None else index.union(df_index)
+        index = pd.DatetimeIndex([], name='Date') if index is None else index
+
+        prices = np.full((len(PRICE_COLUMNS), len(symbols), len(index)), np.nan, dtype=np.float32)
+        # Días faltantes dentro del rango de un símbolo: precios NaN y volumen 0
+        volume = np.zeros((len(symbols), len(index)), dtype=np.int64)
+        bounds = np.zeros((len(symbols), 2), dtype=np.int64)
+        gap_rows = np.zeros(len(symbols), dtype=np.int64)
+        for i, symbol in enumerate(symbols):
+            df = cached_data[symbol]['df']
+            rows = index.get_indexer(df.index)
+            prices[:, i, rows] = df.reindex(columns=PRICE_COLUMNS).to_numpy(dtype=np.float32).T
+            volume[i, rows] = np.nan_to_num(df['Volume'].to_numpy(dtype=float)).astype(np.int64)
+            bounds[i] = (rows[0], rows[-1] + 1) if len(rows) else (0, 0)
+            gap_rows[i] = index.get_loc(cached_data[symbol]['start_idx'])
+        return cls(symbols, index, prices, volume, bounds, gap_rows)
+
+    def __contains__(self, symbol):
+        return symbol in self._positions
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def position(self, symbol):
+        return self._positions[symbol]
+
+    def frame(self, symbol):
+        i = self._positions[symbol]
+        first, stop = self.bounds[i]
+        columns = {column: self.prices[k, i, first:stop] for k, column in enumerate(PRICE_COLUMNS)}
+        columns['Volume'] = self.volume[i, first:stop]
+        # copy=False con un dict conserva cada array como su propio bloque (vistas)
+        return pd.DataFrame({column: columns[column] for column in PANEL_COLUMNS},
+                            index=self.index[first:stop], copy=False)
+
+    def start_idx(self, symbol):
+        return self.index[self.gap_rows[self._positions[symbol]]]
+
+    def screen(self):
+        """Mismo formato que cached_data ({symbol: {'df', 'start_idx'}}) con vistas sobre el panel"""
+        return {symbol: {'df': self.frame(symbol), 'start_idx': self.start_idx(symbol)}
+                for symbol in self.symbols}
+
+    @property
+    def nbytes(self):
+        return self.prices.nbytes + self.volume.nbytes + self.index.nbytes + self.bounds.nbytes + self.gap_rows.nbytes
+
+    def memory_report(self):
+        """
+        Memoria del panel frente a los mismos datos como DataFrames float64 por símbolo
+
+        Returns:
+        - dict con 'symbols', 'rows', 'panel_bytes', 'frames_bytes' y 'bytes_per_symbol'
+        """
+        rows = int((self.bounds[:, 1] - self.bounds[:, 0]).sum())
+        # Un DataFrame float64 por símbolo: 8 bytes por celda más 8 por fecha del índice
+        frames_bytes = rows * (len(PANEL_COLUMNS) + 1) * 8
+        return {'symbols': len(self), 'rows': rows, 'panel_bytes': self.nbytes, 'frames_bytes': frames_bytes,
+                'bytes_per_symbol': self.nbytes / len(self) if len(self) else 0}
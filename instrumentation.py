@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+import numpy as np
+
+# Muestras de latencia guardadas por etapa para los percentiles (las más recientes)
+MAX_SAMPLES = 2048
+PERCENTILES = (50, 90, 99)
+
+_enabled = os.environ.get('PEG_METRICS', '1') != '0'
+_stages = {}
+_lock = threading.Lock()
+_null = nullcontext()
+
+
+class Stage:
+    """Métricas de una etapa: llamadas, errores, latencias recientes y contadores libres"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self.counters = {}
+
+
+def _stage(name):
+    stage = _stages.get(name)
+    if stage is None:
+        with _lock:
+            stage = _stages.setdefault(name, Stage())
+    return stage
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(flag):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+
+
+def record(name, seconds, error=False):
+    stage = _stage(name)
+    with _lock:
+        stage.calls += 1
+        stage.errors += error
+        stage.total += seconds
+        stage.samples.append(seconds)
+
+
+@contextmanager
+def _timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record(name, time.perf_counter() - start, error=True)
+        raise
+    record(name, time.perf_counter() - start)
+
+
+def timer(name):
+    """
+    Context manager que mide una etapa (y cuenta un error si sale con excepción)
+
+    Deshabilitado devuelve un contexto nulo compartido: no mide ni reserva nada.
+    """
+    return _timer(name) if _enabled else _null
+
+
+def timed(name):
+    """Decorador equivalente a envolver la función en timer(name)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, event, n=1):
+    """Suma `n` a un contador de la etapa (p.ej. 'hits', 'misses')"""
+    if not _enabled:
+        return
+    stage = _stage(name)
+    with _lock:
+        stage.counters[event] = stage.counters.get(event, 0) + n
+
+
+def snapshot():
+    """
+    Estado actual de todas las etapas
+
+    Returns:
+    - dict {etapa: {'calls', 'errors', 'total_s', 'p50_s', 'p90_s', 'p99_s', 'max_s', contadores...}}
+    """
+    with _lock:
+        stages = {name: (stage.calls, stage.errors, stage.total, np.array(stage.samples), dict(stage.counters))
+                  for name, stage in _stages.items()}
+    result = {}
+    for name, (calls, errors, total, samples, counters) in sorted(stages.items()):
+        row = {'calls': calls, 'errors': errors, 'total_s': total}
+        quantiles = np.percentile(samples, PERCENTILES) if len(samples) else [np.nan] * len(PERCENTILES)
+        row.update({f'p{p}_s': float(q) for p, q in zip(PERCENTILES, quantiles)})
+        row['max_s'] = float(samples.max()) if len(samples) else np.nan
+        row.update(counters)
+        result[name] = row
+    return result
+
+
+def to_json(indent=1):
+    # NaN no es JSON válido: las etapas sin latencias (solo contadores) van como null
+    data = {name: {key: (None if isinstance(value, float) and np.isnan(value) else value)
+                   for key, value in row.items()}
+            for name, row in snapshot().items()}
+    return json.dumps(data, indent=indent)
+
+
+def to_prometheus(prefix='peg'):
+    """Métricas en formato de texto de Prometheus (un summary de latencia por etapa)"""
+    lines = [f'# TYPE {prefix}_stage_seconds summary',
+             f'# TYPE {prefix}_stage_errors_total counter',
+             f'# TYPE {prefix}_stage_events_total counter']
+    for name, row in snapshot().items():
+        label = f'stage="{name}"'
+        if row['calls']:
+            for p in PERCENTILES:
+                lines.append(f'{prefix}_stage_seconds{{{label},quantile="{p / 100}"}} {row[f"p{p}_s"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{{label}}} {row["total_s"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{{label}}} {row["calls"]}')
+            lines.append(f'{prefix}_stage_errors_total{{{label}}} {row["errors"]}')
+        for event in sorted(row.keys() - {'calls', 'errors', 'total_s', 'max_s'} - {f'p{p}_s' for p in PERCENTILES}):
+            lines.append(f'{prefix}_stage_events_total{{{label},event="{event}"}} {row[event]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+from plotly.subplots import make_subplots
+from stock_analisys import calculate_macd, identify_pattern, lookup_pattern
+from patterns import Pattern
+
+# Máximo de puntos por serie antes de reducir la resolución
+DEFAULT_MAX_POINTS = 500
+
+
+def lttb(y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: índices de `n_out` puntos que conservan la forma de `y`
+
+    Siempre incluye el primer y el último punto; los NaN se tratan como 0 al elegir.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for k in range(n_out - 2):
+        start, end = edges[k], edges[k + 1]
+        # Promedio del bucket siguiente como tercer vértice del triángulo
+        next_start, next_end = end, edges[k + 2] if k + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(areas.argmax())
+        selected[k + 1] = previous
+    return selected
+
+
+def downsample(df, max_points=DEFAULT_MAX_POINTS):
+    """
+    Reduce el DataFrame a `max_points` filas: las series usan los puntos LTTB del cierre
+    y las velas se agregan por bucket (open primero, high máx, low mín, close último)
+
+    Returns:
+    - (DataFrame de líneas, DataFrame OHLCV agregado)
+    """
+    if len(df) <= max_points:
+        return df, df
+    positions = lttb(df['Close'].to_numpy(), max_points)
+    buckets = np.searchsorted(positions, np.arange(len(df)), side='right') - 1
+    ohlcv = df[['Open', 'High', 'Low', 'Close', 'Volume']].groupby(buckets).agg(
+        {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'})
+    ohlcv.index = df.index[positions]
+    return df.iloc[positions], ohlcv
+
+
+def pattern_overlay(df, start_idx, window, high_slope_threshold, low_slope_threshold, grid=None):
+    """
+    Patrón y líneas de tendencia con la misma lógica que create_chart (consultando `grid`,
+    una PatternGrid del símbolo, si se pasa)
+
+    Returns:
+    - (patrón, (x, y) línea superior o None, (x, y) línea inferior o None)
+    """
+    if grid is not None:
+        pattern, high_extrema, low_extrema = lookup_pattern(grid, window, high_slope_threshold, low_slope_threshold)
+    else:
+        pattern, high_extrema, low_extrema = identify_pattern(df.loc[start_idx:], start_idx, window,
+                                                              high_slope_threshold, low_slope_threshold)
+    if pattern == 'No clear pattern' or high_extrema is None or low_extrema is None:
+        return pattern, None, None
+
+    offset = df.index.get_loc(start_idx)
+    lines = []
+    for extrema, column in ((high_extrema + offset, 'High'), (low_extrema + offset, 'Low')):
+        # La recta va del penúltimo extremo hasta la última barra (son dos puntos)
+        lines.append(([df.index[extrema[-2]], df.index[-1]],
+                      [df[column].iloc[extrema[-2]], df[column].iloc[extrema[-1]]]))
+    return pattern, lines[0], lines[1]
+
+
+def create_interactive_chart(df, symbol, start_idx, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05,
+                             max_points=DEFAULT_MAX_POINTS, grid=None):
+    """
+    Alternativa Plotly a create_chart con los mismos paneles: velas con ma_20/ma_50, volumen,
+    RSI con la línea de 50 y MACD, más las líneas del patrón y del gap
+
+    Returns:
+    - Figura de Plotly
+    """
+    if 'histogram' not in df:
+        df = calculate_macd(df)
+    lines, ohlcv = downsample(df, max_points)
+
+    fig = make_subplots(rows=4, cols=1, shared_xaxes=True, vertical_spacing=0.02,
+                        row_heights=[6, 1, 2, 2])
+    fig.add_trace(go.Candlestick(x=ohlcv.index, open=ohlcv['Open'], high=ohlcv['High'], low=ohlcv['Low'],
+                                 close=ohlcv['Close'], name='Price', showlegend=False), row=1, col=1)
+    fig.add_trace(go.Scatter(x=lines.index, y=lines['ma_20'], name='MA20', line=dict(color='gold')), row=1, col=1)
+    fig.add_trace(go.Scatter(x=lines.index, y=lines['ma_50'], name='MA50', line=dict(color='orange')), row=1, col=1)
+
+    gap_price = max(df.loc[start_idx, 'Open'], df.loc[start_idx, 'Close'])
+    fig.add_trace(go.Scatter(x=[start_idx, df.index[-1]], y=[gap_price, gap_price], name='Gap Up',
+                             mode='lines', line=dict(color='blue', dash='dot')), row=1, col=1)
+    for name, color in (('Resistance', 'green'), ('Support', 'red')):
+        fig.add_trace(go.Scatter(x=[], y=[], name=name, mode='lines', line=dict(color=color, dash='dash')),
+                      row=1, col=1)
+
+    fig.add_trace(go.Bar(x=ohlcv.index, y=ohlcv['Volume'], name='Volume', marker_color='grey',
+                         showlegend=False), row=2, col=1)
+    fig.add_trace(go.Scatter(x=lines.index, y=lines['rsi'], name='RSI', line=dict(color='blue')), row=3, col=1)
+    fig.add_hline(y=50, line=dict(color='red', dash='dash'), row=3, col=1)
+    fig.add_trace(go.Scatter(x=lines.index, y=lines['macd'], name='MACD', line=dict(color='cyan')), row=4, col=1)
+    fig.add_trace(go.Scatter(x=lines.index, y=lines['signal'], name='Signal', line=dict(color='purple')), row=4, col=1)
+    fig.add_trace(go.Bar(x=lines.index, y=lines['histogram'], name='Histogram', marker_color='grey',
+                         opacity=0.5, showlegend=False), row=4, col=1)
+
+    fig.update_layout(template='plotly_white', height=800, hovermode='x unified',
+                      xaxis_rangeslider_visible=False, margin=dict(t=60, b=20))
+    return update_pattern(fig, df, symbol, start_idx, window, high_slope_threshold, low_slope_threshold, grid)
+
+
+def update_pattern(fig, df, symbol, start_idx, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05,
+                   grid=None):
+    """Actualiza solo las líneas del patrón y el título cuando cambian los parámetros"""
+    pattern, high_line, low_line = pattern_overlay(df, start_idx, window, high_slope_threshold, low_slope_threshold,
+                                                   grid)
+    for name, line in (('Resistance', high_line), ('Support', low_line)):
+        x, y = line if line is not None else ([], [])
+        fig.update_traces(selector=dict(name=name), x=x, y=y)
+    fig.update_layout(title=f'{symbol} - {pattern} (Gap Up: {pd.Timestamp(start_idx).date()})')
+    return fig
+
+
+# Un color por resultado posible de la grilla de parámetros
+PATTERN_COLORS = {
+    Pattern.RECTANGLE: '#9e9e9e',
+    Pattern.ASCENDING_TRIANGLE: '#66bb6a',
+    Pattern.DESCENDING_TRIANGLE: '#ef5350',
+    Pattern.FALLING_WEDGE: '#26a69a',
+    Pattern.DESCENDING_CHANNEL: '#c62828',
+    Pattern.RISING_WEDGE: '#ffa726',
+    Pattern.ASCENDING_CHANNEL: '#2e7d32',
+    Pattern.NO_PATTERN: '#eeeeee',
+    Pattern.INSUFFICIENT_DATA: '#ffffff',
+    Pattern.NO_VARIATION: '#ffffff',
+}
+
+
+def pattern_heatmap(grid, window=None, threshold=None):
+    """
+    Heatmap de una PatternGrid: color por patrón y confianza en el hover, con la
+    combinación actual de los sliders marcada
+
+    Returns:
+    - Figura de Plotly
+    """
+    patterns = list(PATTERN_COLORS)
+    codes = np.vectorize(patterns.index, otypes=[int])(grid.patterns)
+    # Escala discreta: cada patrón ocupa un tramo del mismo ancho
+    colorscale = []
+    for k, pattern in enumerate(patterns):
+        colorscale += [[k / len(patterns), PATTERN_COLORS[pattern]], [(k + 1) / len(patterns), PATTERN_COLORS[pattern]]]
+    labels = np.vectorize(lambda pattern: pattern.value, otypes=[object])(grid.patterns)
+
+    fig = go.Figure(go.Heatmap(
+        z=codes, x=grid.thresholds, y=grid.windows, zmin=-0.5, zmax=len(patterns) - 0.5,
+        colorscale=colorscale, customdata=np.dstack([labels, grid.confidence.round(1)]),
+        hovertemplate='Window %{y}, sensitivity %{x:.2f}<br>%{customdata[0]} (%{customdata[1]}%)<extra></extra>',
+        colorbar=dict(tickvals=list(range(len(patterns))), ticktext=[p.value for p in patterns]),
+    ))
+    if window is not None and threshold is not None:
+        fig.add_trace(go.Scatter(x=[threshold], y=[window], mode='markers', showlegend=False, hoverinfo='skip',
+                                 marker=dict(symbol='x', size=12, color='black')))
+    fig.update_layout(template='plotly_white', height=320, margin=dict(t=20, b=20),
+                      xaxis_title='Trend Sensitivity', yaxis_title='Window Size', yaxis=dict(dtick=1))
+    return fig
@@ -0,0 +1,224 @@
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from data_providers import MARKET_TZ, get_provider, trading_day
+import instrumentation as metrics
+
+# Apertura de la sesión regular (hora del mercado); antes de esa hora las cotizaciones son pre-market
+OPEN_TIME = '09:30'
+QUOTE_COLUMNS = ['timestamp', 'symbol', 'price', 'volume']
+
+QuoteBatch = namedtuple('QuoteBatch', ['timestamps', 'symbols', 'prices', 'volumes'])
+GapAlert = namedtuple('GapAlert', ['symbol', 'timestamp', 'session', 'gap_pct', 'price', 'prior_close'])
+
+# Estado de cada símbolo en el monitor
+_NONE, _PRE_MARKET, _OPEN = 0, 1, 2
+_SESSIONS = {_PRE_MARKET: 'pre-market', _OPEN: 'open'}
+
+
+def read_quotes(path):
+    """
+    Lee un archivo de cotizaciones (csv o parquet) con columnas QUOTE_COLUMNS
+
+    Returns:
+    - DataFrame ordenado por timestamp, con timestamps en la zona del mercado
+    """
+    quotes = pd.read_parquet(path) if str(path).endswith('.parquet') else pd.read_csv(path, float_precision='round_trip')
+    timestamps = pd.to_datetime(quotes['timestamp'], utc=True).dt.tz_convert(MARKET_TZ)
+    quotes = quotes.assign(timestamp=timestamps)[QUOTE_COLUMNS]
+    return quotes.sort_values('timestamp', kind='stable', ignore_index=True)
+
+
+def write_quotes(quotes, path):
+    if str(path).endswith('.parquet'):
+        quotes[QUOTE_COLUMNS].to_parquet(path, index=False)
+    else:
+        quotes[QUOTE_COLUMNS].to_csv(path, index=False)
+
+
+class ReplaySource:
+    """
+    Fuente de cotizaciones que reproduce un archivo grabado (o un DataFrame con QUOTE_COLUMNS)
+
+    Cualquier objeto con un método `batches()` que entregue QuoteBatch (arrays de igual
+    largo, en orden temporal) sirve como fuente para GapMonitor; un feed en vivo solo tiene
+    que agrupar lo que llega en QuoteBatch.
+
+    Args:
+    - quotes (str | DataFrame): Ruta del archivo o cotizaciones ya cargadas
+    - batch_size (int): Cotizaciones por lote
+    - speed (float): None para reproducir lo más rápido posible, 1.0 en tiempo real, 60.0
+      un minuto por segundo, etc.
+    """
+
+    def __init__(self, quotes, batch_size=1000, speed=None):
+        self.quotes = read_quotes(quotes) if isinstance(quotes, str) else quotes
+        self.batch_size = batch_size
+        self.speed = speed
+
+    def __len__(self):
+        return len(self.quotes)
+
+    def batches(self):
+        quotes = self.quotes
+        timestamps = quotes['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        symbols = quotes['symbol'].to_numpy(dtype=object)
+        prices = quotes['price'].to_numpy(dtype=float)
+        volumes = quotes['volume'].to_numpy(dtype=float)
+        started = time.monotonic()
+        for i in range(0, len(quotes), self.batch_size):
+            batch = slice(i, i + self.batch_size)
+            if self.speed:
+                # Esperar hasta que "llegue" la primera cotización del lote
+                delay = (timestamps[i] - timestamps[0]) / 1e9 / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            yield QuoteBatch(timestamps[batch], symbols[batch], prices[batch], volumes[batch])
+
+
+def _last_positions(positions):
+    # Índice de la última aparición de cada posición (np.unique sobre el array invertido)
+    unique, reversed_index = np.unique(positions[::-1], return_index=True)
+    return unique, len(positions) - 1 - reversed_index
+
+
+class GapMonitor:
+    """
+    Detector de gaps intradía para todo el universo: gap de las cotizaciones pre-market y de
+    la apertura contra el cierre anterior, con el mismo umbral que filter_stocks
+
+    El estado por símbolo vive en arrays (cierre anterior, apertura, último precio, volumen
+    acumulado, estado de la alerta) y cada lote de cotizaciones se aplica vectorizado. Cada
+    símbolo genera como máximo una alerta pre-market y una de apertura.
+
+    Args:
+    - symbols (list): Universo
+    - prior_close (array): Cierre de la sesión anterior por símbolo
+    - gap_percent (float): Gap mínimo en %
+    - eligible (array bool): Símbolos que pueden alertar (p.ej. el filtro de volumen)
+    - session (date): Día de la sesión (por defecto el de la primera cotización)
+    """
+
+    def __init__(self, symbols, prior_close, gap_percent=5, eligible=None, session=None, open_time=OPEN_TIME):
+        n = len(symbols)
+        self.symbols = pd.Index(symbols)
+        self.prior_close = np.asarray(prior_close, dtype=float)
+        self.threshold = gap_percent / 100
+        self.eligible = np.ones(n, dtype=bool) if eligible is None else np.asarray(eligible, dtype=bool)
+        self.open_time = open_time
+        self.open_at = None if session is None else self._open_at(pd.Timestamp(session))
+        self.open_price = np.full(n, np.nan)
+        self.last_price = np.full(n, np.nan)
+        self.volume = np.zeros(n)
+        self.state = np.zeros(n, dtype=np.int8)
+        self.quotes = 0
+        self.unknown = 0
+
+    def _open_at(self, day):
+        day = day.tz_localize(MARKET_TZ) if day.tzinfo is None else day.tz_convert(MARKET_TZ)
+        return (day.normalize() + pd.Timedelta(f'{self.open_time}:00')).value
+
+    @classmethod
+    def from_history(cls, frames, gap_percent=5, min_avg_volume=500000, session=None, **kwargs):
+        """
+        Monitor con el cierre anterior y el filtro de volumen promedio de scan_gaps
+
+        Args:
+        - frames (dict): {symbol: DataFrame diario}
+        - session (date): Sesión a monitorear; solo se usan barras anteriores (por defecto el
+          día hábil actual)
+        """
+        session = pd.Timestamp(trading_day() if session is None else session)
+        symbols, prior_close, avg_volume = [], [], []
+        for symbol, df in frames.items():
+            index = df.index.tz_convert(MARKET_TZ) if df.index.tz is not None else df.index.tz_localize(MARKET_TZ)
+            df = df[index.normalize() < session.tz_localize(MARKET_TZ)].dropna(subset=['Close'])
+            if len(df) == 0:
+                continue
+            symbols.append(symbol)
+            prior_close.append(df['Close'].iloc[-1])
+            avg_volume.append(df['Volume'].mean())
+        return cls(symbols, prior_close, gap_percent, np.array(avg_volume) >= min_avg_volume,
+                   session=session, **kwargs)
+
+    @classmethod
+    def from_provider(cls, symbols, provider=None, period='1mo', **kwargs):
+        provider = provider or get_provider()
+        with metrics.timer('download'):
+            frames = provider.download(list(symbols), period=period)
+        return cls.from_history(frames, **kwargs)
+
+    def update(self, batch):
+        """
+        Aplica un lote de cotizaciones
+
+        Returns:
+        - lista de GapAlert nuevas
+        """
+        positions = self.symbols.get_indexer(batch.symbols)
+        known = positions >= 0
+        self.quotes += len(positions)
+        self.unknown += int((~known).sum())
+        if not known.all():
+            positions = positions[known]
+            batch = QuoteBatch(*(values[known] for values in batch))
+        if len(positions) == 0:
+            return []
+        if self.open_at is None:
+            self.open_at = self._open_at(pd.Timestamp(batch.timestamps[0], tz='UTC'))
+
+        touched, last = _last_positions(positions)
+        self.last_price[touched] = batch.prices[last]
+        self.volume += np.bincount(positions, weights=batch.volumes, minlength=len(self.volume))
+
+        # Pre-market: la primera cotización de cada símbolo que supera el umbral (sin depender del lote)
+        gap = batch.prices / self.prior_close[positions] - 1
+        regular = batch.timestamps >= self.open_at
+        crossed = np.flatnonzero(~regular & (gap >= self.threshold) & self.eligible[positions]
+                                 & (self.state[positions] == _NONE))
+        _, first = np.unique(positions[crossed], return_index=True)
+        pre_market = crossed[first]
+        self.state[positions[pre_market]] = _PRE_MARKET
+
+        # Apertura: primera cotización de la sesión regular
+        regular = np.flatnonzero(regular)
+        opened, first = np.unique(positions[regular], return_index=True)
+        new = np.isnan(self.open_price[opened])
+        opening = regular[first[new]]
+        self.open_price[opened[new]] = batch.prices[opening]
+        opening = opening[(gap[opening] >= self.threshold) & self.eligible[positions[opening]]]
+        self.state[positions[opening]] = _OPEN
+
+        quotes = np.concatenate([pre_market, opening])
+        if len(quotes) == 0:
+            return []
+        sessions = np.concatenate([np.full(len(pre_market), _PRE_MARKET), np.full(len(opening), _OPEN)])
+        order = np.argsort(quotes, kind='stable')
+        metrics.count('intraday', 'alerts', len(quotes))
+        return [GapAlert(self.symbols[positions[q]], pd.Timestamp(batch.timestamps[q], tz='UTC').tz_convert(MARKET_TZ),
+                         _SESSIONS[session], round(float(gap[q]) * 100, 2), float(batch.prices[q]),
+                         float(self.prior_close[positions[q]]))
+                for q, session in zip(quotes[order], sessions[order])]
+
+    def run(self, source):
+        """
+        Consume una fuente de cotizaciones
+
+        Yields:
+        - lista de GapAlert nuevas por lote (vacía si no hubo)
+        """
+        for batch in source.batches():
+            with metrics.timer('intraday_update'):
+                alerts = self.update(batch)
+            metrics.count('intraday', 'quotes', len(batch.prices))
+            yield alerts
+
+    def gaps(self):
+        """Estado actual: gap de la apertura (o del último precio pre-market) por símbolo"""
+        is_open = ~np.isnan(self.open_price)
+        price = np.where(is_open, self.open_price, self.last_price)
+        return pd.DataFrame({'prior_close': self.prior_close, 'open': self.open_price, 'last': self.last_price,
+                             'gap_pct': (price / self.prior_close - 1) * 100, 'volume': self.volume,
+                             'eligible': self.eligible, 'alerted': self.state > _NONE},
+                            index=self.symbols)
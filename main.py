@@ -1,170 +1,261 @@
 import os
-import yfinance as yf
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
-import numpy as np
-import mplfinance as mpf
-from ta.momentum import RSIIndicator
-from ta.trend import MACD
-from scipy.signal import argrelextrema
-
-def get_symbols():
-    url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-    table = pd.read_html(url, header=0)[0]
-    return list(table['Symbol'])
-
-def get_stock_data(symbol, period='ytd'):
-    stock = yf.Ticker(symbol)
-    df = stock.history(period=period)
-    return df
-
-def calculate_rsi(df, window=14):
-    rsi_indicator = RSIIndicator(df['Close'], window=window)
-    df['rsi'] = rsi_indicator.rsi()
-    return df
-
-def calculate_macd(df):
-    macd = MACD(df['Close'])
-    df['macd'] = macd.macd()
-    df['signal'] = macd.macd_signal()
-    df['histogram'] = macd.macd_diff()
-    return df
-
-def filter_stocks(symbols, market_cap_min=5000000000, gap_percent=5):
-    filtered_stocks = []
-    for symbol in symbols:
+from data_providers import FakeProvider, YFinanceProvider, get_provider
+from data_processing import iter_filtered_stocks
+from patterns import DEFAULT_PARAMS, detect_pattern_from
+from price_store import DEFAULT_DATA_DIR, PriceStore, store_enabled
+from scoring import score_setups
+from chart_cache import render_chart
+from fundamentals import get_info
+from intraday import GapAlert, GapMonitor, ReplaySource
+from universes import DEFAULT_UNIVERSE, get_universe, list_universes
+
+RESULT_COLUMNS = ['symbol', 'gap_date', 'gap_pct', 'pattern', 'confidence', 'setup_score']
+FORMATS = ['jsonl', 'csv', 'parquet']
+# 'fake' genera datos sintéticos deterministas: corre sin red (pruebas, demos)
+PROVIDERS = {'yfinance': YFinanceProvider, 'fake': FakeProvider}
+
+
+def get_symbols(universe=DEFAULT_UNIVERSE):
+    return get_universe(universe)
+
+
+def make_provider(name='yfinance', store=None):
+    """
+    Proveedor para el CLI
+
+    Args:
+    - name (str): Clave de PROVIDERS
+    - store (str): Directorio del PriceStore delante del proveedor, o None para usarlo sin almacén
+
+    Returns:
+    - proveedor con la interfaz info/history/download
+    """
+    provider = PROVIDERS[name]()
+    return provider if store is None else PriceStore(provider, root=store)
+
+
+def run_screen(symbols, market_cap_min=5000000000, gap_percent=5, workers=8, provider=None, verbose=False):
+    """
+    Screener completo (el mismo de la app) sin interfaz
+
+    Returns:
+    - (dict {symbol: {'df', 'start_idx'}}, error o None si terminó)
+    """
+    screened = {}
+    try:
+        for _, status, passed in iter_filtered_stocks(symbols, market_cap_min, gap_percent, provider,
+                                                      max_workers=workers):
+            screened.update(passed)
+            if verbose:
+                print(status, file=sys.stderr)
+    except Exception as e:
+        # Se conserva lo filtrado hasta el fallo para poder escribirlo igual
+        return screened, e
+    return screened, None
+
+
+def score_symbols(screened, errors):
+    """
+    score_setups de todos los símbolos; si el lote falla se puntúa uno por uno para que un
+    frame malformado no deje sin resultados al resto
+
+    Returns:
+    - Series símbolo -> score (los que fallaron quedan en `errors`)
+    """
+    if not screened:
+        return pd.Series(dtype=int)
+    try:
+        return score_setups(screened)['score']
+    except Exception:
+        scores = {}
+        for symbol, entry in screened.items():
+            try:
+                scores[symbol] = score_setups({symbol: entry})['score'].iloc[0]
+            except Exception as e:
+                errors[symbol] = e
+        return pd.Series(scores, dtype=int)
+
+
+def build_results(screened, params=None):
+    """
+    Una fila por símbolo: gap, patrón con su confianza y score del setup
+
+    Returns:
+    - (DataFrame con RESULT_COLUMNS ordenado por score, dict {symbol: error})
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    errors = {}
+    scores = score_symbols(screened, errors)
+    rows = []
+    for symbol, entry in screened.items():
+        if symbol in errors:
+            continue
         try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            
-            # Check if marketCap is available, otherwise use a default value
-            market_cap = info.get('marketCap', 0)
-            
-            if market_cap < market_cap_min:
-                continue
-            
-            df = get_stock_data(symbol, period='1mo')
-            df['pct_change'] = df['Close'].pct_change()
-            gap_up_idx = df[df['pct_change'] >= gap_percent / 100].index
-            
-            if len(gap_up_idx) > 0:
-                last_gap_up = gap_up_idx[-1]
-                filtered_stocks.append((symbol, last_gap_up))
+            df, start_idx = entry['df'], entry['start_idx']
+            result, _, _ = detect_pattern_from(df, start_idx, **params)
+            rows.append({'symbol': symbol, 'gap_date': start_idx.date().isoformat(),
+                         'gap_pct': round(float(df.loc[start_idx, 'pct_change']) * 100, 2),
+                         'pattern': result.pattern.value, 'confidence': round(result.confidence, 1),
+                         'setup_score': int(scores[symbol])})
         except Exception as e:
-            print(f"Error processing {symbol}: {str(e)}")
-    
-    return filtered_stocks
-
-def identify_pattern(df, start_idx, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05):
-    df = df.loc[start_idx:].copy()
-    df['High_smooth'] = df['High'].rolling(window=window).mean()
-    df['Low_smooth'] = df['Low'].rolling(window=window).mean()
-    
-    # Find local maxima and minima
-    high_extrema = argrelextrema(df['High_smooth'].values, np.greater, order=window)[0]
-    low_extrema = argrelextrema(df['Low_smooth'].values, np.less, order=window)[0]
-    
-    if len(high_extrema) < 2 or len(low_extrema) < 2:
-        return 'No clear pattern', None, None
-    
-    # Get the last two highs and lows
-    last_two_highs = df['High_smooth'].iloc[high_extrema[-2:]].values
-    last_two_lows = df['Low_smooth'].iloc[low_extrema[-2:]].values
-    
-    # Calculate slopes
-    high_slope = (last_two_highs[1] - last_two_highs[0]) / (high_extrema[-1] - high_extrema[-2])
-    low_slope = (last_two_lows[1] - last_two_lows[0]) / (low_extrema[-1] - low_extrema[-2])
-    
-    # Identify patterns using the thresholds
-    if abs(high_slope) < high_slope_threshold and abs(low_slope) < low_slope_threshold:
-        pattern = 'Rectangle'
-    elif high_slope < -high_slope_threshold and low_slope > low_slope_threshold:
-        pattern = 'Ascending Triangle' if high_slope > low_slope else 'Descending Triangle'
-    elif high_slope < -high_slope_threshold and low_slope < -low_slope_threshold:
-        pattern = 'Falling Wedge' if high_slope < low_slope else 'Descending Channel'
-    elif high_slope > high_slope_threshold and low_slope > low_slope_threshold:
-        pattern = 'Rising Wedge' if high_slope > low_slope else 'Ascending Channel'
+            errors[symbol] = e
+    results = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    return results.sort_values('setup_score', ascending=False, kind='stable', ignore_index=True), errors
+
+
+def write_results(results, output=None, fmt='jsonl'):
+    # Sin archivo de salida, jsonl y csv van a stdout
+    if fmt == 'parquet':
+        if output is None:
+            raise ValueError("--output is required for parquet")
+        results.to_parquet(output, index=False)
+    elif fmt == 'csv':
+        results.to_csv(output or sys.stdout, index=False)
     else:
-        pattern = 'No clear pattern'
-    
-    return pattern, high_extrema, low_extrema
-
-def chart(df, symbol, start_idx):
-    df['ma_20'] = df['Close'].rolling(window=20).mean()
-    
-    pattern, high_extrema, low_extrema = identify_pattern(df.loc[start_idx:], start_idx)
-    
-    ap2 = [
-        mpf.make_addplot(df['ma_20'], panel=0, color='orange', secondary_y=False),
-        mpf.make_addplot(df['rsi'], panel=2, color='blue', secondary_y=False),
-        mpf.make_addplot(df['macd'], panel=3, color='cyan', secondary_y=False),
-        mpf.make_addplot(df['signal'], panel=3, color='purple', secondary_y=False),
-        mpf.make_addplot(df['histogram'], panel=3, type='bar', width=0.7, color='grey', alpha=0.5, secondary_y=False)
-    ]
-    
-    # Add pattern lines to the chart
-    if pattern != 'No clear pattern' and high_extrema is not None and low_extrema is not None:
-        high_line = pd.Series(index=df.index, dtype=float)
-        low_line = pd.Series(index=df.index, dtype=float)
-        
-        # Adjust high_extrema and low_extrema indices to match the full DataFrame
-        high_extrema += df.index.get_loc(start_idx)
-        low_extrema += df.index.get_loc(start_idx)
-        
-        high_line.iloc[high_extrema[-2]:] = np.linspace(df['High'].iloc[high_extrema[-2]], df['High'].iloc[high_extrema[-1]], len(high_line.iloc[high_extrema[-2]:]))
-        low_line.iloc[low_extrema[-2]:] = np.linspace(df['Low'].iloc[low_extrema[-2]], df['Low'].iloc[low_extrema[-1]], len(low_line.iloc[low_extrema[-2]:]))
-        ap2.extend([
-            mpf.make_addplot(high_line, panel=0, color='g', linestyle='--', secondary_y=False),
-            mpf.make_addplot(low_line, panel=0, color='r', linestyle='--', secondary_y=False)
-        ])
-    
-    # Add a vertical line to mark the gap up point
-    gap_up_line = pd.Series(index=df.index, dtype=float)
-    gap_up_price = max(df.loc[start_idx, 'Open'], df.loc[start_idx, 'Close'])
-    gap_up_line.loc[:start_idx] = np.nan
-    gap_up_line.loc[start_idx:] = gap_up_price
-    ap2.append(mpf.make_addplot(gap_up_line, panel=0, color='blue', linestyle=':', secondary_y=False))
-    
-    # Create the charts directory if it doesn't exist
-    os.makedirs('charts', exist_ok=True)
-
-    mpf.plot(df, type='candle', style='yahoo', volume=True, savefig=f'charts/{symbol}.png', addplot=ap2,
-            title=f'{symbol} - {pattern} (Gap Up: {start_idx.date()})',
-            ylabel='Daily',
-            ylabel_lower='',
-            figratio=(30,15),
-            figscale=1.5,
-            panel_ratios=(6,1,2,2),
-            tight_layout=True,
-            volume_panel=1,
-            scale_width_adjustment=dict(volume=0.7, candle=1.2),
-            update_width_config=dict(candle_linewidth=1.2),
-            block=False,
-            datetime_format='%b %Y',
-            xrotation=0)
-
-def main():
-    # List of stock symbols to analyze
-    symbols = get_symbols()
-    
-    filtered_stocks = filter_stocks(symbols)
-    
-    for symbol, start_idx in filtered_stocks:
+        results.to_json(output or sys.stdout, orient='records', lines=True)
+
+
+def render_charts(screened, directory, params=None, workers=2):
+    """
+    Renderiza los gráficos en paralelo (un proceso por worker) y los guarda como PNG
+
+    Returns:
+    - dict {symbol: error} con los que fallaron
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    os.makedirs(directory, exist_ok=True)
+    errors = {}
+    # spawn: matplotlib no es seguro con fork si hay threads activos
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(render_chart, entry['df'], symbol, entry['start_idx'], params['window'],
+                                   params['high_slope_threshold'], params['low_slope_threshold']): symbol
+                   for symbol, entry in screened.items()}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                png = future.result()
+                with open(os.path.join(directory, f'{symbol}.png'), 'wb') as f:
+                    f.write(png)
+            except Exception as e:
+                errors[symbol] = e
+    return errors
+
+
+def run_intraday(symbols, quotes, market_cap_min=5000000000, gap_percent=5, provider=None, speed=None,
+                 stream=None):
+    """
+    Modo intradía: reproduce un archivo de cotizaciones y alerta los gaps up del pre-market
+    y de la apertura con el filtro de market cap del screener
+
+    Returns:
+    - DataFrame con una fila por GapAlert
+    """
+    provider = provider or get_provider()
+    source = ReplaySource(quotes, speed=speed)
+    session = source.quotes['timestamp'].iloc[0].date() if len(source) else None
+    monitor = GapMonitor.from_provider(symbols, provider, gap_percent=gap_percent, session=session)
+    rows = []
+    for alerts in monitor.run(source):
+        for alert in alerts:
+            # Market cap solo para los que alertan (get_info queda memoizado)
+            if (get_info(alert.symbol, provider).get('marketCap') or 0) < market_cap_min:
+                continue
+            row = alert._replace(timestamp=alert.timestamp.isoformat())._asdict()
+            rows.append(row)
+            if stream is not None:
+                print(pd.Series(row).to_json(), file=stream, flush=True)
+    return pd.DataFrame(rows, columns=GapAlert._fields)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Screener de gaps y patrones sin interfaz")
+    parser.add_argument('--universe', default=DEFAULT_UNIVERSE, choices=list_universes(),
+                        help="Universo de símbolos (ver universes.json)")
+    parser.add_argument('--symbols', nargs='+', help="Símbolos explícitos en lugar de un universo")
+    parser.add_argument('--provider', choices=list(PROVIDERS), default='yfinance',
+                        help="Fuente de precios y fundamentales ('fake': datos sintéticos, sin red)")
+    parser.add_argument('--store', metavar='DIR', default=DEFAULT_DATA_DIR if store_enabled() else None,
+                        help="Directorio del almacén local de precios (por defecto PEG_DATA_DIR)")
+    parser.add_argument('--no-store', dest='store', action='store_const', const=None,
+                        help="Pedir todo al proveedor, sin almacén local")
+    parser.add_argument('--workers', type=int, default=8, help="Threads para descargar fundamentales")
+    parser.add_argument('--market-cap-min', type=float, default=5e9)
+    parser.add_argument('--gap-percent', type=float, default=5)
+    parser.add_argument('--window', type=int, default=DEFAULT_PARAMS['window'])
+    parser.add_argument('--high-slope-threshold', type=float, default=DEFAULT_PARAMS['high_slope_threshold'])
+    parser.add_argument('--low-slope-threshold', type=float, default=DEFAULT_PARAMS['low_slope_threshold'])
+    parser.add_argument('--format', choices=FORMATS, help="Formato de salida (por defecto según la extensión, o jsonl)")
+    parser.add_argument('--output', '-o', help="Archivo de resultados (por defecto stdout)")
+    parser.add_argument('--charts', metavar='DIR', help="Guardar un gráfico PNG por símbolo en DIR")
+    parser.add_argument('--chart-workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--intraday', metavar='QUOTES',
+                        help="Modo intradía: reproducir un archivo de cotizaciones (csv o parquet)")
+    parser.add_argument('--replay-speed', type=float, help="Velocidad de la reproducción (1 = tiempo real)")
+    parser.add_argument('--verbose', '-v', action='store_true', help="Mostrar el progreso en stderr")
+    args = parser.parse_args(argv)
+    if args.format is None:
+        extension = os.path.splitext(args.output or '')[1].lstrip('.')
+        args.format = extension if extension in FORMATS else 'jsonl'
+    return args
+
+
+def main(argv=None):
+    """Ejecuta el screener y devuelve el código de salida: 0 si todo salió bien, 1 si hubo errores"""
+    args = parse_args(argv)
+    started = time.perf_counter()
+    params = {'window': args.window, 'high_slope_threshold': args.high_slope_threshold,
+              'low_slope_threshold': args.low_slope_threshold}
+    errors = {}
+    provider = make_provider(args.provider, args.store)
+
+    try:
+        symbols = args.symbols or get_symbols(args.universe)
+    except Exception as e:
+        print(f"Error loading universe {args.universe}: {e}", file=sys.stderr)
+        return 1
+
+    if args.intraday:
         try:
-            df = get_stock_data(symbol)
-            df = calculate_rsi(df)
-            df = calculate_macd(df)
-            
-            pattern, _, _ = identify_pattern(df.loc[start_idx:], start_idx)
-            
-            print(f"Symbol: {symbol}")
-            print(f"Pattern: {pattern}")
-            print(f"Gap Up Date: {start_idx.date()}")
-            print(df.loc[start_idx:].tail())
-            print("\n")
-            
-            chart(df, symbol, start_idx)
+            # Sin archivo de salida las alertas se escriben a medida que llegan
+            alerts = run_intraday(symbols, args.intraday, args.market_cap_min, args.gap_percent, provider,
+                                  args.replay_speed, stream=None if args.output else sys.stdout)
+            if args.output:
+                write_results(alerts, args.output, args.format)
         except Exception as e:
-            print(f"Error processing {symbol}: {str(e)}")
+            print(f"Intraday replay failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Replayed {args.intraday} for {len(symbols)} symbols in {time.perf_counter() - started:.1f}s: "
+              f"{len(alerts)} alerts", file=sys.stderr)
+        return 0
+
+    screened, screen_error = run_screen(symbols, args.market_cap_min, args.gap_percent, args.workers,
+                                        provider, args.verbose)
+    results, pattern_errors = build_results(screened, params)
+    errors.update(pattern_errors)
+    try:
+        write_results(results, args.output, args.format)
+    except Exception as e:
+        errors['<output>'] = e
+    if args.charts and screened:
+        errors.update({f'chart {symbol}': e for symbol, e in
+                       render_charts(screened, args.charts, params, args.chart_workers).items()})
+
+    failed = screen_error is not None or bool(errors)
+    summary = (f"Screened {len(symbols)} symbols in {time.perf_counter() - started:.1f}s: "
+               f"{len(results)} results, {len(errors)} errors")
+    if screen_error is not None:
+        summary += f"\nScreen aborted: {screen_error}"
+    for symbol, e in errors.items():
+        summary += f"\n  {symbol}: {e}"
+    print(summary, file=sys.stderr)
+    return 1 if failed else 0
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
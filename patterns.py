@@ -0,0 +1,318 @@
+from collections import namedtuple
+from enum import Enum
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from indicators import PANEL_COLUMNS
+
+
+class Pattern(str, Enum):
+    RECTANGLE = 'Rectangle/Consolidation'
+    ASCENDING_TRIANGLE = 'Ascending Triangle'
+    DESCENDING_TRIANGLE = 'Descending Triangle'
+    FALLING_WEDGE = 'Falling Wedge'
+    DESCENDING_CHANNEL = 'Descending Channel'
+    RISING_WEDGE = 'Rising Wedge'
+    ASCENDING_CHANNEL = 'Ascending Channel'
+    NO_PATTERN = 'No clear pattern'
+    INSUFFICIENT_DATA = 'Insufficient data'
+    NO_VARIATION = 'No price variation detected'
+
+
+PatternResult = namedtuple('PatternResult', ['pattern', 'confidence', 'high_extrema', 'low_extrema',
+                                             'high_slope', 'low_slope'])
+
+# Valores por defecto de los sliders de la app; también los del CLI, el pre-renderizado y el screener
+DEFAULT_PARAMS = {'window': 3, 'high_slope_threshold': 0.1, 'low_slope_threshold': 0.1}
+
+# Columnas que usa la detección de patrones, en el orden de detect_pattern
+PATTERN_COLUMNS = ('High', 'Low', 'Close', 'Volume')
+
+# Orden de las ramas de identify_pattern_with_confidence
+PATTERN_CODES = [Pattern.RECTANGLE, Pattern.ASCENDING_TRIANGLE, Pattern.DESCENDING_TRIANGLE,
+                 Pattern.FALLING_WEDGE, Pattern.DESCENDING_CHANNEL, Pattern.RISING_WEDGE,
+                 Pattern.ASCENDING_CHANNEL, Pattern.NO_PATTERN]
+_CONFIDENCE_FACTORS = np.array([0.9, 1.0, 1.0, 0.95, 0.95, 0.95, 0.95, 0.5])
+
+# Ejes de PatternGrid: los valores de los sliders "Window Size" y "Trend Sensitivity" de la app
+GRID_WINDOWS = range(3, 11)
+GRID_THRESHOLDS = np.round(np.linspace(0, 1, 101), 2)
+
+
+def smooth(values, window):
+    """Media móvil con min_periods=2 (como rolling(window, min_periods=2).mean()) sobre el último eje"""
+    values = np.asarray(values, dtype=float)
+    pad = np.full(values.shape[:-1] + (window - 1,), np.nan)
+    windows = sliding_window_view(np.concatenate([pad, values], axis=-1), window, axis=-1)
+    counts = np.sum(~np.isnan(windows), axis=-1)
+    with np.errstate(invalid='ignore'):
+        means = np.nansum(windows, axis=-1) / counts
+    return np.where(counts >= 2, means, np.nan)
+
+
+def local_extrema(values, order, greater=True):
+    """Equivalente a scipy.signal.argrelextrema(values, np.greater|np.less, order, mode='clip')"""
+    n = len(values)
+    compare = np.greater if greater else np.less
+    positions = np.arange(n)
+    result = np.ones(n, dtype=bool)
+    for shift in range(1, order + 1):
+        result &= compare(values, values[np.minimum(positions + shift, n - 1)])
+        result &= compare(values, values[np.maximum(positions - shift, 0)])
+    return np.flatnonzero(result)
+
+
+def fit_slope(points):
+    # Pendiente de mínimos cuadrados contra 0..n-1 (igual que np.polyfit(range(n), points, 1)[0])
+    x = np.arange(len(points)) - (len(points) - 1) / 2
+    return np.dot(x, points - points.mean()) / np.dot(x, x)
+
+
+def confidence_score(close, volume, n_high, n_low):
+    score = 100.0
+    # Factor 1: Consistencia de los puntos
+    if n_high < 4 or n_low < 4:
+        score *= 0.8
+    # Factor 2: Volatilidad
+    returns = close[1:] / close[:-1] - 1
+    if len(returns) > 1 and returns.std(ddof=1) > 0.02:
+        score *= 0.9
+    # Factor 3: Volumen
+    if volume[-5:].mean() < volume.mean() * 0.7:
+        score *= 0.85
+    return max(min(score, 100), 0)
+
+
+def classify(high_slope, low_slope, threshold):
+    """
+    Clasifica pendientes normalizadas; admite arrays (con broadcasting) además de escalares
+
+    Returns:
+    - (códigos de patrón en PATTERN_CODES, factor de confianza)
+    """
+    high_slope, low_slope, threshold = np.broadcast_arrays(high_slope, low_slope, threshold)
+    conditions = [
+        (np.abs(high_slope) < threshold) & (np.abs(low_slope) < threshold),
+        (high_slope > threshold) & (low_slope < threshold),
+        (high_slope < -threshold) & (low_slope > -threshold),
+        (high_slope < -threshold) & (low_slope < -threshold) & (np.abs(high_slope) > np.abs(low_slope)),
+        (high_slope < -threshold) & (low_slope < -threshold),
+        (high_slope > threshold) & (low_slope > threshold) & (high_slope > low_slope),
+        (high_slope > threshold) & (low_slope > threshold),
+    ]
+    codes = np.select(conditions, np.arange(len(conditions)), default=len(conditions))
+    return codes, _CONFIDENCE_FACTORS[codes]
+
+
+def find_extrema(high_smooth, low_smooth, window):
+    # Reducir el orden para encontrar más extremos locales
+    order = max(1, window - 2)
+    high_extrema = local_extrema(high_smooth, order, greater=True)
+    low_extrema = local_extrema(low_smooth, order, greater=False)
+
+    # Si no hay suficientes puntos, intentar con el orden mínimo
+    if (len(high_extrema) < 2 or len(low_extrema) < 2) and order > 1:
+        high_extrema = local_extrema(high_smooth, 1, greater=True)
+        low_extrema = local_extrema(low_smooth, 1, greater=False)
+
+    # Si aún no hay suficientes puntos, usar los 2 valores más altos y más bajos
+    if len(high_extrema) < 2 or len(low_extrema) < 2:
+        high_extrema = np.argsort(high_smooth)[-2:]
+        low_extrema = np.argsort(low_smooth)[:2]
+    return high_extrema, low_extrema
+
+
+def measure(high, low, high_smooth, low_smooth, high_extrema, low_extrema):
+    # Pendientes normalizadas por el rango de precio; None si no hay variación
+    price_range = high.max() - low.min()
+    if price_range == 0:
+        return None
+    return (fit_slope(high_smooth[high_extrema]) / price_range,
+            fit_slope(low_smooth[low_extrema]) / price_range)
+
+
+def measure_window(high, low, close, volume, window=3):
+    """
+    Todo lo de detect_pattern que no depende de los umbrales: suavizado, extremos,
+    pendientes y confianza base
+
+    Returns:
+    - PatternResult con pattern=None (falta clasificar), o ya resuelto si no hay datos
+      suficientes o variación de precio
+    """
+    if len(high) < 3:
+        return PatternResult(Pattern.INSUFFICIENT_DATA, 0.0, None, None, None, None)
+
+    smooth_window = max(2, window - 1)
+    high_smooth = smooth(high, smooth_window)
+    low_smooth = smooth(low, smooth_window)
+    high_extrema, low_extrema = find_extrema(high_smooth, low_smooth, window)
+
+    slopes = measure(high, low, high_smooth, low_smooth, high_extrema, low_extrema)
+    if slopes is None:
+        return PatternResult(Pattern.NO_VARIATION, 0.0, None, None, None, None)
+    high_slope, low_slope = slopes
+
+    score = confidence_score(close, volume, len(high_extrema), len(low_extrema))
+    return PatternResult(None, score, high_extrema, low_extrema, high_slope, low_slope)
+
+
+def detect_pattern(high, low, close, volume, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05):
+    """
+    Núcleo de identify_pattern sobre arrays ya recortados desde el gap y sin NaN
+
+    Igual que identify_pattern, la clasificación solo usa high_slope_threshold.
+    """
+    result = measure_window(high, low, close, volume, window)
+    if result.pattern is not None:
+        return result
+    code, factor = classify(result.high_slope, result.low_slope, high_slope_threshold)
+    return result._replace(pattern=PATTERN_CODES[int(code)], confidence=result.confidence * float(factor))
+
+
+
+def pattern_inputs(df, start_idx):
+    """
+    Lo que recibe la detección de patrones desde el gap de un DataFrame OHLCV: el tramo desde
+    `start_idx` sin las filas con algún NaN (indicadores incluidos)
+
+    Returns:
+    - (filas del tramo antes de limpiar, high, low, close, volume)
+    """
+    df = df.loc[start_idx:]
+    valid = df.notna().to_numpy().all(axis=1)
+    return (len(df),) + tuple(df[column].to_numpy(dtype=float)[valid] for column in PATTERN_COLUMNS)
+
+
+def detect_pattern_from(df, start_idx, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05):
+    """
+    Patrón desde el gap de un DataFrame OHLCV (lo que identify_pattern describe como texto)
+
+    Usa pattern_inputs y exige window * 2 filas en el tramo antes de limpiar.
+
+    Returns:
+    - (PatternResult, filas del tramo, filas válidas)
+    """
+    n_rows, *columns = pattern_inputs(df, start_idx)
+    n_valid = len(columns[0])
+    if n_rows < window * 2:
+        return PatternResult(Pattern.INSUFFICIENT_DATA, 0.0, None, None, None, None), n_rows, n_valid
+    result = detect_pattern(*columns, window=window, high_slope_threshold=high_slope_threshold,
+                            low_slope_threshold=low_slope_threshold)
+    return result, n_rows, n_valid
+
+
+def series_features(series, window):
+    """
+    Pendientes y confianza de varias series para un `window`; no dependen de los umbrales
+
+    Args:
+    - series (list): (filas antes de limpiar, high, low, close, volume) por serie, ya
+      recortadas desde el gap y sin NaN
+    - window (int): Ventana de identify_pattern
+
+    Returns:
+    - (high_slopes, low_slopes, confidences, valid) como arrays por serie; valid=False
+      marca las series sin datos suficientes o sin variación de precio
+    """
+    n = len(series)
+    high_slopes, low_slopes, confidences = np.zeros(n), np.zeros(n), np.zeros(n)
+    valid = np.zeros(n, dtype=bool)
+    for i, (n_rows, high, low, close, volume) in enumerate(series):
+        if n_rows < window * 2:
+            continue
+        result = measure_window(high, low, close, volume, window)
+        if result.pattern is not None:
+            continue
+        high_slopes[i], low_slopes[i], confidences[i] = result.high_slope, result.low_slope, result.confidence
+        valid[i] = True
+    return high_slopes, low_slopes, confidences, valid
+
+
+class PatternGrid:
+    """
+    Patrón y confianza de una serie para todas las combinaciones window × umbral
+
+    Suavizado, extremos y pendientes se calculan una sola vez por window; los umbrales solo
+    reclasifican esas pendientes, todos juntos en un classify vectorizado. Cambiar los
+    parámetros es entonces una consulta (lookup) sin recalcular nada.
+
+    Args:
+    - high, low, close, volume (array): Serie recortada desde el gap y sin NaN
+    - n_rows (int): Filas antes de limpiar (identify_pattern exige window * 2); por defecto len(high)
+    - windows, thresholds: Ejes de la grilla (por defecto los de los sliders de la app)
+    """
+
+    def __init__(self, high, low, close, volume, n_rows=None, windows=GRID_WINDOWS, thresholds=GRID_THRESHOLDS):
+        self.n_rows = len(high) if n_rows is None else n_rows
+        self.n_valid = len(high)
+        self.windows = np.asarray(windows, dtype=int)
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        self.results = [measure_window(high, low, close, volume, window) if self.n_rows >= window * 2
+                        else PatternResult(Pattern.INSUFFICIENT_DATA, 0.0, None, None, None, None)
+                        for window in self.windows]
+
+        measured = np.array([result.pattern is None for result in self.results])
+        high_slopes = np.array([r.high_slope if m else 0.0 for r, m in zip(self.results, measured)])
+        low_slopes = np.array([r.low_slope if m else 0.0 for r, m in zip(self.results, measured)])
+        scores = np.array([r.confidence for r in self.results])
+        codes, factors = classify(high_slopes[:, None], low_slopes[:, None], self.thresholds[None, :])
+        # windows × umbrales; las filas sin medir repiten su resultado (datos insuficientes, sin variación)
+        self.patterns = np.empty(codes.shape, dtype=object)
+        for i, result in enumerate(self.results):
+            self.patterns[i] = ([PATTERN_CODES[code] for code in codes[i]] if measured[i]
+                                else [result.pattern] * len(self.thresholds))
+        self.confidence = np.where(measured[:, None], scores[:, None] * factors, 0.0)
+
+    @classmethod
+    def from_frame(cls, df, start_idx, windows=GRID_WINDOWS, thresholds=GRID_THRESHOLDS):
+        """Grilla desde el gap de un DataFrame OHLCV, con la misma limpieza que identify_pattern"""
+        n_rows, *columns = pattern_inputs(df, start_idx)
+        return cls(*columns, n_rows=n_rows, windows=windows, thresholds=thresholds)
+
+    def lookup(self, window, high_slope_threshold, low_slope_threshold=None):
+        """
+        Resultado de detect_pattern para estos parámetros sin volver a suavizar ni buscar extremos
+
+        Un umbral fuera de la grilla reclasifica las pendientes ya medidas de ese window.
+        Igual que detect_pattern, low_slope_threshold no se usa.
+
+        Returns:
+        - PatternResult
+        """
+        i = int(np.flatnonzero(self.windows == window)[0])
+        result = self.results[i]
+        if result.pattern is not None:
+            return result
+        matches = np.flatnonzero(self.thresholds == high_slope_threshold)
+        if len(matches):
+            j = matches[0]
+            return result._replace(pattern=self.patterns[i, j], confidence=float(self.confidence[i, j]))
+        code, factor = classify(result.high_slope, result.low_slope, high_slope_threshold)
+        return result._replace(pattern=PATTERN_CODES[int(code)], confidence=result.confidence * float(factor))
+
+
+def identify_patterns_batch(panel, start_positions, params=None):
+    """
+    Detecta patrones para varios símbolos de un IndicatorPanel
+
+    Args:
+    - panel (IndicatorPanel): Panel con OHLCV e indicadores
+    - start_positions (dict): símbolo -> fila del panel donde empieza el análisis (gap)
+    - params (dict): window, high_slope_threshold, low_slope_threshold
+
+    Returns:
+    - dict símbolo -> PatternResult (extremos relativos a las filas válidas desde el gap)
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    columns = [PANEL_COLUMNS.index(c) for c in PATTERN_COLUMNS]
+    results = {}
+    for symbol, start in start_positions.items():
+        rows = panel.values[panel.position(symbol), start:]
+        if len(rows) < params['window'] * 2:
+            results[symbol] = PatternResult(Pattern.INSUFFICIENT_DATA, 0.0, None, None, None, None)
+            continue
+        # Igual que df.dropna(): descartar filas con algún NaN
+        rows = rows[~np.isnan(rows).any(axis=1)]
+        high, low, close, volume = (rows[:, c] for c in columns)
+        results[symbol] = detect_pattern(high, low, close, volume, **params)
+    return results
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+from data_providers import period_start, MARKET_TZ, OHLCV_COLUMNS
+from gap_events import find_gap_events
+
+DEFAULT_DATA_DIR = os.environ.get('PEG_DATA_DIR', 'data')
+# Días antes de la última barra guardada desde los que se vuelve a pedir un símbolo: las barras
+# que se solapan permiten detectar que el proveedor reajustó el historial (split o dividendo)
+OVERLAP_DAYS = 7
+# Diferencia relativa de cierre en el solape a partir de la cual se considera reajustado
+ADJUSTMENT_TOLERANCE = 1e-4
+
+
+def store_enabled():
+    return os.environ.get('PEG_PRICE_STORE', '1') != '0'
+
+
+class PriceStore:
+    """
+    Almacén local de OHLCV: un archivo Parquet por símbolo más un manifiesto con la
+    cobertura y la fecha de la última barra de cada símbolo.
+
+    Expone la misma interfaz que un proveedor (info/history/download), de modo que se
+    puede encadenar delante de cualquiera. Tras un backfill inicial solo se piden al
+    proveedor las barras posteriores a la última guardada; si las barras que se solapan con
+    lo guardado cambiaron (el proveedor reajustó precios por un split o un dividendo) el
+    símbolo se descarta y se vuelve a bajar completo. Junto a cada símbolo se guarda
+    su índice de gaps (gap_events), que se rehace cuando llegan barras nuevas.
+
+    Args:
+    - provider: Proveedor de datos subyacente
+    - root (str): Directorio del almacén
+    - refresh_interval (int): Segundos durante los que un símbolo recién verificado
+      no vuelve a consultarse
+    """
+
+    def __init__(self, provider, root=None, refresh_interval=900):
+        self.provider = provider
+        self.root = os.path.join(root or DEFAULT_DATA_DIR, 'prices')
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._manifest = None
+
+    # --- Manifiesto ---------------------------------------------------------
+
+    def _manifest_path(self):
+        return os.path.join(self.root, 'manifest.json')
+
+    def manifest(self):
+        if self._manifest is None:
+            try:
+                with open(self._manifest_path()) as f:
+                    self._manifest = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._manifest = {}
+        return self._manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._manifest_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._manifest_path())
+
+    # --- Archivos por símbolo -----------------------------------------------
+
+    def _path(self, symbol):
+        return os.path.join(self.root, f"{symbol}.parquet")
+
+    def read(self, symbol):
+        try:
+            return pd.read_parquet(self._path(symbol))
+        except FileNotFoundError:
+            return None
+
+    def _write(self, symbol, df):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._path(symbol) + '.tmp'
+        df.to_parquet(tmp)
+        os.replace(tmp, self._path(symbol))
+
+    def _remove(self, symbol):
+        for path in (self._path(symbol), self._events_path(symbol)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.manifest().pop(symbol, None)
+
+    def _events_path(self, symbol):
+        return os.path.join(self.root, f"{symbol}.gaps.parquet")
+
+    def read_events(self, symbol):
+        try:
+            return pd.read_parquet(self._events_path(symbol))
+        except FileNotFoundError:
+            return None
+
+    def _write_events(self, frames):
+        # Un solo escaneo vectorizado para todos los símbolos actualizados
+        closes = pd.DataFrame({symbol: df['Close'] for symbol, df in frames.items()})
+        volumes = pd.DataFrame({symbol: df['Volume'] for symbol, df in frames.items()})
+        events = find_gap_events(closes, volumes)
+        by_symbol = dict(list(events.groupby('symbol', sort=False)))
+        for symbol in frames:
+            tmp = self._events_path(symbol) + '.tmp'
+            by_symbol.get(symbol, events.iloc[:0]).to_parquet(tmp, index=False)
+            os.replace(tmp, self._events_path(symbol))
+
+    # --- Interfaz de proveedor ----------------------------------------------
+
+    def info(self, symbol):
+        return self.provider.info(symbol)
+
+    def history(self, symbol, period='ytd', start=None):
+        return self.download([symbol], period=period, start=start).get(symbol, pd.DataFrame(columns=OHLCV_COLUMNS))
+
+    def download(self, symbols, period='ytd', start=None):
+        # Igual que los proveedores, `start` tiene prioridad sobre `period`
+        if start is None:
+            start = period_start(period)
+        else:
+            start = pd.Timestamp(start)
+            start = (start.tz_localize(MARKET_TZ) if start.tzinfo is None else start.tz_convert(MARKET_TZ)).normalize()
+        covered_from = 'max' if start is None else start.strftime('%Y-%m-%d')
+        manifest = self.manifest()
+        now = time.time()
+
+        cold, warm = [], {}
+        for symbol in symbols:
+            entry = manifest.get(symbol)
+            if entry is None or not _covers(entry['covered_from'], covered_from):
+                cold.append(symbol)
+            elif now - entry['checked_at'] > self.refresh_interval:
+                warm.setdefault(entry['last'], []).append(symbol)
+
+        updates = {}
+        if cold:
+            span = {'period': period} if start is None else {'start': start}
+            updates.update({s: (df, covered_from) for s, df in self.provider.download(cold, **span).items()
+                            if _complete(df)})
+        readjusted = {}
+        for last, group in warm.items():
+            # Se vuelve a pedir también la última barra guardada por si estaba incompleta
+            last = pd.Timestamp(last, tz=MARKET_TZ)
+            new_bars = self.provider.download(group, start=last - pd.Timedelta(days=OVERLAP_DAYS))
+            for symbol, df in new_bars.items():
+                if not _complete(df):
+                    # Respuesta incompleta: se conserva lo guardado
+                    continue
+                stored = self.read(symbol)
+                if stored is not None and _readjusted(stored, df, last):
+                    readjusted.setdefault(manifest[symbol]['covered_from'], []).append(symbol)
+                    continue
+                if stored is not None:
+                    df = pd.concat([stored[stored.index < df.index[0]], df]) if len(df) else stored
+                updates[symbol] = (df, manifest[symbol]['covered_from'])
+        for covered, group in readjusted.items():
+            # Lo guardado quedó en otra base de ajuste: pegarle barras nuevas crearía un gap falso
+            with self._lock:
+                for symbol in group:
+                    self._remove(symbol)
+            span = {'period': 'max'} if covered == 'max' else {'start': pd.Timestamp(covered, tz=MARKET_TZ)}
+            updates.update({s: (df, covered) for s, df in self.provider.download(group, **span).items()
+                            if _complete(df)})
+
+        with self._lock:
+            written = {}
+            for symbol, (df, covered) in updates.items():
+                if len(df) == 0:
+                    continue
+                df = written[symbol] = df[OHLCV_COLUMNS]
+                self._write(symbol, df)
+                manifest[symbol] = {'covered_from': covered,
+                                    'last': df.index[-1].strftime('%Y-%m-%d'),
+                                    'checked_at': now}
+            if written:
+                self._write_events(written)
+            for group in warm.values():
+                for symbol in group:
+                    if symbol in manifest:
+                        manifest[symbol]['checked_at'] = now
+            if updates or warm:
+                self._save_manifest()
+
+        frames = {}
+        for symbol in symbols:
+            df = updates[symbol][0][OHLCV_COLUMNS] if symbol in updates else self.read(symbol)
+            if df is not None and len(df) > 0:
+                frames[symbol] = df if start is None else df.loc[start:]
+        return frames
+
+
+def _covers(stored_from, requested_from):
+    if stored_from == 'max':
+        return True
+    if requested_from == 'max':
+        return False
+    return stored_from <= requested_from
+
+
+def _complete(df):
+    # Un frame sin alguna columna OHLCV no se guarda (igual que uno vacío)
+    return all(column in df.columns for column in OHLCV_COLUMNS)
+
+
+def _readjusted(stored, fresh, last):
+    # Cierres de las barras completas (anteriores a `last`) que están en los dos lados
+    overlap = stored.index.intersection(fresh.index)
+    overlap = overlap[overlap < last]
+    if len(overlap) == 0:
+        return False
+    return not np.allclose(fresh.loc[overlap, 'Close'].to_numpy(dtype=float),
+                           stored.loc[overlap, 'Close'].to_numpy(dtype=float),
+                           rtol=ADJUSTMENT_TOLERANCE, atol=0, equal_nan=True)
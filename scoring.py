@@ -0,0 +1,128 @@
+import warnings
+import numpy as np
+import pandas as pd
+from indicators import PRICE_COLUMNS
+
+# Columnas del desglose y puntos máximos de cada criterio (total 100)
+SCORE_COLUMNS = {'ma20': 15, 'ma50': 15, 'gap_support': 20, 'rsi': 20, 'volume': 20, 'macd': 10}
+TAIL = 20
+TAIL_COLUMNS = ['Close', 'Low', 'Volume', 'ma_20', 'ma_50', 'rsi', 'histogram']
+
+
+def _tails(cached_data):
+    """
+    Últimas TAIL filas de las columnas necesarias para todos los símbolos en un solo array
+    (símbolos × TAIL × columnas), más el mínimo del día del gap y si hay MACD
+    """
+    tails = np.full((len(cached_data), TAIL, len(TAIL_COLUMNS)), np.nan)
+    gap_support = np.empty(len(cached_data))
+    has_macd = np.zeros(len(cached_data), dtype=bool)
+    for i, entry in enumerate(cached_data.values()):
+        df = entry['df']
+        # Solo se convierten las últimas filas (los frames compactos tienen un bloque por columna)
+        tail = df.iloc[-TAIL:].to_numpy(dtype=float)
+        positions = df.columns.get_indexer(TAIL_COLUMNS)
+        present = positions >= 0
+        has_macd[i] = present[-1]
+        tails[i, TAIL - len(tail):, present] = tail[:, positions[present]].T
+        gap_support[i] = df['Low'].to_numpy()[df.index.get_loc(entry['start_idx'])]
+    return tails, gap_support, has_macd
+
+
+def _panel_tails(panel, cached_data):
+    # Igual que _tails pero leyendo directo de un CompactPanel, sin pasar por los DataFrames
+    positions = np.array([panel.position(symbol) for symbol in cached_data], dtype=np.int64)
+    first, stop = panel.bounds[positions].T
+    rows = stop[:, None] - TAIL + np.arange(TAIL)
+    valid = rows >= first[:, None]
+    rows = np.where(valid, rows, 0)
+    tails = np.full((len(positions), TAIL, len(TAIL_COLUMNS)), np.nan)
+    for k, column in enumerate(TAIL_COLUMNS):
+        source = panel.volume if column == 'Volume' else panel.prices[PRICE_COLUMNS.index(column)]
+        tails[:, :, k] = np.where(valid, source[positions[:, None], rows], np.nan)
+    gap_rows = panel.index.get_indexer([entry['start_idx'] for entry in cached_data.values()])
+    gap_support = panel.prices[PRICE_COLUMNS.index('Low'), positions, gap_rows].astype(float)
+    return tails, gap_support, np.ones(len(positions), dtype=bool)
+
+
+def score_tails(tails, gap_support, has_macd):
+    """
+    Puntos de cada criterio a partir de las últimas TAIL filas (símbolos × TAIL × TAIL_COLUMNS)
+
+    Returns:
+    - (dict criterio -> array de puntos, dict con los valores usados)
+    """
+    column = {name: k for k, name in enumerate(TAIL_COLUMNS)}
+    close, ma20, ma50, histogram = (tails[:, -1, column[c]] for c in ('Close', 'ma_20', 'ma_50', 'histogram'))
+    rsi_tail = tails[:, -5:, column['rsi']]
+    volume_tail = tails[:, :, column['Volume']]
+
+    rsi = rsi_tail[:, -1]
+    with warnings.catch_warnings():
+        # nanmean de filas sin datos devuelve NaN con un RuntimeWarning
+        warnings.simplefilter('ignore', RuntimeWarning)
+        rsi_trend = np.nanmean(np.diff(rsi_tail, axis=1), axis=1)  # Media de cambio en últimos 5 días
+        recent_volume = np.nanmean(volume_tail[:, -5:], axis=1)
+        avg_volume = np.nanmean(volume_tail, axis=1)
+
+    rsi_healthy = (rsi > 40) & (rsi < 70)
+    points = {
+        'ma20': np.where(close > ma20, 15, 0),
+        'ma50': np.where((close > ma20) & (close > ma50), 15, 0),
+        'gap_support': np.where(close > gap_support, 20, 0),
+        'rsi': np.where(rsi_healthy & (rsi_trend > 0), 20, np.where(rsi_healthy, 10, 0)),
+        'volume': np.where(recent_volume > avg_volume, 20, 0),
+        'macd': np.where(has_macd & (histogram > 0), 10, 0),
+    }
+    values = {'price': close, 'rsi_value': rsi, 'rsi_trend': rsi_trend, 'volume_ratio': recent_volume / avg_volume}
+    return points, values
+
+
+def score_setups(cached_data, panel=None):
+    """
+    Puntaje de calidad del setup (0-100) para todos los símbolos a la vez
+
+    Mismos criterios que el análisis individual de la app: precio vs MA20/MA50, soporte del
+    gap, nivel y tendencia del RSI, volumen reciente y MACD.
+
+    Args:
+    - cached_data (dict): {symbol: {'df', 'start_idx'}}
+    - panel (CompactPanel): Panel del que salen los frames; si se pasa se lee directo de él
+
+    Returns:
+    - DataFrame por símbolo con el score, los puntos de cada criterio y los valores usados,
+      ordenado de mayor a menor score
+    """
+    symbols = list(cached_data)
+    if panel is not None and all(symbol in panel for symbol in cached_data):
+        tails, gap_support, has_macd = _panel_tails(panel, cached_data)
+    else:
+        tails, gap_support, has_macd = _tails(cached_data)
+    points, values = score_tails(tails, gap_support, has_macd)
+    scores = pd.DataFrame(points, index=pd.Index(symbols, name='Symbol'))
+    scores.insert(0, 'score', scores.sum(axis=1))
+    scores['macd_available'] = has_macd
+    for name, value in values.items():
+        scores[name] = value
+    scores['gap_date'] = [entry['start_idx'].date() for entry in cached_data.values()]
+    return scores.sort_values('score', ascending=False, kind='stable')
+
+
+def setup_reasons(row):
+    """Textos explicativos de un renglón de score_setups, como en el análisis individual"""
+    reasons = []
+    if row['ma20']:
+        reasons.append("✅ Price above MA20")
+        if row['ma50']:
+            reasons.append("✅ Price above MA50")
+    else:
+        reasons.append("❌ Price below MA20")
+    reasons.append("✅ Holding gap level" if row['gap_support'] else "❌ Lost gap support")
+    reasons.append({20: "✅ RSI rising in healthy range",
+                    10: "⚠️ RSI stable in healthy range"}.get(row['rsi'], "❌ RSI out of healthy range"))
+    reasons.append("✅ Above average volume" if row['volume'] else "❌ Below average volume")
+    if not row['macd_available']:
+        reasons.append("⚠️ MACD data not available")
+    else:
+        reasons.append("✅ Positive MACD" if row['macd'] else "❌ Negative MACD")
+    return reasons
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import namedtuple
+import pandas as pd
+from data_providers import MARKET_TZ, get_provider, period_start
+from data_processing import process_and_cache_data
+from indicators import CompactPanel
+from gap_events import MIN_GAP_PERCENT, GapIndex
+from incremental import HistoryTracker
+from price_store import PriceStore
+from universes import get_universe
+
+# Hora (del mercado) a partir de la cual se vuelve a correr el screener: después del cierre
+REFRESH_TIME = '16:30'
+# Gap mínimo que muestra la app por defecto (el patrón de cada símbolo se sigue desde ese gap)
+DEFAULT_MIN_GAP = 5
+
+ScreenState = namedtuple('ScreenState', ['progress', 'status', 'symbols', 'panel', 'completed_at', 'error',
+                                         'running', 'gaps', 'patterns'])
+
+
+def last_refresh_point(now=None, refresh_time=REFRESH_TIME):
+    """Último horario de refresco programado (día hábil a `refresh_time`) que ya pasó"""
+    now = pd.Timestamp.now(tz=MARKET_TZ) if now is None else now.tz_convert(MARKET_TZ)
+    point = now.normalize() + pd.Timedelta(f'{refresh_time}:00')
+    if now < point or point.dayofweek >= 5:
+        point = pd.offsets.BDay().rollback(point - pd.Timedelta(days=1))
+    return point
+
+
+class ScreenJob:
+    """
+    Screener de un universo corriendo en un thread de fondo
+
+    Las sesiones no corren el screener: leen el estado del job con `state()`. Mientras se
+    refresca se sigue sirviendo el panel anterior hasta que el nuevo está completo.
+
+    El filtro corre con el gap mínimo del índice de gaps (MIN_GAP_PERCENT); el umbral que
+    elige cada sesión es una consulta a ese índice sobre los filtrados. Entre corridas se
+    conserva un HistoryTracker: en cada refresco los indicadores y el patrón (con
+    DEFAULT_PARAMS, desde el último gap de DEFAULT_MIN_GAP) de los que siguen filtrados
+    solo se actualizan con las barras nuevas.
+    """
+
+    def __init__(self, universe, provider=None):
+        self.universe = universe
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._thread = None
+        self._progress = 0.0
+        self._status = 'Waiting to start'
+        self._partial = {}
+        self._panel = None
+        self._gaps = None
+        self._patterns = {}
+        self._history = HistoryTracker()
+        self._completed_at = None
+        self._error = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Arranca el screener si no está corriendo (llamadas concurrentes no lo duplican)"""
+        with self._lock:
+            if self.running:
+                return False
+            self._progress, self._partial, self._error = 0.0, {}, None
+            self._thread = threading.Thread(target=self._run, name=f'screen-{self.universe}', daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self):
+        try:
+            provider = self.provider or get_provider()
+            symbols = get_universe(self.universe)
+            for progress, status, delta in process_and_cache_data(symbols, provider, gap_percent=MIN_GAP_PERCENT,
+                                                                  history=self._history):
+                with self._lock:
+                    self._progress, self._status = progress, status
+                    if delta:
+                        self._partial.update(delta)
+            panel = CompactPanel.from_screen(self._partial)
+            if isinstance(provider, PriceStore):
+                # Índice de todo el universo que el PriceStore acaba de actualizar junto a los precios
+                gaps = GapIndex.from_store(provider, symbols)
+            else:
+                # Sin almacén: índice de los filtrados (con los indicadores float64 del screener)
+                gaps = GapIndex.from_frames({symbol: entry['df'] for symbol, entry in self._partial.items()})
+            self._history.prune(self._partial)
+            patterns = self._track_patterns(gaps)
+            with self._lock:
+                self._panel, self._gaps, self._patterns, self._partial = panel, gaps, patterns, {}
+                self._completed_at = pd.Timestamp.now(tz=MARKET_TZ)
+        except Exception as e:
+            with self._lock:
+                self._error = e
+                self._status = f"Screen failed: {e}"
+
+    def _track_patterns(self, gaps):
+        # {symbol: (gap, PatternResult)}; sin un gap de DEFAULT_MIN_GAP, desde el del filtro
+        last_gaps = gaps.last_gaps(DEFAULT_MIN_GAP, since=period_start('1mo'), symbols=list(self._partial))
+        patterns = {}
+        for symbol, entry in self._partial.items():
+            start_idx = last_gaps.get(symbol, entry['start_idx'])
+            patterns[symbol] = (start_idx, self._history.pattern(symbol, start_idx))
+        return patterns
+
+    def state(self):
+        with self._lock:
+            # Símbolos del panel completo, o los que van llegando en la primera corrida
+            symbols = list(self._partial) if self._panel is None else self._panel.symbols
+            return ScreenState(self._progress, self._status, symbols, self._panel, self._completed_at,
+                               self._error, self.running, self._gaps, self._patterns)
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.state()
+
+
+class ScreenService:
+    """
+    Un ScreenJob por universo para todo el proceso, con refresco programado después del cierre
+
+    Args:
+    - provider: Proveedor de datos (por defecto get_provider())
+    - refresh_time (str): Hora del mercado del refresco diario
+    """
+
+    def __init__(self, provider=None, refresh_time=REFRESH_TIME):
+        self.provider = provider
+        self.refresh_time = refresh_time
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._scheduler = None
+
+    def job(self, universe):
+        """Job del universo; la primera vez lo crea y lo arranca, después refresca si toca"""
+        with self._lock:
+            job = self._jobs.get(universe)
+            if job is None:
+                job = self._jobs[universe] = ScreenJob(universe, self.provider)
+                job.start()
+                return job
+        if self.refresh_due(job):
+            job.start()
+        return job
+
+    def refresh_due(self, job, now=None):
+        state = job.state()
+        if state.running or state.completed_at is None:
+            # Sin resultado y sin correr: la corrida anterior falló y se reintenta
+            return not state.running and state.panel is None
+        return state.completed_at < last_refresh_point(now, self.refresh_time)
+
+    def refresh_all(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if self.refresh_due(job):
+                job.start()
+
+    def start_scheduler(self, interval=300):
+        """Revisa cada `interval` segundos si pasó el horario de refresco, aunque nadie abra la app"""
+        if self._scheduler is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.refresh_all()
+
+        self._scheduler = threading.Thread(target=loop, name='screen-scheduler', daemon=True)
+        self._scheduler.start()
@@ -1,48 +1,117 @@
-import yfinance as yf
 import pandas as pd
 import plotly.graph_objs as go
 import streamlit as st
+from data_providers import fetch_period, get_provider, period_start, trading_day
+import instrumentation as metrics
 
-def sector_relative_performance(period='1y'):
+SECTOR_ETFS = {
+    'Technology': 'XLK',
+    'Financials': 'XLF',
+    'Energy': 'XLE',
+    'Healthcare': 'XLV',
+    'Industrials': 'XLI',
+    'Materials': 'XLB',
+    'Consumer Discretionary': 'XLY',
+    'Consumer Staples': 'XLP',
+    'Utilities': 'XLU',
+    'Communication Services': 'XLC'
+}
+BENCHMARK_ETF = 'SPY'
+
+# Horizontes del ranking de fuerza relativa (etiqueta -> período de yfinance)
+RS_HORIZONS = {'1W': '1wk', '1M': '1mo', '3M': '3mo', 'YTD': 'ytd'}
+
+
+def load_sector_prices(period='1y', provider=None):
+    """
+    Cierres ajustados de los ETFs sectoriales y del benchmark en una sola descarga multi-símbolo
+
+    Returns:
+    - DataFrame fechas × sectores (más la columna del benchmark)
+    """
+    provider = provider or get_provider()
+    symbols = list(SECTOR_ETFS.values()) + [BENCHMARK_ETF]
+    with metrics.timer('sector_download'):
+        frames = provider.download(symbols, period)
+    names = {etf: sector for sector, etf in SECTOR_ETFS.items()}
+    closes = {names.get(etf, etf): df['Close'] for etf, df in frames.items() if len(df) > 0}
+    for etf in symbols:
+        if names.get(etf, etf) not in closes:
+            print(f"Error procesando {names.get(etf, etf)}: sin datos para {etf}")
+    return pd.DataFrame(closes)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_sector_prices(period, day):
+    # `day` solo forma parte de la clave: los datos se renuevan una vez por día hábil
+    metrics.count('sector_prices', 'misses')
+    return load_sector_prices(period)
+
+
+def sector_prices(period='1y'):
+    """
+    Panel de precios cacheado por (período, día hábil); cubre también los horizontes del ranking
+    para que gráfico y ranking salgan de la misma descarga
+    """
+    metrics.count('sector_prices', 'requests')
+    return _cached_sector_prices(fetch_period(period, *RS_HORIZONS.values()), trading_day())
+
+
+def normalize_prices(prices):
+    """Precios base 100 desde el primer valor disponible de cada columna"""
+    return prices / prices.bfill().iloc[0] * 100
+
+
+def sector_relative_strength(period='1y', prices=None):
+    """
+    Ranking de fuerza relativa de los sectores contra el benchmark en varios horizontes
+
+    Args:
+    - period (str): Período del panel cacheado
+    - prices (DataFrame): Panel ya cargado (por defecto sector_prices(period))
+
+    Returns:
+    - DataFrame por sector con el rendimiento en exceso (%) y el puesto de cada horizonte,
+      ordenado por el horizonte más largo
+    """
+    prices = sector_prices(period) if prices is None else prices
+    prices = prices.ffill()
+    end = prices.index[-1]
+    latest = prices.iloc[-1]
+    columns = {}
+    for label, horizon in RS_HORIZONS.items():
+        start = period_start(horizon, end.normalize())
+        if start < prices.index[0]:
+            continue
+        # Último cierre anterior al inicio del horizonte como base
+        base = prices.loc[:start].iloc[-1] if len(prices.loc[:start]) else prices.iloc[0]
+        returns = latest / base - 1
+        excess = (1 + returns) / (1 + returns.get(BENCHMARK_ETF, 0)) - 1
+        columns[label] = excess.drop(BENCHMARK_ETF, errors='ignore') * 100
+    strength = pd.DataFrame(columns)
+    strength.index.name = 'Sector'
+    for label in list(columns):
+        strength[f'{label} rank'] = strength[label].rank(ascending=False, method='min').astype(int)
+    return strength.sort_values(list(columns)[-1], ascending=False) if columns else strength
+
+
+def sector_relative_performance(period='1y', prices=None):
     """
     Genera gráfico de líneas con rendimiento relativo de sectores
     
     Args:
     - period (str): Período de análisis
+    - prices (DataFrame): Panel ya cargado (por defecto sector_prices(period))
     
     Returns:
     - DataFrame con precios normalizados
     - Figura de Plotly
     """
-    sector_etfs = {
-        'Technology': 'XLK',
-        'Financials': 'XLF', 
-        'Energy': 'XLE',
-        'Healthcare': 'XLV',
-        'Industrials': 'XLI',
-        'Materials': 'XLB',
-        'Consumer Discretionary': 'XLY',
-        'Consumer Staples': 'XLP',
-        'Utilities': 'XLU',
-        'Communication Services': 'XLC'
-    }
-    
-    # DataFrame para almacenar precios normalizados
-    normalized_prices = pd.DataFrame()
-    
-    # Descargar y normalizar datos
-    for sector, etf in sector_etfs.items():
-        try:
-            # Descargar datos
-            data = yf.download(etf, period=period)
-            
-            if len(data) > 0:
-                # Normalizar precios (primer precio = 100)
-                normalized_sector = data[('Adj Close', etf)] / data[('Adj Close', etf)].iloc[0] * 100
-                normalized_prices[sector] = normalized_sector
-        
-        except Exception as e:
-            print(f"Error procesando {sector}: {e}")
+    prices = sector_prices(period) if prices is None else prices
+    start = period_start(period, prices.index[-1].normalize())
+    if start is not None:
+        prices = prices.loc[start:]
+    normalized_prices = normalize_prices(prices.drop(columns=BENCHMARK_ETF, errors='ignore'))
     
     # Crear gráfico de líneas con Plotly
     fig = go.Figure()
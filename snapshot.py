@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT = os.path.join(os.environ.get('PEG_DATA_DIR', 'data'), 'snapshots', 'screen')
+
+
+class StaleSnapshotError(ValueError):
+    pass
+
+
+def _hash(values, dates, entries, columns):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(values).tobytes())
+    digest.update(np.ascontiguousarray(dates).tobytes())
+    digest.update(json.dumps([entries, columns], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _pack(cached_data):
+    symbols = list(cached_data)
+    columns = list(cached_data[symbols[0]]['df'].columns) if symbols else []
+    frames = [cached_data[symbol]['df'][columns] for symbol in symbols]
+    values = np.concatenate([df.to_numpy(dtype=float) for df in frames]) if frames else np.empty((0, 0))
+    dates = np.concatenate([df.index.as_unit('ns').asi8 for df in frames]) if frames else np.empty(0, dtype=np.int64)
+    entries, offset = [], 0
+    for symbol, df in zip(symbols, frames):
+        entries.append({'symbol': symbol, 'offset': offset, 'length': len(df),
+                        'start_idx': cached_data[symbol]['start_idx'].isoformat()})
+        offset += len(df)
+    return values, dates, entries, columns
+
+
+def content_hash(cached_data):
+    """Hash del contenido de un dict {symbol: {'df', 'start_idx'}} tal como lo guarda un snapshot"""
+    return _hash(*_pack(cached_data))
+
+
+def write_snapshot(cached_data, path=DEFAULT_SNAPSHOT):
+    """
+    Guarda el resultado del screener (dict {symbol: {'df', 'start_idx'}}) como snapshot versionado
+
+    El directorio contiene values.npy (filas de todos los símbolos concatenadas), dates.npy
+    y manifest.json con los offsets por símbolo y el hash del contenido.
+
+    Returns:
+    - manifest (dict)
+    """
+    values, dates, entries, columns = _pack(cached_data)
+    tz = None
+    if cached_data:
+        tz = str(next(iter(cached_data.values()))['df'].index.tz or '') or None
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'created_at': pd.Timestamp.now(tz='UTC').isoformat(),
+        'as_of': pd.Timestamp(dates.max(), tz='UTC').tz_convert(tz).isoformat() if len(dates) else None,
+        'tz': tz,
+        'columns': columns,
+        'symbols': entries,
+        'content_hash': _hash(values, dates, entries, columns),
+    }
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'values.npy'), values)
+    np.save(os.path.join(path, 'dates.npy'), dates)
+    tmp = os.path.join(path, 'manifest.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    # El manifiesto se escribe al final: sin él el snapshot no se considera completo
+    os.replace(tmp, os.path.join(path, 'manifest.json'))
+    return manifest
+
+
+def read_manifest(path=DEFAULT_SNAPSHOT):
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        raise StaleSnapshotError(f"Unsupported snapshot version {manifest.get('version')} (expected {SNAPSHOT_VERSION})")
+    return manifest
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT, verify=True):
+    """
+    Carga un snapshot con los arrays mapeados en memoria; los DataFrames son vistas sobre ellos
+
+    Args:
+    - path (str): Directorio del snapshot
+    - verify (bool): Recalcular el hash y fallar si no coincide con el manifiesto
+
+    Returns:
+    - (dict {symbol: {'df', 'start_idx'}}, manifest)
+    """
+    manifest = read_manifest(path)
+    values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+    dates = np.load(os.path.join(path, 'dates.npy'), mmap_mode='r')
+    if verify and _hash(values, dates, manifest['symbols'], manifest['columns']) != manifest['content_hash']:
+        raise StaleSnapshotError(f"Snapshot content does not match its hash: {path}")
+
+    data = {}
+    for entry in manifest['symbols']:
+        rows = slice(entry['offset'], entry['offset'] + entry['length'])
+        index = pd.DatetimeIndex(pd.to_datetime(dates[rows], utc=True), name='Date')
+        index = index.tz_convert(manifest['tz']) if manifest['tz'] else index.tz_localize(None)
+        df = pd.DataFrame(values[rows], index=index, columns=manifest['columns'], copy=False)
+        start_idx = pd.Timestamp(entry['start_idx'])
+        start_idx = start_idx.tz_convert(manifest['tz']) if manifest['tz'] else start_idx
+        data[entry['symbol']] = {'df': df, 'start_idx': start_idx}
+    return data, manifest
+
+
+def snapshot_age(manifest, now=None):
+    """Días hábiles entre la última barra del snapshot y hoy"""
+    if manifest['as_of'] is None:
+        return None
+    now = pd.Timestamp.now(tz='UTC') if now is None else now
+    as_of = pd.Timestamp(manifest['as_of'])
+    return len(pd.bdate_range(as_of.tz_convert('UTC').normalize(), now.normalize())) - 1
@@ -3,8 +3,9 @@ import numpy as np
 import mplfinance as mpf
 from ta.momentum import RSIIndicator
 from ta.trend import MACD
-from scipy.signal import argrelextrema
+from patterns import Pattern, PATTERN_CODES, detect_pattern_from, classify, confidence_score as score_confidence
 import streamlit as st
+import instrumentation as metrics
 
 def calculate_rsi(df, window=14):
     rsi_indicator = RSIIndicator(df['Close'], window=window)
@@ -18,110 +19,52 @@ def calculate_macd(df):
     df['histogram'] = macd.macd_diff()
     return df
 
+@metrics.timed('identify_pattern')
 def identify_pattern(df, start_idx, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05):
+    result, n_rows, n_valid = detect_pattern_from(df, start_idx, window, high_slope_threshold, low_slope_threshold)
     # Validación inicial de datos
-    df = df.loc[start_idx:].copy()
-    if len(df) < window * 2:
-        return f'Insufficient data: need at least {window * 2} days, got {len(df)} days', None, None
-    
-    # Limpiar datos faltantes
-    df = df.dropna()
-    
-    # Reducir el window para el smoothing para detectar más puntos
-    smooth_window = max(2, window - 1)  # Reducir el window para el smoothing
-    df['High_smooth'] = df['High'].rolling(window=smooth_window, min_periods=2).mean()
-    df['Low_smooth'] = df['Low'].rolling(window=smooth_window, min_periods=2).mean()
-    
-    # Reducir el orden para encontrar más extremos locales
-    order = max(1, window - 2)  # Reducir el orden para encontrar más puntos extremos
-    high_extrema = argrelextrema(df['High_smooth'].fillna(method='ffill').values, np.greater, order=order)[0]
-    low_extrema = argrelextrema(df['Low_smooth'].fillna(method='ffill').values, np.less, order=order)[0]
-    
-    # Si no hay suficientes puntos, intentar con un orden más pequeño
-    if len(high_extrema) < 2 or len(low_extrema) < 2:
-        order = 1  # Usar el orden mínimo
-        high_extrema = argrelextrema(df['High_smooth'].fillna(method='ffill').values, np.greater, order=order)[0]
-        low_extrema = argrelextrema(df['Low_smooth'].fillna(method='ffill').values, np.less, order=order)[0]
-    
-    # Si aún no hay suficientes puntos, usar los puntos más altos y más bajos
-    if len(high_extrema) < 2 or len(low_extrema) < 2:
-        # Encontrar los puntos más altos y más bajos manualmente
-        high_values = df['High_smooth'].values
-        low_values = df['Low_smooth'].values
-        
-        # Obtener índices de los 2 valores más altos y más bajos
-        high_extrema = np.argsort(high_values)[-2:]
-        low_extrema = np.argsort(low_values)[:2]
-    
-    # Usar los puntos para el análisis
-    high_points = df['High_smooth'].iloc[high_extrema].values
-    low_points = df['Low_smooth'].iloc[low_extrema].values
-    
-    # Calcular y normalizar pendientes
-    price_range = df['High'].max() - df['Low'].min()
-    if price_range == 0:
-        return 'No price variation detected', None, None
-        
-    high_slope = np.polyfit(range(len(high_points)), high_points, 1)[0] / price_range
-    low_slope = np.polyfit(range(len(low_points)), low_points, 1)[0] / price_range
-    
-    # Calcular score de confiabilidad
-    confidence_score = calculate_confidence_score(df, high_slope, low_slope, high_extrema, low_extrema)
-    
-    # Identificar patrón con el score de confiabilidad
-    pattern, confidence = identify_pattern_with_confidence(high_slope, low_slope, high_slope_threshold, confidence_score)
-    
-    return f"{pattern} (Confidence: {confidence:.1f}%)", high_extrema, low_extrema
+    if n_rows < window * 2:
+        return f'Insufficient data: need at least {window * 2} days, got {n_rows} days', None, None
+    return describe_pattern(result, n_valid)
+
+def describe_pattern(result, n_valid):
+    # Texto y extremos de identify_pattern a partir de un PatternResult
+    if result.pattern == Pattern.INSUFFICIENT_DATA:
+        return f'Insufficient data: need at least 3 complete days, got {n_valid} days', None, None
+    if result.pattern == Pattern.NO_VARIATION:
+        return result.pattern.value, None, None
+    
+    return f"{result.pattern.value} (Confidence: {result.confidence:.1f}%)", result.high_extrema, result.low_extrema
+
+def lookup_pattern(grid, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05):
+    """Igual que identify_pattern pero consultando una PatternGrid ya calculada"""
+    if grid.n_rows < window * 2:
+        return f'Insufficient data: need at least {window * 2} days, got {grid.n_rows} days', None, None
+    return describe_pattern(grid.lookup(window, high_slope_threshold, low_slope_threshold), grid.n_valid)
 
 def calculate_confidence_score(df, high_slope, low_slope, high_extrema, low_extrema):
-    # Calcular score basado en varios factores
-    score = 100.0
-    
-    # Factor 1: Consistencia de los puntos
-    if len(high_extrema) < 4 or len(low_extrema) < 4:
-        score *= 0.8
-    
-    # Factor 2: Volatilidad
-    volatility = df['Close'].pct_change().std()
-    if volatility > 0.02:  # Alta volatilidad
-        score *= 0.9
-    
-    # Factor 3: Volumen
-    avg_volume = df['Volume'].mean()
-    recent_volume = df['Volume'].iloc[-5:].mean()
-    if recent_volume < avg_volume * 0.7:
-        score *= 0.85
-    
-    return max(min(score, 100), 0)  # Asegurar que está entre 0 y 100
+    return score_confidence(df['Close'].to_numpy(dtype=float), df['Volume'].to_numpy(dtype=float),
+                            len(high_extrema), len(low_extrema))
 
 def identify_pattern_with_confidence(high_slope, low_slope, threshold, confidence_score):
-    base_confidence = confidence_score
-    
-    if abs(high_slope) < threshold and abs(low_slope) < threshold:
-        return 'Rectangle/Consolidation', base_confidence * 0.9
-    elif high_slope > threshold and low_slope < threshold:
-        return 'Ascending Triangle', base_confidence
-    elif high_slope < -threshold and low_slope > -threshold:
-        return 'Descending Triangle', base_confidence
-    elif high_slope < -threshold and low_slope < -threshold:
-        pattern = 'Falling Wedge' if abs(high_slope) > abs(low_slope) else 'Descending Channel'
-        return pattern, base_confidence * 0.95
-    elif high_slope > threshold and low_slope > threshold:
-        pattern = 'Rising Wedge' if high_slope > low_slope else 'Ascending Channel'
-        return pattern, base_confidence * 0.95
-    else:
-        return 'No clear pattern', base_confidence * 0.5
+    code, factor = classify(high_slope, low_slope, threshold)
+    return PATTERN_CODES[int(code)].value, confidence_score * float(factor)
 
-def create_chart(df, symbol, start_idx):
+@metrics.timed('create_chart')
+def create_chart(df, symbol, start_idx, window=None, high_slope_threshold=None, low_slope_threshold=None):
     # Calcular indicadores antes de usarlos
     #df = calculate_rsi(df)
-    df = calculate_macd(df)
+    if 'histogram' not in df:
+        df = calculate_macd(df)
     # df['ma_20'] = df['Close'].rolling(window=20).mean()
     
-    # Obtener los parámetros actuales de la sesión de Streamlit
-    window = st.session_state.get('window', 3)
-    high_slope_threshold = st.session_state.get('high_slope_threshold', 0.003)
-    low_slope_threshold = st.session_state.get('low_slope_threshold', 0.003)
+    # Sin parámetros explícitos, usar los actuales de la sesión de Streamlit
+    if window is None:
+        window = st.session_state.get('window', 3)
+    if high_slope_threshold is None:
+        high_slope_threshold = st.session_state.get('high_slope_threshold', 0.003)
+    if low_slope_threshold is None:
+        low_slope_threshold = st.session_state.get('low_slope_threshold', 0.003)
     
     # Usar los mismos parámetros que en analyze_stock
     pattern, high_extrema, low_extrema = identify_pattern(
@@ -184,8 +127,9 @@ def create_chart(df, symbol, start_idx):
     
     return fig, axes
 
-def analyze_stock(df, start_idx, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05):
-    # Validar datos de entrada
+@metrics.timed('analyze_stock')
+def analyze_stock(df, start_idx, window=3, high_slope_threshold=0.05, low_slope_threshold=0.05, grid=None):
+    # Validar datos de entrada (con `grid`, una PatternGrid del símbolo, el patrón es una consulta)
     if df.empty:
         return df, "Error: Empty dataset"
     
@@ -197,7 +141,11 @@ def analyze_stock(df, start_idx, window=3, high_slope_threshold=0.05, low_slope_
         return df, f"Error: Need at least {min_required_days} days of data after gap up"
     
     #df = calculate_rsi(df)
-    df = calculate_macd(df)
-    pattern, _, _ = identify_pattern(df, start_idx, window, high_slope_threshold, low_slope_threshold)
+    if 'histogram' not in df:
+        df = calculate_macd(df)
+    if grid is not None:
+        pattern, _, _ = lookup_pattern(grid, window, high_slope_threshold, low_slope_threshold)
+    else:
+        pattern, _, _ = identify_pattern(df, start_idx, window, high_slope_threshold, low_slope_threshold)
     
     return df, pattern
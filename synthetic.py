@@ -0,0 +1,158 @@
+import zlib
+import numpy as np
+import pandas as pd
+from patterns import Pattern
+
+# Pendiente por barra (fracción del precio) de las líneas superior e inferior de cada formación
+PATTERN_SHAPES = {
+    Pattern.RECTANGLE: (0.0, 0.0),
+    Pattern.ASCENDING_TRIANGLE: (0.0, 1.0),
+    Pattern.DESCENDING_TRIANGLE: (-1.0, 0.0),
+    Pattern.RISING_WEDGE: (1.0, 2.0),
+    Pattern.FALLING_WEDGE: (-2.0, -1.0),
+    Pattern.ASCENDING_CHANNEL: (1.0, 1.0),
+    Pattern.DESCENDING_CHANNEL: (-1.0, -1.0),
+}
+SLOPE = 0.004
+CHANNEL_WIDTH = 0.06
+
+
+def symbol_rng(symbol, seed=0, stream=None):
+    # Semilla por símbolo: la misma serie sin importar el orden ni el resto del universo
+    key = [zlib.crc32(symbol.encode()), seed] + ([stream] if stream is not None else [])
+    return np.random.default_rng(key)
+
+
+def random_walk(n, rng, start=50.0):
+    """
+    OHLCV de un paseo aleatorio log-normal
+
+    Returns:
+    - dict de arrays 'Open', 'High', 'Low', 'Close', 'Volume'
+    """
+    returns = rng.normal(0.0005, 0.02, n)
+    close = start * np.exp(np.cumsum(returns))
+    open_ = close * (1 + rng.normal(0, 0.005, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volume = rng.integers(300_000, 5_000_000, n)
+    return {'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}
+
+
+def plan(symbol, seed=0, gap_rate=0.2):
+    """
+    Qué se inyecta en la serie de un símbolo (determinista)
+
+    Returns:
+    - None si es un paseo aleatorio puro, o dict con 'offset' (barras del gap antes del
+      final), 'gap_size' y 'pattern' (Pattern de la consolidación posterior)
+    """
+    rng = symbol_rng(symbol, seed, 2)
+    if rng.random() >= gap_rate:
+        return None
+    return {'offset': int(rng.integers(8, 21)),
+            'gap_size': float(rng.uniform(0.05, 0.12)),
+            'pattern': list(PATTERN_SHAPES)[rng.integers(len(PATTERN_SHAPES))]}
+
+
+def inject_gap(ohlcv, position, size, rng):
+    """Salto de `size` en el cierre de `position`, con pico de volumen; el resto de la serie se desplaza"""
+    close = ohlcv['Close']
+    ratio = close[position - 1] * (1 + size) / close[position]
+    for column in ('Open', 'High', 'Low', 'Close'):
+        ohlcv[column][position:] *= ratio
+    ohlcv['Open'][position] = close[position - 1] * (1 + size * rng.uniform(0.5, 1.0))
+    ohlcv['High'][position] = max(ohlcv['High'][position], ohlcv['Open'][position], close[position])
+    ohlcv['Volume'][position] *= 3
+
+
+def inject_pattern(ohlcv, start, pattern, rng):
+    """Reemplaza las barras desde `start` por una formación que oscila entre dos rectas"""
+    n = len(ohlcv['Close']) - start
+    if n <= 0:
+        return
+    upper_slope, lower_slope = PATTERN_SHAPES[pattern]
+    base = ohlcv['Close'][start - 1]
+    t = np.arange(1, n + 1)
+    upper = base * (1 + CHANNEL_WIDTH / 2 + upper_slope * SLOPE * t)
+    lower = base * (1 - CHANNEL_WIDTH / 2 + lower_slope * SLOPE * t)
+    # Las rectas convergentes no deben cruzarse dentro de la formación
+    lower = np.minimum(lower, upper * 0.99)
+    period = rng.uniform(6, 10)
+    phase = rng.uniform(0, 2 * np.pi)
+    position = 0.5 + 0.45 * np.sin(2 * np.pi * t / period + phase)
+    close = lower + (upper - lower) * position * (1 + rng.normal(0, 0.002, n))
+    open_ = np.concatenate([[base], close[:-1]])
+    ohlcv['Close'][start:] = close
+    ohlcv['Open'][start:] = open_
+    ohlcv['High'][start:] = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.004, n)))
+    ohlcv['Low'][start:] = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.004, n)))
+
+
+def generate_ohlcv(symbol, index, seed=0, gap_rate=0.2, anchor=None):
+    """
+    Serie OHLCV sintética y determinista para un símbolo
+
+    Paseo aleatorio al que, para una fracción `gap_rate` de los símbolos, se le inyecta un
+    gap reciente seguido de una formación (rectángulo, triángulo, cuña o canal).
+
+    Args:
+    - symbol (str): Símbolo (define la semilla junto con `seed`)
+    - index (DatetimeIndex): Fechas de la serie
+    - seed (int): Semilla global
+    - gap_rate (float): Fracción de símbolos con gap y formación
+    - anchor (int): Posición que cuenta como "hoy" para ubicar el gap (por defecto el final
+      de `index`); la formación sigue en las barras posteriores
+
+    Returns:
+    - DataFrame OHLCV con `index`
+    """
+    rng = symbol_rng(symbol, seed)
+    ohlcv = random_walk(len(index), rng)
+    anchor = len(index) if anchor is None else anchor
+    setup = plan(symbol, seed, gap_rate)
+    if setup is not None and setup['offset'] < anchor:
+        position = anchor - setup['offset']
+        inject_gap(ohlcv, position, setup['gap_size'], rng)
+        inject_pattern(ohlcv, position + 1, setup['pattern'], rng)
+    return pd.DataFrame(ohlcv, index=index)
+
+
+def intraday_quotes(frames, session, quotes_per_symbol=200, seed=0, start='08:00', end='10:30'):
+    """
+    Cotizaciones sintéticas de una sesión para reproducir con intraday.ReplaySource
+
+    Cada símbolo va del cierre anterior a la apertura de `session` durante el pre-market y
+    sigue un paseo aleatorio desde la apertura (09:30); los horarios son aleatorios.
+
+    Args:
+    - frames (dict): {symbol: DataFrame diario que incluye la sesión y la anterior}
+    - session (date): Día de las cotizaciones
+
+    Returns:
+    - DataFrame con columnas timestamp, symbol, price, volume ordenado por timestamp
+    """
+    session = pd.Timestamp(session).tz_localize('America/New_York')
+    first, last, opening = (session + pd.Timedelta(f'{t}:00') for t in (start, end, '09:30'))
+    parts = []
+    for symbol, df in frames.items():
+        dates = df.index.normalize()
+        if session not in dates or (dates < session).sum() == 0:
+            continue
+        rng = symbol_rng(symbol, seed, 3)
+        prior_close = df['Close'][dates < session].iloc[-1]
+        open_price = df['Open'][dates == session].iloc[0]
+        times = np.sort(rng.integers(first.value, last.value, quotes_per_symbol))
+        pre = times < opening.value
+        # Pre-market: del cierre anterior hacia la apertura; sesión: paseo desde la apertura
+        progress = np.cumsum(pre) / max(pre.sum(), 1)
+        price = np.where(pre, prior_close + (open_price - prior_close) * progress,
+                         open_price * np.exp(np.cumsum(np.where(pre, 0, rng.normal(0, 0.001, len(times))))))
+        price = price * (1 + np.where(pre, rng.normal(0, 0.002, len(times)), 0))
+        if not pre.all():
+            price[np.argmin(pre)] = open_price
+        parts.append(pd.DataFrame({'timestamp': times, 'symbol': symbol, 'price': price,
+                                   'volume': rng.integers(100, 5000, len(times))}))
+    quotes = pd.concat(parts, ignore_index=True).sort_values('timestamp', kind='stable', ignore_index=True)
+    quotes['timestamp'] = pd.to_datetime(quotes['timestamp'], utc=True).dt.tz_convert('America/New_York')
+    return quotes
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Los módulos del proyecto están en la raíz del repo (sin paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_providers import MARKET_TZ, FakeProvider
+
+SYMBOLS = [f"SYM{i}" for i in range(12)]
+END = pd.Timestamp('2024-06-28', tz=MARKET_TZ)
+
+
+@pytest.fixture
+def provider():
+    """Datos sintéticos deterministas, con gaps en todos los símbolos"""
+    return FakeProvider(end=END, years=2, gap_rate=1.0)
+
+
+@pytest.fixture
+def frames(provider):
+    return provider.download(SYMBOLS, period='1y')
@@ -0,0 +1,16 @@
+import datetime
+
+import fundamentals
+from fundamentals import TokenBucket, clear_info_cache, get_info
+
+
+def test_info_cache_expires_with_the_trading_day(provider, monkeypatch):
+    clear_info_cache()
+    limiter = TokenBucket(rate=1e9, capacity=1e9)
+    monkeypatch.setattr(fundamentals, 'trading_day', lambda: datetime.date(2024, 6, 27))
+    get_info('SYM0', provider, rate_limiter=limiter)
+    get_info('SYM0', provider, rate_limiter=limiter)
+    assert provider.calls == 1
+    monkeypatch.setattr(fundamentals, 'trading_day', lambda: datetime.date(2024, 6, 28))
+    get_info('SYM0', provider, rate_limiter=limiter)
+    assert provider.calls == 2
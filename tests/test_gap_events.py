@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from conftest import SYMBOLS
+from data_processing import scan_gaps
+from gap_events import GapIndex
+from price_store import PriceStore
+
+
+def panel(frames, column):
+    return pd.DataFrame({symbol: df[column] for symbol, df in frames.items()})
+
+
+@pytest.mark.parametrize('gap_percent', [3, 5, 8])
+@pytest.mark.parametrize('months', [None, 1])
+def test_last_gaps_matches_scan_gaps(frames, gap_percent, months):
+    closes, volumes = panel(frames, 'Close'), panel(frames, 'Volume')
+    since = None if months is None else closes.index[-1] - pd.DateOffset(months=months)
+    recent = closes.index if since is None else closes.index >= since
+    expected = scan_gaps(closes.pct_change().loc[recent], volumes.loc[recent], gap_percent, min_avg_volume=0,
+                         from_returns=True)
+    last_gaps = GapIndex.from_frames(frames).last_gaps(gap_percent, since=since)
+    pd.testing.assert_series_equal(last_gaps.sort_index(), expected.sort_index(), check_names=False,
+                                   check_index_type=False)
+
+
+def test_held_matches_brute_force(frames):
+    events = GapIndex.from_frames(frames).query(3, direction=None)
+    assert len(events)
+    for event in events.itertuples():
+        after = frames[event.symbol]['Close'].loc[event.date:]
+        filled = after <= event.prior_close if event.direction == 'up' else after >= event.prior_close
+        assert event.held == (not filled.any())
+        if not event.held:
+            assert event.filled_date == filled.idxmax()
+
+
+def test_store_index_matches_frames(provider, tmp_path):
+    store = PriceStore(provider, root=str(tmp_path), refresh_interval=0)
+    store.download(SYMBOLS, start=provider.end - pd.DateOffset(years=1))
+    stored = GapIndex.from_store(store, SYMBOLS).events.sort_values(['symbol', 'date'], ignore_index=True)
+    expected = GapIndex.from_frames({symbol: store.read(symbol) for symbol in SYMBOLS}).events
+    assert len(expected)
+    pd.testing.assert_frame_equal(stored, expected, check_dtype=False)
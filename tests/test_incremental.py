@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import SYMBOLS
+from incremental import HistoryTracker, IndicatorState, PatternTracker
+from indicators import INDICATOR_COLUMNS, IndicatorPanel, compute_indicators
+from patterns import DEFAULT_PARAMS, Pattern, detect_pattern
+
+
+def reference_pattern(df, start_idx):
+    # Lo que hace identify_pattern: filas desde el gap, sin las que tienen algún NaN
+    window = df.loc[start_idx:]
+    if len(window) < DEFAULT_PARAMS['window'] * 2:
+        return Pattern.INSUFFICIENT_DATA, 0.0
+    window = window.dropna()
+    result = detect_pattern(*(window[column].to_numpy(dtype=float) for column in ('High', 'Low', 'Close', 'Volume')),
+                            **DEFAULT_PARAMS)
+    return result.pattern, result.confidence
+
+
+def test_indicator_state_matches_compute_indicators(frames):
+    closes = pd.DataFrame({symbol: df['Close'] for symbol, df in frames.items()})
+    volumes = pd.DataFrame({symbol: df['Volume'] for symbol, df in frames.items()})
+    expected = compute_indicators(closes, volumes)
+    _, history = IndicatorState.from_history(closes.to_numpy(), volumes.to_numpy())
+    for column in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(history[column], expected[column].to_numpy(), rtol=1e-9, equal_nan=True,
+                                   err_msg=column)
+
+
+@pytest.mark.parametrize('offset', [5, 20, 60])
+def test_pattern_tracker_matches_detect_pattern(frames, offset):
+    for df in frames.values():
+        start_idx = df.index[-offset]
+        tracker = PatternTracker.from_frame(df, start_idx, **DEFAULT_PARAMS)
+        pattern, confidence = reference_pattern(df, start_idx)
+        result = tracker.result()
+        assert result.pattern == pattern
+        assert result.confidence == pytest.approx(confidence)
+
+
+def test_history_tracker_extends_like_a_rebuild(provider):
+    tracker = HistoryTracker()
+    start = provider.end - pd.DateOffset(months=6)
+    # Gap fijo: el patrón de cada símbolo se extiende barra a barra en vez de recalcularse
+    start_idx = provider.end - pd.offsets.BDay(15)
+    for day in range(5):
+        frames = provider.download(SYMBOLS, start=start)
+        if day == 3:
+            # Precios reajustados: la última barra ya vista cambia y el símbolo se reconstruye
+            frames['SYM0'] = frames['SYM0'] * 0.5
+        result = tracker.update(frames)
+        panel = IndicatorPanel.from_frames(frames)
+        for symbol in SYMBOLS:
+            expected = panel.frame(symbol)
+            np.testing.assert_allclose(result[symbol].to_numpy(), expected.to_numpy(), rtol=1e-9, equal_nan=True)
+            assert tracker.pattern(symbol, start_idx).pattern == reference_pattern(expected, start_idx)[0]
+        provider.end += pd.offsets.BDay(1)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processing import add_indicators
+from indicators import INDICATOR_COLUMNS, PANEL_COLUMNS, CompactPanel, IndicatorPanel
+from stock_analisys import calculate_macd
+
+
+def reference_indicators(df):
+    # Cálculo original símbolo por símbolo con ta
+    return calculate_macd(add_indicators(df.copy()))
+
+
+def test_panel_matches_ta(frames):
+    # Distintos inicios para que el panel tenga que alinear fechas
+    frames = {symbol: df.iloc[7 * k:] for k, (symbol, df) in enumerate(frames.items())}
+    panel = IndicatorPanel.from_frames(frames)
+    for symbol, df in frames.items():
+        fast = panel.frame(symbol)
+        expected = reference_indicators(df)
+        assert fast.index.equals(expected.index)
+        for column in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(fast[column], expected[column], rtol=1e-9, equal_nan=True, err_msg=column)
+
+
+def test_panel_frames_are_read_only(frames):
+    panel = IndicatorPanel.from_frames(frames)
+    df = panel.frame('SYM0')
+    with pytest.raises(ValueError):
+        df.iloc[0, 0] = 0.0
+    # Columnas nuevas o reemplazadas no tocan el panel
+    close = panel.values[0, :, PANEL_COLUMNS.index('Close')].copy()
+    df['Close'] = df['Close'] * 2
+    df['flag'] = True
+    np.testing.assert_array_equal(panel.values[0, :, PANEL_COLUMNS.index('Close')], close)
+
+
+def test_compact_panel_round_trip(frames):
+    panel = IndicatorPanel.from_frames(frames)
+    screened = {symbol: {'df': panel.frame(symbol), 'start_idx': panel.index[-10]} for symbol in panel.symbols}
+    compact = CompactPanel.from_screen(screened)
+    for symbol, entry in screened.items():
+        df = compact.frame(symbol)
+        expected = entry['df'].dropna(subset=['Close'])
+        pd.testing.assert_frame_equal(df, expected, check_dtype=False, check_freq=False, rtol=1e-6)
+        assert compact.start_idx(symbol) == entry['start_idx']
+        with pytest.raises(ValueError):
+            df.iloc[0, 0] = 0.0
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from data_providers import FakeProvider
+from main import build_results, main, run_screen
+from patterns import DEFAULT_PARAMS
+from stock_analisys import identify_pattern
+
+SYMBOLS = [f"SYM{i}" for i in range(40)]
+
+
+@pytest.fixture
+def screened():
+    # El screener escanea el último mes desde hoy: el proveedor tiene que terminar hoy
+    screened, error = run_screen(SYMBOLS, market_cap_min=0, provider=FakeProvider(gap_rate=1.0))
+    assert error is None and screened
+    return screened
+
+
+def test_offline_run_writes_results(tmp_path):
+    output = tmp_path / 'results.csv'
+    assert main(['--provider', 'fake', '--store', str(tmp_path / 'store'), '--symbols', *SYMBOLS,
+                 '--market-cap-min', '0', '-o', str(output)]) == 0
+    results = pd.read_csv(output)
+    assert len(results) > 0
+    assert results['setup_score'].is_monotonic_decreasing
+
+
+def test_build_results_matches_identify_pattern(screened):
+    results, errors = build_results(screened)
+    assert not errors
+    for row in results.itertuples():
+        entry = screened[row.symbol]
+        text, _, _ = identify_pattern(entry['df'], entry['start_idx'], **DEFAULT_PARAMS)
+        assert text.startswith(row.pattern.split(':')[0])
+
+
+def test_malformed_frame_keeps_the_other_results(screened):
+    broken = next(iter(screened))
+    screened[broken] = {'df': screened[broken]['df'].drop(columns='Low'),
+                        'start_idx': screened[broken]['start_idx']}
+    results, errors = build_results(screened)
+    assert set(errors) == {broken}
+    assert set(results['symbol']) == set(screened) - {broken}
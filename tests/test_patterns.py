@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from incremental import PatternTracker
+from indicators import IndicatorPanel
+from patterns import PatternGrid, detect_pattern_from, pattern_inputs
+from stock_analisys import identify_pattern
+from validation import prepare_series
+
+
+@pytest.fixture
+def gapped(frames):
+    # Frames con indicadores (NaN al principio) y algunas filas sin cotización cerca del final
+    panel = IndicatorPanel.from_frames(frames)
+    data = {}
+    for k, symbol in enumerate(panel.symbols):
+        df = panel.frame(symbol).copy()
+        df.iloc[-(k % 4 + 2), 0] = np.nan
+        data[symbol] = {'df': df, 'start_idx': df.index[-(5 + 7 * k)]}
+    return data
+
+
+def test_pattern_inputs_drops_incomplete_rows(gapped):
+    for entry in gapped.values():
+        n_rows, high, low, close, volume = pattern_inputs(entry['df'], entry['start_idx'])
+        window = entry['df'].loc[entry['start_idx']:].dropna()
+        assert n_rows == len(entry['df'].loc[entry['start_idx']:])
+        np.testing.assert_array_equal(close, window['Close'].to_numpy())
+    assert [series[0] for series in prepare_series(gapped)] == \
+        [pattern_inputs(e['df'], e['start_idx'])[0] for e in gapped.values()]
+
+
+@pytest.mark.parametrize('window, threshold', [(3, 0.1), (4, 0.05), (6, 0.3)])
+def test_pattern_paths_agree(gapped, window, threshold):
+    params = {'window': window, 'high_slope_threshold': threshold, 'low_slope_threshold': threshold}
+    for entry in gapped.values():
+        df, start_idx = entry['df'], entry['start_idx']
+        expected, n_rows, _ = detect_pattern_from(df, start_idx, **params)
+        grid = PatternGrid.from_frame(df, start_idx).lookup(window, threshold, threshold)
+        tracked = PatternTracker.from_frame(df, start_idx, **params).result()
+        for result in (grid, tracked):
+            assert result.pattern == expected.pattern
+            assert result.confidence == pytest.approx(expected.confidence)
+        text, _, _ = identify_pattern(df, start_idx, **params)
+        assert text.startswith(expected.pattern.value) or n_rows < window * 2
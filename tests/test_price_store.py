@@ -0,0 +1,37 @@
+import pandas as pd
+
+from conftest import SYMBOLS
+from price_store import PriceStore
+
+
+class MissingColumnProvider:
+    """FakeProvider que devuelve un símbolo sin la columna Volume"""
+
+    def __init__(self, provider, broken):
+        self.provider = provider
+        self.broken = broken
+
+    def download(self, symbols, period='ytd', start=None):
+        frames = self.provider.download(symbols, period=period, start=start)
+        if self.broken in frames:
+            frames[self.broken] = frames[self.broken].drop(columns='Volume')
+        return frames
+
+
+def test_incomplete_frames_are_skipped(provider, tmp_path):
+    start = provider.end - pd.DateOffset(months=6)
+    store = PriceStore(MissingColumnProvider(provider, 'SYM1'), root=str(tmp_path), refresh_interval=0)
+    frames = store.download(SYMBOLS, start=start)
+    assert 'SYM1' not in frames and store.read('SYM1') is None
+    assert set(frames) == set(SYMBOLS) - {'SYM1'}
+
+
+def test_warm_refresh_keeps_stored_history_on_incomplete_frames(provider, tmp_path):
+    start = provider.end - pd.DateOffset(months=6)
+    store = PriceStore(provider, root=str(tmp_path), refresh_interval=0)
+    before = store.download(SYMBOLS, start=start)
+    provider.end += pd.offsets.BDay(1)
+    store.provider = MissingColumnProvider(provider, 'SYM1')
+    after = store.download(SYMBOLS, start=start)
+    pd.testing.assert_frame_equal(after['SYM1'], before['SYM1'], check_freq=False)
+    assert len(after['SYM0']) == len(before['SYM0']) + 1
@@ -0,0 +1,21 @@
+import json
+
+from universes import get_universe, list_universes, load_config
+
+
+def test_csv_universes_resolve_next_to_the_config(tmp_path, monkeypatch):
+    config = {
+        'listed': {'source': 'csv', 'path': 'listed.csv', 'column': 'Symbol'},
+        'missing': {'source': 'csv', 'path': 'missing.csv', 'column': 'Symbol'},
+    }
+    path = tmp_path / 'universes.json'
+    path.write_text(json.dumps(config))
+    (tmp_path / 'listed.csv').write_text('Symbol\nbrk.b\nAAPL\nAAPL\n')
+    monkeypatch.chdir('/')
+    assert list_universes(str(path)) == ['listed']
+    assert get_universe('listed', config=load_config(str(path))) == ['BRK-B', 'AAPL']
+
+
+def test_shipped_universes_resolve():
+    assert 'watchlist' in list_universes()
+    assert len(get_universe('watchlist')) > 0
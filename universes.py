@@ -0,0 +1,139 @@
+import os
+import json
+import threading
+import time
+import pandas as pd
+
+UNIVERSES_FILE = os.environ.get('PEG_UNIVERSES', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               'universes.json'))
+UNIVERSE_CACHE_DIR = os.path.join(os.environ.get('PEG_DATA_DIR', 'data'), 'universes')
+DEFAULT_UNIVERSE = 'sp500'
+DEFAULT_TTL_HOURS = 24 * 7
+
+_refreshing = set()
+_lock = threading.Lock()
+
+
+def load_config(path=None):
+    """
+    Registro de universos: {nombre: {'source', 'column', 'url' | 'path', 'ttl_hours', ...}}
+
+    Agregar un universo es agregar una entrada al archivo (o apuntar PEG_UNIVERSES a otro).
+    Los 'path' relativos se resuelven contra el directorio del archivo.
+    """
+    path = path or UNIVERSES_FILE
+    with open(path) as f:
+        config = json.load(f)
+    for spec in config.values():
+        if 'path' in spec:
+            spec['path'] = os.path.join(os.path.dirname(os.path.abspath(path)), spec['path'])
+    return config
+
+
+def list_universes(path=None):
+    # Solo los que se pueden resolver: un universo CSV sin su archivo no se ofrece
+    return [name for name, spec in load_config(path).items()
+            if spec['source'] != 'csv' or os.path.exists(spec['path'])]
+
+
+def normalize_symbols(symbols):
+    # Yahoo usa '-' para las clases de acciones (BRK.B -> BRK-B); sin duplicados ni vacíos
+    symbols = (str(symbol).strip().upper().replace('.', '-') for symbol in symbols)
+    return list(dict.fromkeys(symbol for symbol in symbols if symbol and symbol != 'NAN'))
+
+
+def fetch_universe(spec):
+    """Descarga la lista de símbolos de un universo desde su fuente (sin caché)"""
+    if spec['source'] == 'wikipedia':
+        # La tabla de componentes es la primera que tiene la columna pedida
+        for table in pd.read_html(spec['url'], header=0):
+            if spec['column'] in table:
+                return normalize_symbols(table[spec['column']])
+        raise ValueError(f"No table with column {spec['column']!r} at {spec['url']}")
+    if spec['source'] == 'csv':
+        return normalize_symbols(pd.read_csv(spec['path'])[spec.get('column', 'Symbol')])
+    raise ValueError(f"Unknown universe source: {spec['source']}")
+
+
+def _cache_path(name, cache_dir=None):
+    return os.path.join(cache_dir or UNIVERSE_CACHE_DIR, f'{name}.json')
+
+
+def read_cached(name, cache_dir=None):
+    try:
+        with open(_cache_path(name, cache_dir)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def refresh_universe(name, spec, cache_dir=None):
+    """Descarga el universo y lo guarda en la caché local (escritura atómica)"""
+    symbols = fetch_universe(spec)
+    path = _cache_path(name, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'name': name, 'fetched_at': time.time(), 'symbols': symbols}, f)
+    os.replace(tmp, path)
+    return symbols
+
+
+def _refresh_in_background(name, spec, cache_dir):
+    with _lock:
+        if name in _refreshing:
+            return
+        _refreshing.add(name)
+
+    def run():
+        try:
+            refresh_universe(name, spec, cache_dir)
+        except Exception as e:
+            print(f"Error refreshing universe {name}: {e}")
+        finally:
+            with _lock:
+                _refreshing.discard(name)
+
+    threading.Thread(target=run, name=f'universe-{name}', daemon=True).start()
+
+
+def get_universe(name=DEFAULT_UNIVERSE, refresh=False, config=None, cache_dir=None):
+    """
+    Símbolos de un universo desde la caché local
+
+    Si la caché venció se devuelve igual y se renueva en segundo plano; solo se bloquea
+    cuando no hay caché (o refresh=True). Sin red se usa la última lista guardada.
+
+    Args:
+    - name (str): Nombre en el registro (ver list_universes)
+    - refresh (bool): Forzar la descarga
+    - config (dict): Registro ya cargado (por defecto load_config())
+    - cache_dir (str): Directorio de la caché
+
+    Returns:
+    - lista de símbolos
+    """
+    config = load_config() if config is None else config
+    if name not in config:
+        raise KeyError(f"Unknown universe {name!r}, available: {', '.join(config)}")
+    spec = config[name]
+    if spec['source'] == 'csv':
+        # Archivo local: se lee siempre, no hace falta caché
+        return fetch_universe(spec)
+    cached = None if refresh else read_cached(name, cache_dir)
+
+    if cached is None:
+        try:
+            return refresh_universe(name, spec, cache_dir)
+        except Exception:
+            # Sin red: mejor una lista vieja que ninguna
+            cached = read_cached(name, cache_dir)
+            if cached is None:
+                raise
+            print(f"Using cached {name} universe, refresh failed")
+            return cached['symbols']
+
+    ttl = spec.get('ttl_hours', DEFAULT_TTL_HOURS) * 3600
+    if time.time() - cached['fetched_at'] > ttl:
+        _refresh_in_background(name, spec, cache_dir)
+    return cached['symbols']
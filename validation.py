@@ -1,16 +1,17 @@
-from skopt import gp_minimize
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from skopt import Optimizer
 from skopt.space import Integer, Real
-from skopt.utils import use_named_args
 from stock_analisys import identify_pattern
 from data_processing import process_and_cache_data
+from snapshot import DEFAULT_SNAPSHOT, StaleSnapshotError, load_snapshot, snapshot_age, write_snapshot
+from patterns import Pattern, PATTERN_CODES, classify, pattern_inputs, series_features
+from backtest import HORIZONS, Backtest, load_history
+from universes import DEFAULT_UNIVERSE, get_universe
 from tqdm import tqdm
 
-data_list = list(process_and_cache_data())
-data = data_list[-1][1]
-
-# Lista de tickers
-tickers = list(data.keys())
-
 # Espacio de búsqueda para los parámetros
 search_space = [
     Integer(3, 20, name='window'),  # Tamaño de la ventana de rolling mean
@@ -18,71 +19,231 @@ search_space = [
     Real(0.01, 0.1, name='low_slope_threshold')   # Umbral pendiente baja
 ]
 
-# Define la función objetivo para optimizar
-@use_named_args(search_space)
-def objective(**params):
-    window = params['window']
-    high_slope_threshold = params['high_slope_threshold']
-    low_slope_threshold = params['low_slope_threshold']
-    
-    # Puntaje acumulado en todas las acciones
-    total_score = 0
-    count = 0
-
-    for ticker in tickers:
-        df = data[ticker]['df']
-        start_idx = data[ticker]['start_idx']
+# Puntuación de cada patrón (el resto de resultados, p.ej. sin variación de precio, vale 0.2)
+PATTERN_SCORES = {
+    Pattern.NO_PATTERN: 0,  # Penaliza la ausencia de patrones detectados
+    Pattern.INSUFFICIENT_DATA: 0,  # Un window demasiado largo para los datos no debe sumar
+    Pattern.RECTANGLE: 0.5,
+    Pattern.ASCENDING_TRIANGLE: 0.5,
+    Pattern.DESCENDING_TRIANGLE: 0.5,
+    Pattern.RISING_WEDGE: 0.8,
+    Pattern.FALLING_WEDGE: 0.8,
+    Pattern.ASCENDING_CHANNEL: 1.0,
+    Pattern.DESCENDING_CHANNEL: 1.0,
+}
+CODE_SCORES = np.array([PATTERN_SCORES[pattern] for pattern in PATTERN_CODES])
+INSUFFICIENT_SCORE = PATTERN_SCORES[Pattern.INSUFFICIENT_DATA]
+OTHER_SCORE = 0.2
+
+# Decimales con los que se redondean los umbrales para reutilizar evaluaciones casi idénticas
+THRESHOLD_DECIMALS = 4
+
+
+def load_screen_data(path=DEFAULT_SNAPSHOT, refresh=False, max_age=5):
+    """
+    Carga el resultado del screener desde un snapshot; si no existe (o refresh=True)
+    ejecuta el screener y guarda uno nuevo
+
+    Returns:
+    - dict {symbol: {'df', 'start_idx'}}
+    """
+    if not refresh:
+        try:
+            data, manifest = load_snapshot(path)
+            age = snapshot_age(manifest)
+            print(f"Snapshot {path}: {len(data)} stocks, as of {manifest['as_of']}, "
+                  f"hash {manifest['content_hash'][:12]}")
+            if age is not None and age > max_age:
+                print(f"Warning: snapshot is {age} business days old, run with --refresh to rebuild it")
+            return data
+        except FileNotFoundError:
+            print(f"No snapshot at {path}, running the screener")
+        except StaleSnapshotError as e:
+            print(f"{e}, running the screener")
+
+    # Solo se acumulan los símbolos nuevos de cada paso, no los pasos intermedios
+    data = {}
+    for _, _, delta in process_and_cache_data():
+        if delta:
+            data.update(delta)
+    manifest = write_snapshot(data, path)
+    print(f"Snapshot written to {path} ({len(data)} stocks, hash {manifest['content_hash'][:12]})")
+    return data
+
+
+def prepare_series(data):
+    """
+    Recorta cada serie desde el gap y descarta filas con NaN una sola vez
+
+    Returns:
+    - lista de (filas antes de limpiar, high, low, close, volume)
+    """
+    return [pattern_inputs(data[ticker]['df'], data[ticker]['start_idx']) for ticker in data]
+
+
+_series = None
+
+
+def _init_worker(series):
+    global _series
+    _series = series
+
+
+def insufficient_data(series, window):
+    # Series en las que identify_pattern devuelve datos insuficientes para este window
+    return np.array([n_rows < window * 2 or len(high) < 3 for n_rows, high, *_ in series], dtype=bool)
+
+
+def window_features(window, series=None):
+    # En los workers del pool las series llegan por el initializer
+    return series_features(_series if series is None else series, window)
+
+
+class ObjectiveEvaluator:
+    """
+    Evalúa la función objetivo con caché por window y por punto
+
+    Lo caro (suavizado, extremos y pendientes) se calcula una vez por `window` y
+    ticker, repartido en un pool de procesos; cada punto del espacio de búsqueda solo
+    clasifica esas pendientes con sus umbrales.
+    """
 
-        # Llama a tu función identify_pattern con los parámetros
-        pattern, high_extrema, low_extrema = identify_pattern(df, start_idx, window, high_slope_threshold, low_slope_threshold)
+    def __init__(self, data, n_jobs=None):
+        self.series = prepare_series(data)
+        self.n_jobs = n_jobs or os.cpu_count()
+        self.features = {}
+        self.scores = {}
 
-        # Evalúa el resultado
-        if pattern == 'No clear pattern':
-            score = 0  # Penaliza la ausencia de patrones detectados
+    def precompute(self, windows):
+        missing = sorted(set(windows) - set(self.features))
+        if not missing:
+            return
+        if self.n_jobs > 1 and len(missing) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.n_jobs, len(missing)),
+                                     initializer=_init_worker, initargs=(self.series,)) as executor:
+                for window, features in zip(missing, executor.map(window_features, missing)):
+                    self.features[window] = features
         else:
-            # Asigna puntuaciones basadas en la calidad del patrón
-            if pattern in ['Rectangle', 'Ascending Triangle', 'Descending Triangle']:
-                score = 0.5
-            elif pattern in ['Rising Wedge', 'Falling Wedge']:
-                score = 0.8
-            elif pattern in ['Ascending Channel', 'Descending Channel']:
-                score = 1.0
-            else:
-                score = 0.2
-
-        total_score += score
-        count += 1
-
-    # Retorna el puntaje promedio (negativo porque queremos maximizar)
-    return -total_score / count
-
-# Ejecuta la optimización bayesiana con barra de progreso
-print("Iniciando optimización...")
-with tqdm(total=50, desc="Optimizando parámetros", leave=True) as pbar:
-    def progress_callback(res):
-        pbar.update(1)
-
-    result = gp_minimize(
-        func=objective,          # Función objetivo
-        dimensions=search_space, # Espacio de parámetros
-        n_calls=50,              # Número de iteraciones
-        random_state=42,         # Semilla para reproducibilidad
-        callback=[progress_callback]  # Actualiza la barra de progreso
-    )
-
-# Muestra los mejores parámetros encontrados
-print("Mejores parámetros:")
-print(f"window: {result.x[0]}")
-print(f"high_slope_threshold: {result.x[1]}")
-print(f"low_slope_threshold: {result.x[2]}")
-
-# Aplica los mejores parámetros en identify_pattern para cada acción
-best_window = result.x[0]
-best_high_slope = result.x[1]
-best_low_slope = result.x[2]
-
-for ticker in tqdm(tickers, desc="Aplicando mejores parámetros"):
-    df = data[ticker]['df']
-    start_idx = data[ticker]['start_idx']
-    pattern, high_extrema, low_extrema = identify_pattern(df, start_idx, best_window)
-    print(f"Ticker: {ticker}, Mejor patrón encontrado: {pattern}")
\ No newline at end of file
+            for window in missing:
+                self.features[window] = window_features(window, self.series)
+
+    def __call__(self, params):
+        window, high_slope_threshold, low_slope_threshold = params
+        key = (int(window), round(high_slope_threshold, THRESHOLD_DECIMALS),
+               round(low_slope_threshold, THRESHOLD_DECIMALS))
+        if key not in self.scores:
+            self.precompute([key[0]])
+            high_slopes, low_slopes, _, valid = self.features[key[0]]
+            codes, _ = classify(high_slopes, low_slopes, key[1])
+            scores = np.where(valid, CODE_SCORES[codes],
+                              np.where(insufficient_data(self.series, key[0]), INSUFFICIENT_SCORE, OTHER_SCORE))
+            # Retorna el puntaje promedio (negativo porque queremos maximizar)
+            self.scores[key] = -scores.mean() if len(scores) else 0.0
+        return self.scores[key]
+
+    def evaluate_batch(self, points):
+        self.precompute([int(point[0]) for point in points])
+        return [self(point) for point in points]
+
+
+class BacktestObjective(ObjectiveEvaluator):
+    """
+    Función objetivo según lo que pasó después: retorno medio a `horizon` barras de las
+    señales de un backtest.Backtest (en lugar de la tabla PATTERN_SCORES)
+
+    Con menos de `min_trades` señales el punto vale 0, para no premiar muestras chicas.
+    """
+
+    def __init__(self, backtest, horizon=10, metric='mean_return', min_trades=30, **trade_kwargs):
+        self.backtest = backtest
+        self.series = backtest.series
+        self.n_jobs = backtest.n_jobs
+        # La caché de pendientes por window es la del backtest
+        self.features = backtest.features
+        self.scores = {}
+        self.horizon = horizon
+        self.metric = metric
+        self.min_trades = min_trades
+        self.trade_kwargs = trade_kwargs
+
+    def precompute(self, windows):
+        self.backtest.precompute(windows)
+
+    def __call__(self, params):
+        window, high_slope_threshold, low_slope_threshold = params
+        key = (int(window), round(high_slope_threshold, THRESHOLD_DECIMALS),
+               round(low_slope_threshold, THRESHOLD_DECIMALS))
+        if key not in self.scores:
+            result = self.backtest.evaluate(key, self.horizon, **self.trade_kwargs)
+            self.scores[key] = -result[self.metric] if result['trades'] >= self.min_trades else 0.0
+        return self.scores[key]
+
+
+def run_search(evaluator, n_calls=50, batch_size=4, n_jobs=-1, random_state=42):
+    """
+    Optimización bayesiana en modo ask/tell evaluando `batch_size` candidatos por ronda
+
+    Returns:
+    - OptimizeResult de skopt
+    """
+    optimizer = Optimizer(search_space, base_estimator='GP', n_initial_points=10,
+                          acq_optimizer_kwargs={'n_jobs': n_jobs}, random_state=random_state)
+    result = None
+    with tqdm(total=n_calls, desc="Optimizando parámetros", leave=True) as pbar:
+        while pbar.n < n_calls:
+            points = optimizer.ask(n_points=min(batch_size, n_calls - pbar.n))
+            result = optimizer.tell(points, evaluator.evaluate_batch(points))
+            pbar.update(len(points))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimización de parámetros de identify_pattern")
+    parser.add_argument('--snapshot', default=DEFAULT_SNAPSHOT, help="Directorio del snapshot del screener")
+    parser.add_argument('--refresh', action='store_true', help="Ejecutar el screener y reescribir el snapshot")
+    parser.add_argument('--max-age', type=int, default=5, help="Días hábiles antes de avisar que el snapshot es viejo")
+    parser.add_argument('--n-calls', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--objective', choices=['patterns', 'backtest'], default='patterns',
+                        help="Puntaje por patrón (PATTERN_SCORES) o retorno de las señales en un backtest")
+    parser.add_argument('--universe', default=DEFAULT_UNIVERSE, help="Universo del backtest")
+    parser.add_argument('--years', type=int, default=10, help="Años de historial del backtest")
+    parser.add_argument('--horizon', type=int, default=10, choices=HORIZONS)
+    args = parser.parse_args()
+
+    if args.objective == 'backtest':
+        backtest = Backtest.run(load_history(get_universe(args.universe), years=args.years))
+        print(f"Backtest: {len(backtest)} decisions, optimizing the {args.horizon}-bar mean return...")
+        result = run_search(BacktestObjective(backtest, args.horizon), n_calls=args.n_calls,
+                            batch_size=args.batch_size)
+        print(f"Mejores parámetros: window={result.x[0]}, high_slope_threshold={result.x[1]}")
+        for name, value in backtest.evaluate(result.x, args.horizon).items():
+            print(f"{name}: {value}")
+        raise SystemExit
+
+    data = load_screen_data(args.snapshot, args.refresh, args.max_age)
+
+    # Lista de tickers
+    tickers = list(data.keys())
+
+    print("Iniciando optimización...")
+    evaluator = ObjectiveEvaluator(data)
+    result = run_search(evaluator, n_calls=args.n_calls, batch_size=args.batch_size)
+
+    # Muestra los mejores parámetros encontrados
+    print("Mejores parámetros:")
+    print(f"window: {result.x[0]}")
+    print(f"high_slope_threshold: {result.x[1]}")
+    print(f"low_slope_threshold: {result.x[2]}")
+
+    # Aplica los mejores parámetros en identify_pattern para cada acción
+    best_window = result.x[0]
+    best_high_slope = result.x[1]
+    best_low_slope = result.x[2]
+
+    for ticker in tqdm(tickers, desc="Aplicando mejores parámetros"):
+        df = data[ticker]['df']
+        start_idx = data[ticker]['start_idx']
+        pattern, high_extrema, low_extrema = identify_pattern(df, start_idx, best_window,
+                                                              best_high_slope, best_low_slope)
+        print(f"Ticker: {ticker}, Mejor patrón encontrado: {pattern}")